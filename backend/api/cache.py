@@ -0,0 +1,85 @@
+import hashlib
+from functools import wraps
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework.response import Response
+from trail.generations import get_generations
+
+RESPONSE_KEY = "response:{digest}"
+HITS_KEY = "response-cache:hits"
+MISSES_KEY = "response-cache:misses"
+
+# HTML не кэшируем: в шаблонах есть шапка пользователя и сообщения.
+CACHEABLE_FORMATS = ("json", "msgpack")
+RESPONSE_TIMEOUT = 60 * 10
+
+
+def count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def get_stats():
+    values = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {"hits": values.get(HITS_KEY, 0), "misses": values.get(MISSES_KEY, 0)}
+
+
+def response_key(request, models):
+    parts = [
+        request.get_full_path(),
+        request.accepted_renderer.format,
+        request.accepted_media_type,
+        *map(str, get_generations(models)),
+    ]
+    digest = hashlib.md5("\n".join(parts).encode()).hexdigest()
+    return RESPONSE_KEY.format(digest=digest)
+
+
+def is_cacheable(request):
+    return (
+        request.method == "GET"
+        and not request.user.is_authenticated
+        and request.accepted_renderer.format in CACHEABLE_FORMATS
+    )
+
+
+def cached_response(method):
+    """
+    Кэширует готовые байты ответа для анонимных GET-запросов.
+
+    Ключ строится из пути с query string, формата ответа и поколений
+    моделей из ``cache_models`` вьюсета, поэтому любая запись в эти
+    модели (см. trail.signals) сразу делает старые ответы недостижимыми.
+    """
+
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        if not is_cacheable(request):
+            return method(self, request, *args, **kwargs)
+
+        key = response_key(request, self.cache_models)
+        cached = cache.get(key)
+        if cached is not None:
+            count(HITS_KEY)
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response["X-Cache"] = "HIT"
+            return response
+
+        count(MISSES_KEY)
+        response = method(self, request, *args, **kwargs)
+        if isinstance(response, Response) and response.status_code == 200:
+
+            def store(rendered):
+                cache.set(
+                    key, (rendered.content, rendered["Content-Type"]), RESPONSE_TIMEOUT
+                )
+
+            response.add_post_render_callback(store)
+            response["X-Cache"] = "MISS"
+        return response
+
+    return wrapper
@@ -0,0 +1,103 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from trail.generations import get_rows, model_label
+
+# HTML не отдаём условно: страница зависит от пользователя и сообщений.
+CONDITIONAL_FORMATS = ("json", "msgpack", "json-stream")
+MODIFIED_FIELD = "updated_at"
+
+
+def has_modified_field(model):
+    return any(field.name == MODIFIED_FIELD for field in model._meta.concrete_fields)
+
+
+def table_marker(model):
+    """
+    Агрегатный маркер изменений таблицы: число строк и max(updated_at).
+
+    Для таблиц без ``updated_at`` вместо него берётся max(pk): связи
+    в них только добавляются и удаляются. Оба агрегата читаются по индексам.
+    """
+    column = MODIFIED_FIELD if has_modified_field(model) else "pk"
+    marker = model._default_manager.aggregate(count=Count("pk"), last=Max(column))
+    return marker["count"], marker["last"]
+
+
+def get_validators(request, models):
+    """
+    Возвращает ``(etag, last_modified)`` для ответа, зависящего от ``models``.
+
+    Оба валидатора строятся только из данных базы, поэтому одинаковы
+    во всех процессах. ETag — из пути с query string, типа ответа,
+    агрегатных маркеров таблиц и поколений моделей (trail.generations,
+    таблица ModelGeneration): поколения ловят правки строк в таблицах без
+    ``updated_at``, например пользователей. Last-Modified — самое позднее
+    из ``updated_at`` и времени последней записи из trail.signals, поэтому
+    он сдвигается и при удалениях.
+
+    Точность Last-Modified — секунда (ограничение HTTP): пока текущая
+    секунда не закончилась, в неё ещё может попасть запись, и клиент
+    с ``If-Modified-Since`` получил бы ошибочный 304. Поэтому в этом
+    случае ``last_modified`` равен None и проверяется только ETag.
+    """
+    markers = [table_marker(model) for model in models]
+    rows = get_rows(models)
+    generations = [rows[model_label(model)][0] for model in models]
+    parts = [
+        request.get_full_path(),
+        request.accepted_media_type,
+        *(f"{count}:{last}" for count, last in markers),
+        *map(str, generations),
+    ]
+    digest = hashlib.md5("\n".join(parts).encode()).hexdigest()
+
+    timestamps = [rows[model_label(model)][1] for model in models]
+    timestamps.extend(
+        last.timestamp()
+        for model, (count, last) in zip(models, markers)
+        if last is not None and has_modified_field(model)
+    )
+    last_modified = int(max(timestamps))
+    if last_modified >= int(time.time()):
+        last_modified = None
+    return f'"{digest}"', last_modified
+
+
+def conditional_response(method):
+    """
+    Отвечает 304 на ``If-None-Match``/``If-Modified-Since`` до выполнения
+    метода вьюсета, то есть без запросов за данными и без сериализации.
+
+    Валидаторы считаются по моделям из ``cache_models`` вьюсета. Их считают
+    до формирования тела: если запись случится в промежутке, клиент получит
+    новые данные со старым ETag и просто перезапросит их, но не наоборот.
+    """
+
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        if (
+            request.method not in ("GET", "HEAD")
+            or request.accepted_renderer.format not in CONDITIONAL_FORMATS
+        ):
+            return method(self, request, *args, **kwargs)
+
+        etag, last_modified = get_validators(request, self.cache_models)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is not None:
+            return response
+
+        response = method(self, request, *args, **kwargs)
+        if response.status_code == 200:
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    return wrapper
@@ -0,0 +1,257 @@
+import decimal
+from functools import lru_cache
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+# Ограничение на размер IN (...): у SQLite есть предел числа параметров.
+BATCH_SIZE = 500
+
+
+def chunks(values, size=BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
+
+
+def image_converter(field, model_field):
+    storage = model_field.storage
+
+    def factory(request):
+        def convert(name):
+            if not name:
+                return None
+            url = storage.url(name)
+            if request is not None:
+                return request.build_absolute_uri(url)
+            return url
+
+        return convert
+
+    return factory
+
+
+def decimal_converter(field):
+    quantum = decimal.Decimal(".1") ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return "{:f}".format(
+            value.quantize(quantum, rounding=rounding, context=context)
+        )
+
+    return convert
+
+
+def datetime_converter(field):
+    enforce_timezone = field.enforce_timezone
+
+    def convert(value):
+        value = enforce_timezone(value).isoformat()
+        if value.endswith("+00:00"):
+            value = value[:-6] + "Z"
+        return value
+
+    return convert
+
+
+def compile_converter(field, model_field):
+    """
+    Возвращает фабрику ``factory(request) -> convert(value)`` для простого поля.
+
+    Для типичных полей преобразование повторяет ``to_representation`` DRF
+    без накладных расходов на вызовы методов поля; для остальных случаев
+    используется сам ``to_representation``.
+    """
+    if isinstance(field, serializers.FileField):
+        if getattr(field, "use_url", api_settings.UPLOADED_FILES_USE_URL):
+            return image_converter(field, model_field)
+    elif isinstance(field, serializers.BooleanField):
+        return lambda request: bool
+    elif isinstance(field, serializers.IntegerField):
+        return lambda request: int
+    elif isinstance(field, serializers.CharField):
+        return lambda request: str
+    elif isinstance(field, serializers.DateTimeField):
+        if getattr(field, "format", api_settings.DATETIME_FORMAT) == ISO_8601:
+            convert = datetime_converter(field)
+            return lambda request: convert
+    elif isinstance(field, serializers.DateField):
+        if getattr(field, "format", api_settings.DATE_FORMAT) == ISO_8601:
+            return lambda request: lambda value: value.isoformat()
+    elif isinstance(field, serializers.DecimalField):
+        # Подклассы со своим to_representation (например, E7DecimalField)
+        # преобразуют значение иначе — для них остаётся общий путь.
+        own = type(field).to_representation
+        if own is not serializers.DecimalField.to_representation:
+            return lambda request: field.to_representation
+        coerce = getattr(
+            field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING
+        )
+        if coerce and not field.localize and field.decimal_places is not None:
+            convert = decimal_converter(field)
+            return lambda request: convert
+    return lambda request: field.to_representation
+
+
+class ManyLink:
+    """
+    Связь "один ко многим" для SerializerMethodField с подсказкой из
+    ``Meta.prefetch``: путь вида ``обратная_связь__fk`` и сериализатор
+    конечной модели.
+    """
+
+    def __init__(self, model, path, serializer_class, selection=None):
+        first, _, rest = path.partition("__")
+        relation = model._meta.get_field(first)
+        if not relation.one_to_many:
+            raise ImproperlyConfigured(
+                f"{model.__name__}.{first}: ожидается обратная связь ForeignKey."
+            )
+        self.link_model = relation.related_model
+        self.parent_column = relation.field.attname
+        self.target = rest or "pk"
+        # Тот же порядок, что у related manager в сериализаторе.
+        self.ordering = [*(self.link_model._meta.ordering or []), "pk"]
+        self.reader = get_reader(serializer_class, selection)
+
+    def fetch(self, parent_ids):
+        pairs = []
+        for batch in chunks(parent_ids):
+            pairs.extend(
+                self.link_model._default_manager.filter(
+                    **{f"{self.parent_column}__in": batch}
+                )
+                .order_by(*self.ordering)
+                .values_list(self.parent_column, self.target)
+            )
+        # Сериализаторы из SerializerMethodField создаются без контекста,
+        # поэтому и здесь ссылки на файлы остаются относительными.
+        children = self.reader.fetch({target for _, target in pairs}, {})
+        grouped = {}
+        for parent_id, target in pairs:
+            grouped.setdefault(parent_id, []).append(children[target])
+        return grouped
+
+
+class FastReader:
+    """
+    Сериализация только для чтения через ``.values()``.
+
+    Строится по тем же ``Meta.fields``, что и сериализатор, и выдаёт
+    те же словари, что и ``Serializer(many=True).data``, но без создания
+    экземпляров моделей и сериализаторов: строки читаются одним запросом,
+    вложенные объекты — по одному пакетному запросу на связь.
+    """
+
+    def __init__(self, serializer_class, selection=None):
+        serializer = serializer_class(selection=selection)
+        model = serializer.Meta.model
+        hints = getattr(serializer.Meta, "prefetch", {})
+
+        self.model = model
+        self.pk = model._meta.pk.attname
+        self.columns = [self.pk]
+        self.steps = []
+
+        for field in serializer.fields.values():
+            if field.write_only or isinstance(field, serializers.HiddenField):
+                continue
+            name = field.field_name
+            if isinstance(field, serializers.SerializerMethodField):
+                if name not in hints:
+                    raise ImproperlyConfigured(
+                        f"{serializer_class.__name__}.{name}: "
+                        "нет подсказки в Meta.prefetch."
+                    )
+                path, child_class = hints[name]
+                link = ManyLink(
+                    model, path, child_class, serializer.nested_selection(name)
+                )
+                self.steps.append((name, "many", link))
+                continue
+            if field.source == "*" or "." in field.source:
+                raise ImproperlyConfigured(
+                    f"{serializer_class.__name__}.{name}: "
+                    "составной source не поддерживается."
+                )
+            model_field = model._meta.get_field(field.source)
+            if model_field.one_to_one and not model_field.concrete:
+                # Обратная OneToOne, у которой ключ связи — первичный ключ
+                # связанной модели: ищем её строки по нашему pk.
+                if not model_field.field.primary_key:
+                    raise ImproperlyConfigured(
+                        f"{serializer_class.__name__}.{name}: "
+                        "обратная OneToOne поддерживается только с primary_key."
+                    )
+                column = self.pk
+            else:
+                column = model_field.attname
+            self.columns.append(column)
+            if isinstance(field, serializers.BaseSerializer):
+                if isinstance(field, serializers.ListSerializer):
+                    raise ImproperlyConfigured(
+                        f"{serializer_class.__name__}.{name}: "
+                        "используйте SerializerMethodField с Meta.prefetch."
+                    )
+                reader = get_reader(type(field), field.selection)
+                self.steps.append((name, "one", (column, reader)))
+            else:
+                self.steps.append(
+                    (name, "value", (column, compile_converter(field, model_field)))
+                )
+
+    def values(self, queryset, *extra):
+        columns = list(dict.fromkeys([*self.columns, *extra]))
+        return queryset.select_related(None).prefetch_related(None).values(*columns)
+
+    def fetch(self, ids, context):
+        rows = []
+        for batch in chunks(ids):
+            rows.extend(self.values(self.model._default_manager.filter(pk__in=batch)))
+        return dict(zip((row[self.pk] for row in rows), self.represent(rows, context)))
+
+    def represent(self, rows, context):
+        rows = list(rows)
+        request = context.get("request")
+
+        bound = []
+        for name, kind, payload in self.steps:
+            if kind == "value":
+                column, factory = payload
+                bound.append((name, column, factory(request), None))
+            elif kind == "one":
+                column, reader = payload
+                ids = {row[column] for row in rows if row[column] is not None}
+                bound.append((name, column, None, reader.fetch(ids, context)))
+            else:
+                grouped = payload.fetch([row[self.pk] for row in rows])
+                bound.append((name, self.pk, list, grouped))
+
+        data = []
+        for row in rows:
+            item = {}
+            for name, column, convert, related in bound:
+                value = row[column]
+                if value is None:
+                    item[name] = None
+                elif related is None:
+                    item[name] = convert(value)
+                elif convert is list:
+                    item[name] = related.get(value, [])
+                else:
+                    # У обратной OneToOne связанной строки может не быть.
+                    item[name] = related.get(value)
+            data.append(item)
+        return data
+
+
+@lru_cache(maxsize=256)
+def get_reader(serializer_class, selection=None):
+    return FastReader(serializer_class, selection)
@@ -0,0 +1,156 @@
+from django.db.models import F, Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+from trail.geo import bbox_ranges, e7_bounds
+from trail.search import SOURCES, parse_terms
+
+BBOX_PARAM = "bbox"
+CATEGORY_PARAM = "category"
+NEARBY_DEFAULT_K = 10
+NEARBY_MAX_K = 100
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+TYPEAHEAD_DEFAULT_LIMIT = 10
+TYPEAHEAD_MAX_LIMIT = 50
+TOP_DEFAULT_LIMIT = 10
+TOP_MAX_LIMIT = 100
+
+
+def parse_bbox(value):
+    """Разбирает ``minLon,minLat,maxLon,maxLat`` и проверяет границы."""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(part) for part in value.split(","))
+    except ValueError:
+        raise ValidationError(
+            {BBOX_PARAM: "Ожидается bbox=minLon,minLat,maxLon,maxLat."}
+        )
+    if not all(-180 <= lon <= 180 for lon in (min_lon, max_lon)):
+        raise ValidationError({BBOX_PARAM: "Долгота должна быть от -180 до 180."})
+    if not -90 <= min_lat <= max_lat <= 90:
+        raise ValidationError(
+            {BBOX_PARAM: "Широта должна быть от -90 до 90, minLat <= maxLat."}
+        )
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def parse_number(params, name, low, high, default=None, cast=float):
+    """Читает числовой параметр запроса и проверяет, что он в ``[low, high]``."""
+    value = params.get(name)
+    if value in (None, ""):
+        if default is None:
+            raise ValidationError({name: "Обязательный параметр."})
+        return default
+    try:
+        value = cast(value)
+    except ValueError:
+        raise ValidationError({name: "Ожидается число."})
+    if not low <= value <= high:
+        raise ValidationError({name: f"Допустимые значения: от {low} до {high}."})
+    return value
+
+
+def parse_nearby(params):
+    """Параметры ``lat``, ``lon``, ``k`` и ``radius_km`` поиска рядом."""
+    lat = parse_number(params, "lat", -90, 90)
+    lon = parse_number(params, "lon", -180, 180)
+    radius_km = None
+    if params.get("radius_km"):
+        radius_km = parse_number(params, "radius_km", 0, 20040)
+    k = parse_number(params, "k", 1, NEARBY_MAX_K, NEARBY_DEFAULT_K, int)
+    return lat, lon, k, radius_km
+
+
+def parse_search(params):
+    """Параметры ``q``, ``kind`` и ``limit`` полнотекстового поиска."""
+    query = params.get("q", "")
+    if not parse_terms(query):
+        raise ValidationError({"q": "Введите хотя бы одно слово."})
+    kind = params.get("kind") or None
+    if kind is not None and kind not in SOURCES:
+        raise ValidationError({"kind": f"Допустимые значения: {', '.join(SOURCES)}."})
+    limit = parse_number(
+        params, "limit", 1, SEARCH_MAX_LIMIT, SEARCH_DEFAULT_LIMIT, int
+    )
+    return query, kind, limit
+
+
+def parse_typeahead(params):
+    """Параметры ``q`` и ``limit`` подсказок; пустой ``q`` допустим."""
+    limit = parse_number(
+        params, "limit", 1, TYPEAHEAD_MAX_LIMIT, TYPEAHEAD_DEFAULT_LIMIT, int
+    )
+    return params.get("q", ""), limit
+
+
+def parse_top(params):
+    """Параметр ``limit`` списка лучших маршрутов."""
+    return parse_number(params, "limit", 1, TOP_MAX_LIMIT, TOP_DEFAULT_LIMIT, int)
+
+
+def bbox_condition(min_lon, min_lat, max_lon, max_lat):
+    """
+    Условие "точка внутри прямоугольника".
+
+    Диапазоны кодов Мортона выбирают кандидатов по индексу, а точные
+    целочисленные сравнения координат E7 отсекают точки из краёв
+    покрывающих ячеек.
+    """
+    ranges = Q()
+    for low, high in bbox_ranges(min_lon, min_lat, max_lon, max_lat):
+        ranges |= Q(morton__range=(low, high))
+    lat_low, lat_high = e7_bounds(min_lat, max_lat)
+    lon_low, lon_high = e7_bounds(min_lon, max_lon)
+    inside = Q(latitude_e7__gte=lat_low, latitude_e7__lte=lat_high)
+    if min_lon <= max_lon:
+        inside &= Q(longitude_e7__gte=lon_low, longitude_e7__lte=lon_high)
+    else:
+        # Прямоугольник пересекает 180-й меридиан.
+        inside &= Q(longitude_e7__gte=lon_low) | Q(longitude_e7__lte=lon_high)
+    return ranges & inside
+
+
+class PointsFilter(BaseFilterBackend):
+    """Фильтры ``?bbox=`` и ``?category=`` для списка точек интереса."""
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        if params.get(BBOX_PARAM):
+            queryset = queryset.filter(bbox_condition(*parse_bbox(params[BBOX_PARAM])))
+        if params.get(CATEGORY_PARAM):
+            queryset = queryset.filter(category=params[CATEGORY_PARAM])
+        return queryset
+
+
+def route_bbox_condition(min_lon, min_lat, max_lon, max_lat):
+    """
+    Условие "прямоугольник маршрута пересекает прямоугольник экрана"
+    по сохранённым границам маршрута (trail.metrics), которые покрыты
+    индексом routers_bbox_idx.
+
+    Маршрут, пересекающий 180-й меридиан, хранится с ``min_lon_e7 >
+    max_lon_e7`` (trail.geo.longitude_extent): его долготы — это
+    ``[min_lon_e7, 180°] ∪ [-180°, max_lon_e7]``.
+    """
+    lat_low, lat_high = e7_bounds(min_lat, max_lat)
+    lon_low, lon_high = e7_bounds(min_lon, max_lon)
+    condition = Q(min_lat_e7__lte=lat_high, max_lat_e7__gte=lat_low)
+    crosses = Q(min_lon_e7__gt=F("max_lon_e7"))
+    if min_lon <= max_lon:
+        condition &= (
+            ~crosses & Q(min_lon_e7__lte=lon_high, max_lon_e7__gte=lon_low)
+        ) | (crosses & (Q(min_lon_e7__lte=lon_high) | Q(max_lon_e7__gte=lon_low)))
+    else:
+        # Экран пересекает 180-й меридиан; маршрут через меридиан
+        # пересекается с ним всегда.
+        condition &= Q(max_lon_e7__gte=lon_low) | Q(min_lon_e7__lte=lon_high) | crosses
+    return condition
+
+
+class RoutersFilter(BaseFilterBackend):
+    """Фильтр ``?bbox=`` для маршрутов: "маршруты в видимой области"."""
+
+    def filter_queryset(self, request, queryset, view):
+        value = request.query_params.get(BBOX_PARAM)
+        if value:
+            queryset = queryset.filter(route_bbox_condition(*parse_bbox(value)))
+        return queryset
@@ -2,6 +2,9 @@ import re
 
 from django import forms
 from django.contrib.auth.forms import PasswordChangeForm, UserCreationForm
+from django.db import transaction
+from django.urls import reverse_lazy
+from trail.links import sync_links
 from trail.models import (
     CollectionRouters,
     Collections,
@@ -15,12 +18,16 @@ from .password_validators import (
     PASSWORD_DIGIT_LETTER_DIGIT_MESSAGE,
     is_digit_letter_digit_password,
 )
+from .widgets import TypeaheadSelectMultiple
 
 
 class RouterForm(forms.ModelForm):
     points_of_interest = forms.ModelMultipleChoiceField(
         queryset=PointsOfInterest.objects.all(),
-        widget=forms.SelectMultiple(attrs={"class": "form-select"}),
+        # Варианты подгружаются по вводу, на странице только выбранные
+        widget=TypeaheadSelectMultiple(
+            reverse_lazy("api:point-typeahead"), attrs={"class": "form-select"}
+        ),
         required=False,
         label="Точки интереса",
     )
@@ -53,6 +60,18 @@ class RouterForm(forms.ModelForm):
         self.user = kwargs.pop("user", None)
         super().__init__(*args, **kwargs)
 
+    def clean_points_of_interest(self):
+        # ModelMultipleChoiceField отдаёт точки в порядке таблицы, а порядок
+        # маршрута — тот, в котором точки выбраны в форме.
+        order = {
+            str(pk): index
+            for index, pk in enumerate(self["points_of_interest"].value() or [])
+        }
+        return sorted(
+            self.cleaned_data["points_of_interest"],
+            key=lambda point: order.get(str(point.pk), len(order)),
+        )
+
     def save(self, commit=True):
         instance = super().save(commit=False)
 
@@ -62,38 +81,64 @@ class RouterForm(forms.ModelForm):
             )  # Устанавливаем текущего пользователя как автора
 
         if commit:
-            instance.save()
-
-            # Удалим старые связи, если редактируем
-            RoutePoints.objects.filter(router=instance).delete()
-
-            # Сохраняем новые связи
-            points = self.cleaned_data.get("points_of_interest")
-            if points:
-                for point in points:
-                    RoutePoints.objects.create(router=instance, point=point)
+            with transaction.atomic():
+                instance.save()
+                # Приводим связи с точками к выбранным в форме
+                sync_links(
+                    RoutePoints,
+                    "router",
+                    instance,
+                    "point",
+                    self.cleaned_data.get("points_of_interest") or [],
+                    position_field="position",
+                )
 
         return instance
 
 
 class PointsOfInterestForm(forms.ModelForm):
+    # В модели координаты хранятся целыми E7 (см. PointsOfInterest),
+    # в форме вводятся в градусах.
+    latitude = forms.DecimalField(
+        max_digits=22,
+        decimal_places=16,
+        required=False,
+        widget=forms.NumberInput(attrs={"class": "form-control"}),
+    )
+    longitude = forms.DecimalField(
+        max_digits=22,
+        decimal_places=16,
+        required=False,
+        widget=forms.NumberInput(attrs={"class": "form-control"}),
+    )
+
     class Meta:
         model = PointsOfInterest
         fields = "__all__"
         widgets = {
             "name": forms.TextInput(attrs={"class": "form-control"}),
             "description": forms.Textarea(attrs={"class": "form-control"}),
-            "latitude": forms.NumberInput(attrs={"class": "form-control"}),
-            "longitude": forms.NumberInput(attrs={"class": "form-control"}),
             "category": forms.TextInput(attrs={"class": "form-control"}),
             "photo": forms.ClearableFileInput(attrs={"class": "form-control"}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.initial.setdefault("latitude", self.instance.latitude)
+        self.initial.setdefault("longitude", self.instance.longitude)
+
+    def _post_clean(self):
+        super()._post_clean()
+        self.instance.latitude = self.cleaned_data.get("latitude")
+        self.instance.longitude = self.cleaned_data.get("longitude")
+
 
 class CollectionForm(forms.ModelForm):
     routers = forms.ModelMultipleChoiceField(
         queryset=Routers.objects.all(),
-        widget=forms.SelectMultiple(attrs={"class": "form-select"}),
+        widget=TypeaheadSelectMultiple(
+            reverse_lazy("api:router-typeahead"), attrs={"class": "form-select"}
+        ),
         required=False,
         label="Маршруты",
     )
@@ -132,16 +177,16 @@ class CollectionForm(forms.ModelForm):
             instance.user = self.user
 
         if commit:
-            instance.save()
-
-            # Очищаем старые связи (если редактируем)
-            CollectionRouters.objects.filter(collection=instance).delete()
-
-            # Создаем новые связи
-            routers = self.cleaned_data.get("routers")
-            if routers:
-                for router in routers:
-                    CollectionRouters.objects.create(collection=instance, router=router)
+            with transaction.atomic():
+                instance.save()
+                # Приводим связи с маршрутами к выбранным в форме
+                sync_links(
+                    CollectionRouters,
+                    "collection",
+                    instance,
+                    "router",
+                    self.cleaned_data.get("routers") or [],
+                )
 
         return instance
 
@@ -151,7 +196,6 @@ class CustomUserCreationForm(UserCreationForm):
         model = User
         fields = ("username", "email")
 
-
     def clean_password2(self):
         password2 = super().clean_password2()
         if password2 and not re.fullmatch(r"\d+[A-Za-zА-Яа-яЁё]+\d+", password2):
@@ -0,0 +1,55 @@
+import orjson
+from django.core.cache import cache
+from trail.generations import get_object_versions
+
+from .renderers import ORJSONRenderer, dumps
+
+MATERIALIZED_KEY = "materialized:{name}:{pk}:{version}:{base}"
+MATERIALIZED_TIMEOUT = 60 * 60
+
+
+def fragments_enabled(request):
+    """
+    Можно ли вставлять в ответ готовые байты: только если он будет
+    закодирован orjson (см. ORJSONRenderer.uses_orjson).
+    """
+    renderer = getattr(request, "accepted_renderer", None)
+    return isinstance(renderer, ORJSONRenderer) and renderer.uses_orjson(
+        request.accepted_media_type
+    )
+
+
+def url_base(context):
+    # Ссылки на файлы абсолютные, только если в контексте есть request.
+    request = context.get("request")
+    return request.build_absolute_uri("/") if request is not None else ""
+
+
+def materialize(name, model, pks, context, compute):
+    """
+    Возвращает ``orjson.Fragment`` с готовым JSON для каждого pk из ``pks``.
+
+    Ключ записи состоит из имени представления, pk, версии объекта
+    (trail.generations) и базового URL. Для промахов вызывается
+    ``compute(missing_pks) -> {pk: dict}``, результат кодируется один раз
+    и кладётся в кэш пакетом.
+    """
+    pks = list(pks)
+    base = url_base(context)
+    versions = get_object_versions(model, set(pks))
+    keys = {
+        pk: MATERIALIZED_KEY.format(name=name, pk=pk, version=versions[pk], base=base)
+        for pk in versions
+    }
+    cached = cache.get_many(keys.values())
+    encoded = {pk: cached[key] for pk, key in keys.items() if key in cached}
+
+    missing = [pk for pk in keys if pk not in encoded]
+    if missing:
+        fresh = {pk: dumps(data) for pk, data in compute(missing).items()}
+        cache.set_many(
+            {keys[pk]: raw for pk, raw in fresh.items()}, MATERIALIZED_TIMEOUT
+        )
+        encoded.update(fresh)
+
+    return [orjson.Fragment(encoded[pk]) for pk in pks]
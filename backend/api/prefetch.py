@@ -0,0 +1,107 @@
+from functools import lru_cache
+
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+class PlanNode:
+    """
+    Узел плана загрузки: модель и связи, которые нужно подтянуть вместе с ней.
+
+    ``select`` — прямые FK/OneToOne, они попадают в тот же SQL-запрос через
+    select_related; ``prefetch`` — обратные FK и M2M, каждая такая связь
+    стоит ровно одного дополнительного запроса независимо от числа строк.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.select = {}
+        self.prefetch = {}
+
+    def descend(self, path):
+        """Проходит по пути ``a__b__c`` от модели узла и возвращает конечный узел."""
+        node = self
+        for name in path.split("__"):
+            field = node.model._meta.get_field(name)
+            branch = (
+                node.prefetch
+                if field.one_to_many or field.many_to_many
+                else node.select
+            )
+            if name not in branch:
+                branch[name] = PlanNode(field.related_model)
+            node = branch[name]
+        return node
+
+    def lookups(self, prefix=""):
+        selects, prefetches = [], []
+        for name, child in self.select.items():
+            path = f"{prefix}{name}"
+            selects.append(path)
+            child_selects, child_prefetches = child.lookups(f"{path}__")
+            selects.extend(child_selects)
+            prefetches.extend(child_prefetches)
+        for name, child in self.prefetch.items():
+            prefetches.append(Prefetch(f"{prefix}{name}", queryset=child.queryset()))
+        return selects, prefetches
+
+    def apply(self, queryset):
+        selects, prefetches = self.lookups()
+        if selects:
+            queryset = queryset.select_related(*selects)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        return queryset
+
+    def queryset(self):
+        return self.apply(self.model._default_manager.all())
+
+
+def walk_serializer(serializer, node):
+    """
+    Добавляет в узел все связи, которые понадобятся сериализатору.
+
+    Вложенные сериализаторы обходятся по их ``source``. Для
+    ``SerializerMethodField`` путь объявляется в ``Meta.prefetch``
+    в виде ``{"поле": ("путь__к__модели", ВложенныйСериализатор)}``,
+    потому что из кода метода его не извлечь.
+    """
+    hints = getattr(getattr(serializer, "Meta", None), "prefetch", {})
+    for field in serializer.fields.values():
+        if field.write_only or isinstance(field, serializers.HiddenField):
+            continue
+        if isinstance(field, serializers.SerializerMethodField):
+            if field.field_name in hints:
+                path, child_class = hints[field.field_name]
+                child = child_class(
+                    selection=serializer.nested_selection(field.field_name)
+                )
+                walk_serializer(child, node.descend(path))
+            continue
+        if isinstance(field, serializers.ListSerializer):
+            child = field.child
+        elif isinstance(field, serializers.BaseSerializer):
+            child = field
+        else:
+            continue
+        if field.source == "*":
+            walk_serializer(child, node)
+            continue
+        walk_serializer(child, node.descend(field.source.replace(".", "__")))
+
+
+@lru_cache(maxsize=256)
+def build_plan(serializer_class, selection=None):
+    serializer = serializer_class(selection=selection)
+    node = PlanNode(serializer.Meta.model)
+    walk_serializer(serializer, node)
+    return node
+
+
+def plan_queryset(queryset, serializer_class, selection=None):
+    """
+    Дополняет queryset select_related/prefetch_related по дереву полей
+    сериализатора, так что число запросов не зависит от числа строк.
+    Поля, отброшенные выборкой ``?fields=``/``?expand=``, связей не тянут.
+    """
+    return build_plan(serializer_class, selection).apply(queryset)
@@ -0,0 +1,92 @@
+import msgpack
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+ENCODER_DEFAULT = JSONRenderer.encoder_class().default
+
+
+def dumps(data):
+    """Кодирует данные в компактный JSON так же, как JSONRenderer."""
+    ret = orjson.dumps(data, default=ENCODER_DEFAULT, option=ORJSON_OPTIONS)
+    # Как и JSONRenderer, экранируем U+2028 и U+2029.
+    return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson.
+
+    Типы, которые orjson не знает (Decimal, даты и время, ленивые строки),
+    передаются в ``default`` стандартного кодировщика DRF, поэтому вывод
+    совпадает с JSONRenderer. Отступы и "длинные" разделители orjson
+    не поддерживает — в этих случаях работает обычный JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        renderer_context = renderer_context or {}
+        if not self.uses_orjson(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+    def uses_orjson(self, accepted_media_type=None, renderer_context=None):
+        """
+        Будет ли ответ закодирован orjson. Только в этом случае в данные
+        можно вставлять готовые фрагменты ``orjson.Fragment``.
+        """
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        return indent is None and self.compact and not self.ensure_ascii
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Компактный бинарный формат для бота и мобильных клиентов.
+
+    Выбирается заголовком ``Accept: application/msgpack`` или
+    ``?format=msgpack``. Нестандартные типы приводятся так же, как в JSON.
+    """
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+    encoder_class = JSONRenderer.encoder_class
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(
+            data, default=self.encoder_class().default, use_bin_type=True
+        )
+
+
+class StreamingJSONRenderer(ORJSONRenderer):
+    """
+    JSON-массив, который отдаётся по частям.
+
+    Выбирается параметром ``?format=json-stream``. Вьюсет передаёт в
+    ``stream`` итератор порций уже сериализованных строк, а рендерер
+    оборачивает их в скобки массива, так что в памяти одновременно
+    находится только одна порция. Обычные ответы (ошибки, детали объекта)
+    рендерятся как в JSONRenderer.
+    """
+
+    format = "json-stream"
+
+    def stream(self, chunks):
+        separator = b"," if self.compact else b", "
+        yield b"["
+        first = True
+        for chunk in chunks:
+            if not chunk:
+                continue
+            # Рендерим порцию как список и снимаем с неё скобки: разделители
+            # и экранирование получаются ровно такими же, как у JSONRenderer.
+            body = self.render(chunk)[1:-1]
+            if not first:
+                yield separator
+            yield body
+            first = False
+        yield b"]"
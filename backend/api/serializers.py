@@ -3,17 +3,29 @@ import re
 
 from django.contrib.auth import get_user_model
 from django.core.files.base import ContentFile
+from django.db.models.manager import BaseManager
 from djoser.serializers import PasswordSerializer, UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 from rest_framework.serializers import CurrentUserDefault, HiddenField
-from trail.models import Collections, Favorite, PointsOfInterest, Reviews, Routers
+from trail.geo import decimal_from_e7, from_e7, to_e7
+from trail.models import (
+    Collections,
+    Favorite,
+    PointsOfInterest,
+    Reviews,
+    RouteRating,
+    Routers,
+)
+from trail.ratings import HISTOGRAM_FIELDS
 
 User = get_user_model()
 
+from .materialize import materialize
 from .password_validators import (
     PASSWORD_DIGIT_LETTER_DIGIT_MESSAGE,
     is_digit_letter_digit_password,
 )
+from .sparse import SparseFieldsMixin
 
 
 class Base64ImageField(serializers.ImageField):
@@ -25,7 +37,7 @@ class Base64ImageField(serializers.ImageField):
         return super().to_internal_value(data)
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(SparseFieldsMixin, UserSerializer):
     avatar = Base64ImageField(allow_null=True, required=False)
 
     class Meta:
@@ -84,8 +96,37 @@ class AvatarSerializer(serializers.ModelSerializer):
         fields = ("avatar",)
 
 
-class PointsOfInterestSerializer(serializers.ModelSerializer):
+class E7Field(serializers.ReadOnlyField):
+    """Координата, хранящаяся целым E7, в градусах."""
+
+    def to_representation(self, value):
+        return from_e7(value)
+
+
+class E7DecimalField(serializers.DecimalField):
+    """
+    Координата точки: в API — градусы Decimal, как у прежнего поля модели,
+    в базе — целое E7 (``source`` указывает на колонку ``*_e7``).
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("max_digits", 22)
+        kwargs.setdefault("decimal_places", 16)
+        kwargs.setdefault("allow_null", True)
+        kwargs.setdefault("required", False)
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return super().to_representation(decimal_from_e7(value))
+
+    def to_internal_value(self, data):
+        return to_e7(super().to_internal_value(data))
+
+
+class PointsOfInterestSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     photo = Base64ImageField(allow_null=True, required=False)
+    latitude = E7DecimalField(source="latitude_e7")
+    longitude = E7DecimalField(source="longitude_e7")
 
     class Meta:
         model = PointsOfInterest
@@ -100,13 +141,80 @@ class PointsOfInterestSerializer(serializers.ModelSerializer):
         )
 
 
-class RoutersSerializer(serializers.ModelSerializer):
+class MaterializedListSerializer(serializers.ListSerializer):
+    """
+    Список, элементы которого берутся из кэша готового JSON (api.materialize),
+    если в контексте включены фрагменты.
+    """
+
+    def to_representation(self, data):
+        if not self.context.get("fragments"):
+            return super().to_representation(data)
+        items = list(data.all() if isinstance(data, BaseManager) else data)
+        by_pk = {item.pk: item for item in items}
+        child = self.child
+        return materialize(
+            child.materialized_name,
+            child.Meta.model,
+            [item.pk for item in items],
+            self.context,
+            lambda pks: {pk: child.represent(by_pk[pk]) for pk in pks},
+        )
+
+
+class MaterializedMixin:
+    """
+    Сериализатор, чьё представление кэшируется по объектам в виде байтов.
+
+    ``materialized_name`` различает варианты представления одной модели.
+    """
+
+    materialized_name = None
+
+    def to_representation(self, instance):
+        # Фрагмент подставляем только во вложенное представление:
+        # у сериализатора верхнего уровня .data должен остаться словарём.
+        if self.parent is None or not self.context.get("fragments"):
+            return super().to_representation(instance)
+        return materialize(
+            self.materialized_name,
+            self.Meta.model,
+            [instance.pk],
+            self.context,
+            lambda pks: {instance.pk: self.represent(instance)},
+        )[0]
+
+    def represent(self, instance):
+        return super().to_representation(instance)
+
+
+class RouteRatingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    # Агрегаты ведёт trail.ratings; score_N — число оценок N.
+    class Meta:
+        model = RouteRating
+        fields = ("count", "total", "mean", "bayesian", *HISTOGRAM_FIELDS)
+
+
+class RoutersSerializer(
+    MaterializedMixin, SparseFieldsMixin, serializers.ModelSerializer
+):
     author = CustomUserSerializer(read_only=True)
     photo = Base64ImageField(allow_null=True, required=False)
     points = serializers.SerializerMethodField()
+    # Метрики по точкам маршрута считает trail.metrics.
+    min_latitude = E7Field(source="min_lat_e7")
+    min_longitude = E7Field(source="min_lon_e7")
+    max_latitude = E7Field(source="max_lat_e7")
+    max_longitude = E7Field(source="max_lon_e7")
+    center_latitude = E7Field(source="center_lat_e7")
+    center_longitude = E7Field(source="center_lon_e7")
+    # Пока отзывов не было, строки агрегатов нет и поле равно null.
+    rating = RouteRatingSerializer(read_only=True)
+    materialized_name = "router"
 
     class Meta:
         model = Routers
+        list_serializer_class = MaterializedListSerializer
         fields = (
             "name",
             "description",
@@ -117,7 +225,20 @@ class RoutersSerializer(serializers.ModelSerializer):
             "photo",
             "author",
             "points",
+            "length_km",
+            "min_latitude",
+            "min_longitude",
+            "max_latitude",
+            "max_longitude",
+            "center_latitude",
+            "center_longitude",
+            "rating",
+            "views_count",
+            "favorites_count",
+            "collections_count",
         )
+        # Связи для SerializerMethodField, см. api.prefetch.walk_serializer.
+        prefetch = {"points": ("router_points__point", PointsOfInterestSerializer)}
 
     def get_points(self, obj):
         # Получаем все связанные записи RoutePoints для текущего маршрута
@@ -125,12 +246,19 @@ class RoutersSerializer(serializers.ModelSerializer):
         # Извлекаем связанные точки PointsOfInterest
         points_of_interest = [rp.point for rp in route_points]
         # Сериализуем точки
-        return PointsOfInterestSerializer(points_of_interest, many=True).data
+        return PointsOfInterestSerializer(
+            points_of_interest,
+            many=True,
+            selection=self.nested_selection("points"),
+        ).data
 
 
 class ShortRoutersSerializer(RoutersSerializer):
+    materialized_name = "router-short"
+
     class Meta:
         model = Routers
+        list_serializer_class = MaterializedListSerializer
         fields = (
             "name",
             "description",
@@ -142,7 +270,7 @@ class ShortRoutersSerializer(RoutersSerializer):
         )
 
 
-class ReviewsSerializer(serializers.ModelSerializer):
+class ReviewsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = HiddenField(default=CurrentUserDefault())
     router = ShortRoutersSerializer(read_only=True)
 
@@ -157,7 +285,7 @@ class ReviewsSerializer(serializers.ModelSerializer):
         )
 
 
-class CollectionsSerializer(serializers.ModelSerializer):
+class CollectionsSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = HiddenField(default=CurrentUserDefault())
     routers = serializers.SerializerMethodField()
 
@@ -171,17 +299,24 @@ class CollectionsSerializer(serializers.ModelSerializer):
             "is_public",
             "created_at",
         )
+        prefetch = {"routers": ("collection_routers__router", RoutersSerializer)}
 
     def get_routers(self, obj):
         # Получаем все связанные записи CollectionRouters для текущей коллекции
         collection_routers = obj.collection_routers.all()
         # Извлекаем связанные маршруты Routers
         routers = [cr.router for cr in collection_routers]
-        # Сериализуем маршруты
-        return RoutersSerializer(routers, many=True).data
+        # Сериализуем маршруты (без request: ссылки на файлы относительные)
+        context = {"fragments": self.context.get("fragments", False)}
+        return RoutersSerializer(
+            routers,
+            many=True,
+            context=context,
+            selection=self.nested_selection("routers"),
+        ).data
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
+class FavoriteSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = HiddenField(default=CurrentUserDefault())
     routers = serializers.SerializerMethodField()
 
@@ -0,0 +1,130 @@
+from rest_framework import serializers
+
+FIELDS_PARAM = "fields"
+EXPAND_PARAM = "expand"
+
+
+def is_nested(field):
+    return isinstance(
+        field, (serializers.BaseSerializer, serializers.SerializerMethodField)
+    )
+
+
+def split_param(value):
+    return [part.strip() for part in (value or "").split(",") if part.strip()]
+
+
+class Selection:
+    """
+    Набор полей, запрошенных через ``?fields=`` и ``?expand=``.
+
+    Каждый уровень вложенности описывается своим узлом. Если на уровне
+    ничего не запрошено, сериализатор отдаёт все поля, как и раньше.
+    Если запрошено, остаются перечисленные в ``fields`` поля (или все
+    простые поля, если ``fields`` на этом уровне пуст) и вложенные поля из
+    ``expand``. Узлы неизменяемы после разбора и годятся как ключ кэша.
+    """
+
+    def __init__(self):
+        self.fields = set()
+        self.expand = set()
+        self.children = {}
+
+    @classmethod
+    def parse(cls, fields, expand):
+        root = cls()
+        for target, paths in (("fields", fields), ("expand", expand)):
+            for path in paths:
+                node = root
+                for name in path.split("."):
+                    getattr(node, target).add(name)
+                    node = node.children.setdefault(name, cls())
+        return root if root.restricted else None
+
+    @classmethod
+    def from_request(cls, request):
+        if request is None or request.method not in ("GET", "HEAD"):
+            return None
+        params = request.query_params
+        return cls.parse(
+            split_param(params.get(FIELDS_PARAM)),
+            split_param(params.get(EXPAND_PARAM)),
+        )
+
+    @property
+    def restricted(self):
+        return bool(self.fields or self.expand)
+
+    def child(self, name):
+        node = self.children.get(name)
+        return node if node is not None and node.restricted else None
+
+    def allows(self, name, field):
+        # Скрытые и write-only поля не попадают в ответ, но нужны для записи.
+        if field.write_only or isinstance(field, serializers.HiddenField):
+            return True
+        if name in self.expand:
+            return True
+        if self.fields:
+            return name in self.fields
+        return not is_nested(field)
+
+    def key(self):
+        return (
+            frozenset(self.fields),
+            frozenset(self.expand),
+            tuple(sorted((name, node.key()) for name, node in self.children.items())),
+        )
+
+    def __eq__(self, other):
+        return isinstance(other, Selection) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+
+class SparseFieldsMixin:
+    """
+    Отбрасывает поля, не попавшие в выборку (см. Selection).
+
+    Выборка берётся из аргумента ``selection``, из родительского
+    сериализатора или, для сериализатора верхнего уровня, из запроса.
+    Вложенным сериализаторам из SerializerMethodField выборка передаётся
+    через ``nested_selection``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        if "selection" in kwargs:
+            self._selection = kwargs.pop("selection")
+        super().__init__(*args, **kwargs)
+
+    @property
+    def selection(self):
+        if hasattr(self, "_selection"):
+            return self._selection
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return None
+        self._selection = Selection.from_request(self.context.get("request"))
+        return self._selection
+
+    def nested_selection(self, name):
+        selection = self.selection
+        return selection.child(name) if selection is not None else None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selection = self.selection
+        if selection is None:
+            return fields
+        for name in list(fields):
+            if not selection.allows(name, fields[name]):
+                del fields[name]
+        for name, field in fields.items():
+            if isinstance(field, serializers.ListSerializer):
+                field = field.child
+            if isinstance(field, SparseFieldsMixin):
+                field._selection = selection.child(name)
+        return fields
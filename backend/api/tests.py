@@ -0,0 +1,79 @@
+import base64
+import datetime
+import json
+
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from trail.models import PointsOfInterest
+
+
+def forge_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("ascii")).decode()
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        # Ответы кэшируются по поколениям моделей, а те откатываются вместе
+        # с тестовой транзакцией: ответ прошлого теста не должен достаться
+        # этому.
+        cache.clear()
+        moments = [
+            timezone.make_aware(datetime.datetime(2024, 1, day, 12))
+            for day in (1, 1, 1, 2, 2, 2, 2, 3)
+        ]
+        for index, moment in enumerate(moments):
+            point = PointsOfInterest.objects.create(
+                name=f"point-{index}", description="", category="park"
+            )
+            # auto_now_add не даёт задать дату при создании.
+            PointsOfInterest.objects.filter(pk=point.pk).update(created_at=moment)
+        self.expected = list(
+            PointsOfInterest.objects.order_by("-created_at", "-id").values_list(
+                "name", flat=True
+            )
+        )
+        self.url = reverse("api:point-list")
+
+    def get(self, url, **params):
+        response = self.client.get(url, params, HTTP_ACCEPT="application/json")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_walks_duplicate_dates_forwards_and_backwards(self):
+        pages = [self.get(self.url, page_size=3)]
+        while pages[-1]["next"]:
+            pages.append(self.get(pages[-1]["next"]))
+
+        forwards = [item["name"] for page in pages for item in page["results"]]
+        self.assertEqual(forwards, self.expected)
+        self.assertIsNone(pages[0]["previous"])
+
+        backwards = [[item["name"] for item in pages[-1]["results"]]]
+        page = pages[-1]
+        while page["previous"]:
+            page = self.get(page["previous"])
+            backwards.insert(0, [item["name"] for item in page["results"]])
+
+        self.assertEqual(sum(backwards, []), self.expected)
+        self.assertTrue(all(len(names) <= 3 for names in backwards))
+
+    def test_invalid_cursor_is_not_found(self):
+        cursors = [
+            "не-base64",
+            "!!!",
+            forge_cursor([1, 2]),
+            forge_cursor({"p": "2024-01-01"}),
+            forge_cursor({"p": ["2024-01-01"]}),
+            forge_cursor({"p": ["вчера", 1]}),
+            forge_cursor({"p": ["2024-01-01T00:00:00Z", "один"]}),
+            forge_cursor({"p": [None, None]}),
+            forge_cursor({"p": [{"a": 1}, [2]]}),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    self.url, {"cursor": cursor}, HTTP_ACCEPT="application/json"
+                )
+                self.assertEqual(response.status_code, 404)
@@ -1,13 +1,16 @@
 from api.forms import CustomUserCreationForm
 from api.views import (
+    CheckpointStatsView,
     CollectionsViewSet,
     CustomLoginView,
     CustomLogoutView,
     CustomPasswordChangeView,
     CustomUserViewSet,
     PointsOfInterestViewSet,
+    ResponseCacheStatsView,
     ReviewsViewSet,
     RoutersViewSet,
+    SearchView,
 )
 from django.urls import include, path, reverse_lazy
 from django.views.generic.edit import CreateView
@@ -36,12 +39,30 @@ router_detail = RoutersViewSet.as_view(
     {"get": "retrieve", "put": "update", "patch": "partial_update", "delete": "destroy"}
 )
 router_create = RoutersViewSet.as_view({"get": "create", "post": "create"})
+router_typeahead = RoutersViewSet.as_view(
+    {"get": "typeahead"}, **RoutersViewSet.typeahead.kwargs
+)
+router_top = RoutersViewSet.as_view({"get": "top"}, **RoutersViewSet.top.kwargs)
+router_trending = RoutersViewSet.as_view(
+    {"get": "trending"}, **RoutersViewSet.trending.kwargs
+)
+router_optimize = RoutersViewSet.as_view(
+    {"post": "optimize"}, **RoutersViewSet.optimize.kwargs
+)
 
 point_list = PointsOfInterestViewSet.as_view({"get": "list", "post": "create"})
 point_detail = PointsOfInterestViewSet.as_view(
     {"get": "retrieve", "put": "update", "patch": "partial_update", "delete": "destroy"}
 )
 point_create = PointsOfInterestViewSet.as_view({"get": "create", "post": "create"})
+# Параметры из @action (рендереры) DRF применяет только при регистрации
+# через роутер, поэтому передаём их явно.
+point_nearby = PointsOfInterestViewSet.as_view(
+    {"get": "nearby"}, **PointsOfInterestViewSet.nearby.kwargs
+)
+point_typeahead = PointsOfInterestViewSet.as_view(
+    {"get": "typeahead"}, **PointsOfInterestViewSet.typeahead.kwargs
+)
 
 collection_list = CollectionsViewSet.as_view({"get": "list", "post": "create"})
 collection_detail = CollectionsViewSet.as_view(
@@ -51,6 +72,7 @@ collection_detail = CollectionsViewSet.as_view(
 collection_create = CollectionsViewSet.as_view({"get": "create", "post": "create"})
 
 review_list = ReviewsViewSet.as_view({"get": "list", "post": "create"})
+review_stats = ReviewsViewSet.as_view({"get": "stats"}, **ReviewsViewSet.stats.kwargs)
 review_detail = ReviewsViewSet.as_view(
     {"get": "retrieve", "put": "update", "patch": "partial_update", "delete": "destroy"}
 )
@@ -62,17 +84,27 @@ urlpatterns = [
     path("users/favorites/", user_favorites, name="user-favorites"),
     path("routers/", router_list, name="router-list"),
     path("routers/create/", router_create, name="router-create"),
+    path("routers/typeahead/", router_typeahead, name="router-typeahead"),
+    path("routers/top/", router_top, name="router-top"),
+    path("routers/trending/", router_trending, name="router-trending"),
     path("routers/<int:pk>/", router_detail, name="router-detail"),
+    path("routers/<int:pk>/optimize/", router_optimize, name="router-optimize"),
     path("points/", point_list, name="point-list"),
     path("points/create/", point_create, name="point-create"),
+    path("points/nearby/", point_nearby, name="point-nearby"),
+    path("points/typeahead/", point_typeahead, name="point-typeahead"),
     path("points/<int:pk>/", point_detail, name="point-detail"),
     path("collections/", collection_list, name="collection-list"),
     path("collections/<int:pk>/", collection_detail, name="collection-detail"),
     path("collections/create/", collection_create, name="collection-create"),
     path("routers/<int:router_id>/reviews/", review_list, name="review-list"),
+    path("routers/<int:router_id>/reviews/stats/", review_stats, name="review-stats"),
     path(
         "routers/<int:router_id>/reviews/<int:pk>/", review_detail, name="review-detail"
     ),
+    path("search/", SearchView.as_view(), name="search"),
+    path("cache/stats/", ResponseCacheStatsView.as_view(), name="cache-stats"),
+    path("checkpoint/stats/", CheckpointStatsView.as_view(), name="checkpoint-stats"),
     path("", include("djoser.urls")),
     path("auth/", include("djoser.urls.authtoken")),
     path("login/", CustomLoginView.as_view(), name="login"),
@@ -4,22 +4,50 @@ from api.forms import (
     PointsOfInterestForm,
     RouterForm,
 )
+from api.cache import cached_response, get_stats
+from api.conditional import conditional_response
+from api.fastread import get_reader
+from api.filters import (
+    PointsFilter,
+    RoutersFilter,
+    parse_nearby,
+    parse_search,
+    parse_top,
+    parse_typeahead,
+)
+from api.materialize import fragments_enabled, materialize
+from api.pagination import KeysetPagination
+from api.renderers import (
+    MessagePackRenderer,
+    ORJSONRenderer,
+    StreamingJSONRenderer,
+)
+from api.prefetch import plan_queryset
+from api.sparse import Selection
 from api.serializers import (
     CollectionsSerializer,
     CustomUserSerializer,
     FavoriteSerializer,
     PointsOfInterestSerializer,
     ReviewsSerializer,
+    RouteRatingSerializer,
     RoutersSerializer,
 )
 from django.contrib import messages
 from django.contrib.auth import get_user_model, logout
 from django.contrib.auth.views import LoginView, LogoutView, PasswordChangeView
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
 from djoser.views import UserViewSet
-from rest_framework import viewsets
-from rest_framework.renderers import JSONRenderer, TemplateHTMLRenderer
+from rest_framework import permissions, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.renderers import TemplateHTMLRenderer
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+from secureboot.checkpoint import get_stats as get_checkpoint_stats
 from trail.models import (
     CollectionRouters,
     Collections,
@@ -27,16 +55,188 @@ from trail.models import (
     PointsOfInterest,
     Reviews,
     RoutePoints,
+    RouteRating,
     Routers,
 )
+from trail.counters import increment
+from trail.nearby import get_index
+from trail.ratings import SCORES
+from trail.search import search
+from trail.tour import optimize_route
+from trail.trending import ensure_scheduler, record_view, top_trending
 
 User = get_user_model()
 
 
+class FragmentContextMixin:
+    """
+    Разрешает сериализаторам подставлять готовый JSON из кэша объектов,
+    когда ответ кодируется orjson.
+    """
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        # Кэш хранит полные представления, поэтому при ?fields=/?expand=
+        # объекты сериализуются заново.
+        context["fragments"] = (
+            fragments_enabled(self.request)
+            and Selection.from_request(self.request) is None
+        )
+        return context
+
+
+class PlannedQuerysetMixin:
+    """Подгружает связи, нужные сериализатору, фиксированным числом запросов."""
+
+    def get_queryset(self):
+        return plan_queryset(
+            super().get_queryset(),
+            self.get_serializer_class(),
+            Selection.from_request(self.request),
+        )
+
+
+class FastReadMixin:
+    """
+    Переключатель быстрого пути чтения для JSON-списков.
+
+    При ``fast_read = True`` список отдаётся через api.fastread: строки
+    читаются через ``.values()``, а ответ совпадает с ответом сериализатора.
+    """
+
+    fast_read = False
+
+    def list(self, request, *args, **kwargs):
+        if not self.fast_read:
+            return super().list(request, *args, **kwargs)
+        reader = get_reader(
+            self.get_serializer_class(), Selection.from_request(request)
+        )
+        ordering = getattr(self, "keyset_ordering", KeysetPagination.ordering)
+        queryset = reader.values(
+            self.filter_queryset(self.get_queryset()),
+            *(field.lstrip("-") for field in ordering),
+        )
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(
+            self.represent_rows(reader, page, self.get_serializer_context())
+        )
+
+    def represent_rows(self, reader, rows, context):
+        name = getattr(self.get_serializer_class(), "materialized_name", None)
+        if name is None or not context.get("fragments"):
+            return reader.represent(rows, context)
+        by_pk = {row[reader.pk]: row for row in rows}
+        return materialize(
+            name,
+            reader.model,
+            list(by_pk),
+            context,
+            lambda pks: dict(
+                zip(pks, reader.represent([by_pk[pk] for pk in pks], context))
+            ),
+        )
+
+
+class StreamingListMixin:
+    """
+    Потоковая выгрузка списка для ``?format=json-stream``.
+
+    Queryset читается через ``.iterator(chunk_size=...)`` и сериализуется
+    порциями, поэтому память не растёт с числом строк, а первый байт
+    уходит клиенту после первой порции.
+    """
+
+    stream_chunk_size = 500
+
+    def list(self, request, *args, **kwargs):
+        renderer = request.accepted_renderer
+        if not isinstance(renderer, StreamingJSONRenderer):
+            return super().list(request, *args, **kwargs)
+        return StreamingHttpResponse(
+            renderer.stream(self.iter_chunks()), content_type=renderer.media_type
+        )
+
+    def iter_chunks(self):
+        ordering = getattr(self, "keyset_ordering", KeysetPagination.ordering)
+        queryset = self.filter_queryset(self.get_queryset()).order_by(*ordering)
+        context = self.get_serializer_context()
+        if getattr(self, "fast_read", False):
+            reader = get_reader(
+                self.get_serializer_class(), Selection.from_request(self.request)
+            )
+            rows = reader.values(queryset).iterator(chunk_size=self.stream_chunk_size)
+            for chunk in self._chunked(rows):
+                yield self.represent_rows(reader, chunk, context)
+        else:
+            serializer_class = self.get_serializer_class()
+            rows = queryset.iterator(chunk_size=self.stream_chunk_size)
+            for chunk in self._chunked(rows):
+                yield serializer_class(chunk, many=True, context=context).data
+
+    def _chunked(self, rows):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == self.stream_chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+class KeysetListMixin:
+    """
+    Постраничная выдача списков по курсору для JSON и HTML.
+
+    HTML-страница отдаёт первую порцию целиком, а следующие порции
+    догружаются кнопкой "Загрузить ещё" как фрагменты по тем же курсорам.
+    """
+
+    pagination_class = KeysetPagination
+    list_template_name = None
+    list_fragment_template_name = None
+    list_context_name = None
+
+    def render_html_list(self, request, queryset):
+        page = self.paginate_queryset(queryset)
+        next_url = self.paginator.get_next_link()
+        if next_url:
+            next_url = replace_query_param(next_url, "fragment", 1)
+        template_name = self.list_template_name
+        if request.query_params.get("fragment"):
+            template_name = self.list_fragment_template_name
+        return render(
+            request,
+            template_name,
+            {self.list_context_name: page, "next_url": next_url},
+        )
+
+
+class TypeaheadMixin:
+    """
+    Подсказки ``typeahead/?q=`` для ленивых виджетов выбора в формах
+    (api.widgets). Слова ищутся по префиксу в поисковом индексе
+    (trail.search), тип документов задаёт ``typeahead_kind``.
+    """
+
+    typeahead_kind = None
+
+    @action(detail=False, renderer_classes=[ORJSONRenderer, MessagePackRenderer])
+    def typeahead(self, request):
+        query, limit = parse_typeahead(request.query_params)
+        return Response(
+            [
+                {"id": object_id, "label": title}
+                for _, object_id, title, _ in search(query, self.typeahead_kind, limit)
+            ]
+        )
+
+
 class CustomUserViewSet(UserViewSet):
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
-    renderer_classes = [JSONRenderer, TemplateHTMLRenderer]
+    renderer_classes = [ORJSONRenderer, TemplateHTMLRenderer, MessagePackRenderer]
 
     def list(self, request, *args, **kwargs):
         if request.accepted_renderer.format == "html":
@@ -77,17 +277,42 @@ class CustomPasswordChangeView(PasswordChangeView):
         return redirect(self.get_success_url())
 
 
-class RoutersViewSet(viewsets.ModelViewSet):
-    queryset = Routers.objects.prefetch_related("router_points__point").all()
+class RoutersViewSet(
+    TypeaheadMixin,
+    FragmentContextMixin,
+    PlannedQuerysetMixin,
+    KeysetListMixin,
+    StreamingListMixin,
+    FastReadMixin,
+    viewsets.ModelViewSet,
+):
+    queryset = Routers.objects.all()
     serializer_class = RoutersSerializer
-    renderer_classes = [JSONRenderer, TemplateHTMLRenderer]
-
+    renderer_classes = [
+        ORJSONRenderer,
+        TemplateHTMLRenderer,
+        MessagePackRenderer,
+        StreamingJSONRenderer,
+    ]
+    filter_backends = [RoutersFilter]
+    fast_read = True
+    typeahead_kind = "router"
+    list_template_name = "includes/routers_list.html"
+    list_fragment_template_name = "includes/routers_list_items.html"
+    list_context_name = "routers"
+    cache_models = (Routers, RoutePoints, PointsOfInterest, RouteRating, User)
+
+    @conditional_response
+    @cached_response
     def list(self, request, *args, **kwargs):
-        routers = self.queryset.all()
         if request.accepted_renderer.format == "html":
-            return render(request, "includes/routers_list.html", {"routers": routers})
+            return self.render_html_list(
+                request, self.filter_queryset(self.get_queryset())
+            )
         return super().list(request, *args, **kwargs)
 
+    @conditional_response
+    @cached_response
     def retrieve(self, request, *args, **kwargs):
         router = self.get_object()
         points = router.router_points.all()
@@ -97,7 +322,76 @@ class RoutersViewSet(viewsets.ModelViewSet):
                 "includes/router_detail.html",
                 {"router": router, "points": points},
             )
-        return super().retrieve(request, *args, **kwargs)
+        # Объект уже загружен вместе со связями, второй get_object не нужен.
+        return Response(self.get_serializer(router).data)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.action == "retrieve" and self.is_viewed(response, kwargs["pk"]):
+            # Просмотры копятся в памяти (trail.trending, trail.counters) и
+            # уходят в базу пачкой из фонового потока, в том числе для
+            # ответов из кэша.
+            ensure_scheduler()
+            record_view(int(kwargs["pk"]))
+            increment("views_count", int(kwargs["pk"]))
+        return response
+
+    def is_viewed(self, response, pk):
+        """
+        Считается только успешно отданный маршрут: иначе буфер просмотров
+        растёт от запросов к несуществующим id. 304 не проверяет id
+        (валидаторы общие для таблиц), поэтому маршрут ищется отдельно.
+        """
+        if response.status_code == 200:
+            return True
+        return (
+            response.status_code == 304
+            and str(pk).isdigit()
+            and Routers.objects.filter(pk=pk).exists()
+        )
+
+    @action(detail=False, renderer_classes=[ORJSONRenderer, MessagePackRenderer])
+    def trending(self, request):
+        """
+        Популярные сейчас маршруты (trail.trending), ``?limit=``: чтение
+        первых строк индекса trending_score_top_idx и пакетная загрузка
+        маршрутов через api.fastread.
+        """
+        ensure_scheduler()
+        ranked = top_trending(parse_top(request.query_params))
+        reader = get_reader(
+            self.get_serializer_class(), Selection.from_request(request)
+        )
+        found = reader.fetch(
+            [router_id for router_id, _ in ranked], self.get_serializer_context()
+        )
+        return Response(
+            [
+                {**found[router_id], "trending_score": round(score, 6)}
+                for router_id, score in ranked
+                if router_id in found
+            ]
+        )
+
+    @action(detail=False, renderer_classes=[ORJSONRenderer, MessagePackRenderer])
+    @conditional_response
+    @cached_response
+    def top(self, request):
+        """
+        Лучшие маршруты по байесовскому рейтингу (trail.ratings), ``?limit=``.
+        Порядок берётся одним запросом по индексу route_rating_top_idx,
+        сами маршруты читаются пакетно через api.fastread.
+        """
+        ids = list(
+            RouteRating.objects.filter(count__gt=0)
+            .order_by("-bayesian", "router_id")
+            .values_list("router_id", flat=True)[: parse_top(request.query_params)]
+        )
+        reader = get_reader(
+            self.get_serializer_class(), Selection.from_request(request)
+        )
+        found = reader.fetch(ids, self.get_serializer_context())
+        return Response([found[pk] for pk in ids if pk in found])
 
     def create(self, request, *args, **kwargs):
         if request.accepted_renderer.format == "html":
@@ -110,37 +404,66 @@ class RoutersViewSet(viewsets.ModelViewSet):
         )
         if request.method == "POST":
             if form.is_valid():
-                # Создаем маршрут без сохранения в базе данных
-                router = form.save(commit=False)
-                # Устанавливаем текущего пользователя как автора
-                router.author = request.user
-
-                # Сохраняем маршрут (он теперь сохраняется в БД)
-                router.save()
-
-                # Сохраняем точки интереса
-                points = form.cleaned_data.get("points_of_interest")
-                if points:
-                    for point in points:
-                        RoutePoints.objects.create(router=router, point=point)
+                # Форма сама назначает автора и сохраняет точки интереса
+                # одной транзакцией (см. RouterForm.save)
+                form.save()
 
                 # Перенаправляем на список маршрутов
                 return redirect("api:router-list")
 
         return render(request, "includes/router_create.html", {"form": form})
 
-
-class PointsOfInterestViewSet(viewsets.ModelViewSet):
+    @action(
+        detail=True,
+        methods=["post"],
+        renderer_classes=[ORJSONRenderer, MessagePackRenderer],
+    )
+    def optimize(self, request, pk=None):
+        """
+        Переставляет точки маршрута в короткий порядок обхода
+        (trail.tour) и сохраняет его. Доступно только автору маршрута.
+        """
+        router = get_object_or_404(Routers, pk=pk)
+        if router.author_id != request.user.pk:
+            raise PermissionDenied("Менять порядок точек может только автор.")
+        return Response(optimize_route(router.pk))
+
+
+class PointsOfInterestViewSet(
+    TypeaheadMixin,
+    PlannedQuerysetMixin,
+    KeysetListMixin,
+    StreamingListMixin,
+    FastReadMixin,
+    viewsets.ModelViewSet,
+):
     queryset = PointsOfInterest.objects.all()
     serializer_class = PointsOfInterestSerializer
-    renderer_classes = [JSONRenderer, TemplateHTMLRenderer]  # JSON + HTML
-
+    renderer_classes = [
+        ORJSONRenderer,
+        TemplateHTMLRenderer,
+        MessagePackRenderer,
+        StreamingJSONRenderer,
+    ]
+    filter_backends = [PointsFilter]
+    fast_read = True
+    typeahead_kind = "point"
+    list_template_name = "includes/points_list.html"
+    list_fragment_template_name = "includes/points_list_items.html"
+    list_context_name = "points"
+    cache_models = (PointsOfInterest,)
+
+    @conditional_response
+    @cached_response
     def list(self, request, *args, **kwargs):
-        points = self.queryset.all()
         if request.accepted_renderer.format == "html":
-            return render(request, "includes/points_list.html", {"points": points})
+            return self.render_html_list(
+                request, self.filter_queryset(self.get_queryset())
+            )
         return super().list(request, *args, **kwargs)
 
+    @conditional_response
+    @cached_response
     def retrieve(self, request, *args, **kwargs):
         point = self.get_object()
 
@@ -150,8 +473,29 @@ class PointsOfInterestViewSet(viewsets.ModelViewSet):
             # Передаем объект router и связанные points в контекст шаблона
             return render(request, "includes/point_detail.html", {"point": point})
 
-        # Для API-запросов возвращаем стандартный ответ
-        return super().retrieve(request, *args, **kwargs)
+        # Для API-запросов сериализуем уже загруженный объект
+        return Response(self.get_serializer(point).data)
+
+    @action(detail=False, renderer_classes=[ORJSONRenderer, MessagePackRenderer])
+    def nearby(self, request):
+        """
+        Ближайшие точки: ``?lat=&lon=`` и ``k`` и/или ``radius_km``.
+        Поиск идёт по индексу в памяти (trail.nearby), из базы читаются
+        только найденные точки.
+        """
+        lat, lon, k, radius_km = parse_nearby(request.query_params)
+        [(ids, distances)] = get_index().query([lat], [lon], k, radius_km)
+        reader = get_reader(
+            self.get_serializer_class(), Selection.from_request(request)
+        )
+        found = reader.fetch(ids.tolist(), self.get_serializer_context())
+        return Response(
+            [
+                {**found[pk], "distance_km": round(float(distance), 3)}
+                for pk, distance in zip(ids.tolist(), distances)
+                if pk in found
+            ]
+        )
 
     def create(self, request, *args, **kwargs):
         if request.accepted_renderer.format == "html":
@@ -170,49 +514,100 @@ class PointsOfInterestViewSet(viewsets.ModelViewSet):
         return render(request, "includes/point_create.html", {"form": form})
 
 
-class ReviewsViewSet(viewsets.ModelViewSet):
+class ReviewsViewSet(
+    FragmentContextMixin,
+    PlannedQuerysetMixin,
+    KeysetListMixin,
+    FastReadMixin,
+    viewsets.ModelViewSet,
+):
     queryset = Reviews.objects.all()
     serializer_class = ReviewsSerializer
-    renderer_classes = [JSONRenderer, TemplateHTMLRenderer]  # JSON + HTML
-
+    renderer_classes = [ORJSONRenderer, TemplateHTMLRenderer, MessagePackRenderer]
+    keyset_ordering = ("-pub_date", "-id")
+    list_template_name = "includes/reviews_list.html"
+    list_fragment_template_name = "includes/reviews_list_items.html"
+    list_context_name = "reviews"
+    # Автор отзыва скрыт (HiddenField), зато каждый отзыв несёт свой маршрут
+    # (ShortRoutersSerializer).
+    cache_models = (Reviews, Routers)
+
+    @conditional_response
     def list(self, request, *args, **kwargs):
-        reviews = self.queryset.all()
         if request.accepted_renderer.format == "html":
-            return render(request, "includes/reviews_list.html", {"reviews": reviews})
+            return self.render_html_list(request, self.get_queryset())
         return super().list(request, *args, **kwargs)
 
     def get_queryset(self):
-        return Reviews.objects.select_related("author", "router").filter(
-            router_id=self.kwargs["router_id"]
+        return (
+            super()
+            .get_queryset()
+            .select_related("author")
+            .filter(router_id=self.kwargs["router_id"])
         )
 
     def perform_create(self, serializer):
         router = get_object_or_404(Routers, id=self.kwargs["router_id"])
         serializer.save(author=self.request.user, router=router)
 
-
-class CollectionsViewSet(viewsets.ModelViewSet):
-    queryset = Collections.objects.prefetch_related(
-        "collection_routers__router"
-    ).filter(is_public__exact=1)
+    @action(detail=False, renderer_classes=[ORJSONRenderer, MessagePackRenderer])
+    def stats(self, request, router_id=None):
+        """
+        Агрегаты оценок маршрута из RouteRating (trail.ratings): число,
+        сумма, среднее, байесовский рейтинг и гистограмма, без чтения
+        самих отзывов.
+        """
+        rating = RouteRating.objects.filter(router_id=router_id).first()
+        if rating is None:
+            # Отзывов ещё не было: отдаём нулевые агрегаты.
+            get_object_or_404(Routers, pk=router_id)
+            rating = RouteRating(router_id=router_id)
+        data = RouteRatingSerializer(rating).data
+        data["histogram"] = {
+            score: getattr(rating, f"score_{score}") for score in SCORES
+        }
+        return Response(data)
+
+
+class CollectionsViewSet(
+    FragmentContextMixin,
+    PlannedQuerysetMixin,
+    KeysetListMixin,
+    FastReadMixin,
+    viewsets.ModelViewSet,
+):
+    queryset = Collections.objects.filter(is_public__exact=1)
     serializer_class = CollectionsSerializer
-    renderer_classes = [JSONRenderer, TemplateHTMLRenderer]  # JSON + HTML
-
+    renderer_classes = [ORJSONRenderer, TemplateHTMLRenderer, MessagePackRenderer]
+    list_template_name = "includes/collections_list.html"
+    list_fragment_template_name = "includes/collections_list_items.html"
+    list_context_name = "collections"
+    cache_models = (
+        Collections,
+        CollectionRouters,
+        Routers,
+        RoutePoints,
+        PointsOfInterest,
+        RouteRating,
+        User,
+    )
+
+    @conditional_response
+    @cached_response
     def list(self, request, *args, **kwargs):
-        collections = self.queryset.all()
         if request.accepted_renderer.format == "html":
-            return render(
-                request, "includes/collections_list.html", {"collections": collections}
-            )
+            return self.render_html_list(request, self.get_queryset())
         return super().list(request, *args, **kwargs)
 
+    @conditional_response
+    @cached_response
     def retrieve(self, request, *args, **kwargs):
         collection = self.get_object()
         if request.accepted_renderer.format == "html":
             return render(
                 request, "includes/collection_detail.html", {"collection": collection}
             )
-        return super().retrieve(request, *args, **kwargs)
+        return Response(self.get_serializer(collection).data)
 
     def create(self, request, *args, **kwargs):
         if request.accepted_renderer.format == "html":
@@ -223,33 +618,69 @@ class CollectionsViewSet(viewsets.ModelViewSet):
         form = CollectionForm(request.POST or None, user=request.user)
         if request.method == "POST":
             if form.is_valid():
-                # Создаем коллекцию без сохранения в базе данных
-                collection = form.save(commit=False)
-                collection.author = request.user
-                collection.save()  # сохраняем коллекцию
-
-                # Обработка выбранных маршрутов
-                routers = form.cleaned_data.get("routers")
-                if routers:
-                    for router in routers:
-                        CollectionRouters.objects.create(
-                            collection=collection, router=router
-                        )
+                # Коллекция и выбранные маршруты сохраняются одной
+                # транзакцией (см. CollectionForm.save)
+                form.save()
 
                 return redirect("api:collection-list")
         return render(request, "includes/collection_create.html", {"form": form})
 
 
-class FavoritesViewSet(viewsets.ReadOnlyModelViewSet):
+class FavoritesViewSet(
+    PlannedQuerysetMixin, KeysetListMixin, viewsets.ReadOnlyModelViewSet
+):
     serializer_class = FavoriteSerializer
-    renderer_classes = [TemplateHTMLRenderer, JSONRenderer]
+    renderer_classes = [TemplateHTMLRenderer, ORJSONRenderer, MessagePackRenderer]
+    # У Favorite нет даты добавления, поэтому курсор строится только по id.
+    keyset_ordering = ("-id",)
+    list_template_name = "includes/favorites.html"
+    list_fragment_template_name = "includes/favorites_items.html"
+    list_context_name = "favorites"
 
     def get_queryset(self):
-        return Favorite.objects.filter(user=self.request.user)
+        return Favorite.objects.select_related("router").filter(user=self.request.user)
 
     def list(self, request, *args, **kwargs):
         if request.accepted_renderer.format == "html":
-            return render(
-                request, "includes/favorites.html", {"favorites": self.get_queryset()}
-            )
+            return self.render_html_list(request, self.get_queryset())
         return super().list(request, *args, **kwargs)
+
+
+class SearchView(APIView):
+    """
+    Полнотекстовый поиск: ``?q=`` (слова ищутся по префиксу), ``kind``
+    (router, point или collection) и ``limit``. Ранжирование и индекс
+    зависят от СУБД, см. trail.search.
+    """
+
+    renderer_classes = [ORJSONRenderer, MessagePackRenderer]
+
+    def get(self, request):
+        query, kind, limit = parse_search(request.query_params)
+        return Response(
+            [
+                {"kind": kind, "id": object_id, "title": title, "score": score}
+                for kind, object_id, title, score in search(query, kind, limit)
+            ]
+        )
+
+
+class ResponseCacheStatsView(APIView):
+    """Счётчики попаданий и промахов кэша ответов (только для админов)."""
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(get_stats())
+
+
+class CheckpointStatsView(APIView):
+    """
+    Контрольные точки зашифрованной базы (secureboot.checkpoint):
+    число, длительность и объём последней (только для админов).
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(get_checkpoint_stats())
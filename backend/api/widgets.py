@@ -0,0 +1,29 @@
+from django import forms
+
+
+class TypeaheadSelectMultiple(forms.SelectMultiple):
+    """
+    Множественный выбор без полного списка вариантов.
+
+    Выводятся только выбранные объекты (один запрос ``pk__in``), а
+    остальные варианты браузер подгружает по мере ввода из ``url``
+    (см. ``TypeaheadMixin`` и скрипт ``typeahead`` в base.html).
+    """
+
+    def __init__(self, url, attrs=None):
+        super().__init__({**(attrs or {}), "data-typeahead": url})
+
+    def optgroups(self, name, value, attrs=None):
+        # self.choices — ModelChoiceIterator поля ModelMultipleChoiceField.
+        selected = [pk for pk in value if str(pk).isdigit()]
+        if not selected:
+            return []
+        groups = []
+        queryset = self.choices.queryset.filter(pk__in=selected)
+        for index, obj in enumerate(queryset):
+            option_value, label = self.choices.choice(obj)
+            option = self.create_option(
+                name, option_value, label, True, index, attrs=attrs
+            )
+            groups.append((None, [option], index))
+        return groups
@@ -15,7 +15,14 @@ def main():
             "available on your PYTHONPATH environment variable? Did you "
             "forget to activate a virtual environment?"
         ) from exc
-    execute_from_command_line(sys.argv)
+    try:
+        execute_from_command_line(sys.argv)
+    finally:
+        # База в памяти (LAB_DB_IN_MEMORY=1) запечатывается до завершения
+        # интерпретатора, а не из atexit.
+        from secureboot.crypto_db_manager import seal_memory_db
+
+        seal_memory_db()
 
 
 if __name__ == '__main__':
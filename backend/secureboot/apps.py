@@ -32,7 +32,8 @@ class SecureBootConfig(AppConfig):
 
         # Если команда runserver_secure (наша обёртка),
         # то тоже не дергаем decrypt_db тут, потому что команда сама всё сделает.
-        if current_cmd == "runserver_secure":
+        # bench_crypto работает только с временными файлами, база ей не нужна.
+        if current_cmd in {"runserver_secure", "bench_crypto"}:
             return
 
         # Всё остальное:
@@ -0,0 +1,170 @@
+# secureboot/checkpoint.py
+"""
+Фоновые контрольные точки: открытая база периодически снимается и
+запечатывается в db.sqlite3.enc, пока сервер работает.
+
+Без них db.sqlite3.enc обновлялся только при остановке runserver_secure:
+падение процесса теряло всё с момента запуска, а финальное шифрование
+задерживало остановку на всё время работы с базой. Теперь при падении
+теряется не больше интервала, а при остановке дошифровываются только
+страницы, изменённые после последней точки (secureboot.pages).
+
+Снимок делается online backup API SQLite небольшими шагами, поэтому
+писатели не ждут, пока копируется вся база. База в памяти снимается
+в память, файловая — во временный файл рядом с ней (открытый db.sqlite3
+и так лежит на диске), который затем затирается. Снимок запечатывается
+под тем же замком, что и финальное шифрование: полный перепис идёт через
+временный файл и rename, частичный — через журнал, так что сбой во время
+контрольной точки оставляет прежнюю согласованную копию.
+
+Интервал задаёт ``SECUREBOOT_CHECKPOINT_SECONDS``; 0 отключает поток.
+Длительность и итог последней точки отдаёт ``get_stats()``.
+"""
+
+import io
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import crypto_db_manager
+
+logger = logging.getLogger(__name__)
+
+# Страниц за один шаг backup: между шагами писатели могут зафиксировать
+# транзакцию (тогда копирование начнётся заново).
+BACKUP_STEP_PAGES = 256
+BACKUP_STEP_SLEEP = 0.005
+
+_stats = {
+    "checkpoints": 0,
+    "skipped": 0,
+    "failures": 0,
+    "last_at": None,
+    "last_duration_ms": None,
+    "last_snapshot_ms": None,
+    "last_pages": None,
+}
+_stats_lock = threading.Lock()
+_thread = None
+_stop = threading.Event()
+
+
+def get_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["running"] = _thread is not None and _thread.is_alive()
+    stats["interval"] = getattr(settings, "SECUREBOOT_CHECKPOINT_SECONDS", 300)
+    return stats
+
+
+def open_source():
+    """Соединение с открытой базой, из которой снимаются точки."""
+    if crypto_db_manager.memory_db_loaded():
+        return sqlite3.connect(crypto_db_manager.MEMORY_URI, uri=True)
+    return sqlite3.connect(crypto_db_manager.DB_PATH)
+
+
+def data_version(source):
+    # Меняется, когда другие соединения фиксируют изменения.
+    return source.execute("PRAGMA data_version").fetchone()[0]
+
+
+def take_checkpoint(source, passphrase):
+    """Снимает базу и запечатывает снимок. Возвращает число страниц."""
+    started = time.perf_counter()
+    if crypto_db_manager.memory_db_loaded():
+        target = sqlite3.connect(":memory:")
+        try:
+            source.backup(target, pages=BACKUP_STEP_PAGES, sleep=BACKUP_STEP_SLEEP)
+            data = target.serialize()
+        finally:
+            target.close()
+        snapshot_ms = (time.perf_counter() - started) * 1000
+        with crypto_db_manager.seal_lock:
+            written = crypto_db_manager.seal_snapshot(
+                io.BytesIO(data), len(data), passphrase
+            )
+    else:
+        path = crypto_db_manager.DB_PATH + ".checkpoint"
+        try:
+            target = sqlite3.connect(path)
+            try:
+                source.backup(target, pages=BACKUP_STEP_PAGES, sleep=BACKUP_STEP_SLEEP)
+            finally:
+                target.close()
+            snapshot_ms = (time.perf_counter() - started) * 1000
+            with crypto_db_manager.seal_lock, open(path, "rb") as src:
+                written = crypto_db_manager.seal_snapshot(
+                    src, os.path.getsize(path), passphrase
+                )
+        finally:
+            crypto_db_manager.secure_delete(path)
+
+    with _stats_lock:
+        _stats["checkpoints"] += 1
+        _stats["last_at"] = timezone.now().isoformat()
+        _stats["last_duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        _stats["last_snapshot_ms"] = round(snapshot_ms, 1)
+        _stats["last_pages"] = written
+    return written
+
+
+def run_checkpointer(interval, passphrase):
+    source = open_source()
+    # Только что расшифрованная база совпадает с db.sqlite3.enc.
+    sealed_version = data_version(source)
+    try:
+        while not _stop.wait(interval):
+            try:
+                version = data_version(source)
+                if version == sealed_version:
+                    with _stats_lock:
+                        _stats["skipped"] += 1
+                    continue
+                written = take_checkpoint(source, passphrase)
+                sealed_version = version
+                logger.info(
+                    "Контрольная точка: %s стр. за %s мс",
+                    written,
+                    _stats["last_duration_ms"],
+                )
+            except Exception:
+                with _stats_lock:
+                    _stats["failures"] += 1
+                logger.exception("Не удалось сделать контрольную точку базы")
+    finally:
+        source.close()
+
+
+def start_checkpointer(passphrase):
+    """
+    Запускает поток контрольных точек, если он ещё не запущен и интервал
+    не равен 0. Вызывается после того, как база расшифрована.
+    """
+    global _thread
+    interval = getattr(settings, "SECUREBOOT_CHECKPOINT_SECONDS", 300)
+    if not interval or (_thread is not None and _thread.is_alive()):
+        return
+    _stop.clear()
+    _thread = threading.Thread(
+        target=run_checkpointer,
+        args=(interval, passphrase),
+        name="secureboot-checkpoint",
+        daemon=True,
+    )
+    _thread.start()
+
+
+def stop_checkpointer():
+    """Останавливает поток и дожидается текущей контрольной точки."""
+    global _thread
+    if _thread is None:
+        return
+    _stop.set()
+    _thread.join()
+    _thread = None
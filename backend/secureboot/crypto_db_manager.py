@@ -1,18 +1,150 @@
 # secureboot/crypto_db_manager.py
+import atexit
+import io
 import os
 import sys
 import sqlite3
-from .crypto_win import CryptoSession
+import threading
+
+from . import pages, parallel
+from .pages import CHUNK_SIZE
+
+if sys.platform == "win32":
+    from .crypto_win import CryptoSession
+else:
+    from .crypto_portable import CryptoSession
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 ENC_PATH = os.path.join(BASE_DIR, "db.sqlite3.enc")
 DB_PATH  = os.path.join(BASE_DIR, "db.sqlite3")
 
+# Режим «база только в памяти» (LAB_DB_IN_MEMORY=1): расшифрованные байты
+# загружаются через sqlite3.deserialize, открытый db.sqlite3 на диске
+# не появляется, поэтому и стирать его не нужно. deserialize всегда создаёт
+# частную базу одного соединения, а у Django по соединению на поток, так что
+# база копируется backup-ом в именованную memdb: её открывают все соединения
+# процесса, пока жива «якорная» связь _memory_db.
+MEMORY_URI = "file:/secureboot?vfs=memdb"
+_memory_db = None
+# Пароль, которым база в памяти запечатывается перед выходом (seal_memory_db).
+_memory_passphrase = None
+# PRAGMA data_version на момент последнего запечатывания: при выходе
+# неизменённую базу повторно не шифруем.
+_sealed_version = None
+# Запечатывание из фонового checkpoint-потока (secureboot.checkpoint)
+# и финальное при остановке не должны идти одновременно.
+seal_lock = threading.Lock()
+
+
+def read_chunks(f, chunk_size=CHUNK_SIZE):
+    """
+    Читает файл кусками и отмечает последний: ``(chunk, final)``.
+    Пустой файл даёт один пустой последний кусок, чтобы шифр дописал
+    дополнение.
+    """
+    chunk = f.read(chunk_size)
+    while True:
+        following = f.read(chunk_size)
+        yield chunk, not following
+        if not following:
+            return
+        chunk = following
+
+
+def write_chunks(chunks, dst_path, transform):
+    """Пропускает куски через ``transform(chunk, final)`` в ``dst_path``."""
+    with open(dst_path, "wb") as dst:
+        for chunk, final in chunks:
+            dst.write(transform(chunk, final))
+        dst.flush()
+        os.fsync(dst.fileno())
+
+
+def stream(src_path, dst_path, transform):
+    """Пропускает файл через ``transform(chunk, final)`` в ``dst_path``."""
+    with open(src_path, "rb") as src:
+        write_chunks(read_chunks(src), dst_path, transform)
+
+
+def decrypt_chunks(sess):
+    """
+    Открытая база кусками по CHUNK_SIZE. Понимает постраничный формат
+    (secureboot.pages) и прежний — один поток 3DES с дополнением в конце.
+    """
+    pages.recover(ENC_PATH)
+    if pages.is_paged(ENC_PATH):
+        yield from pages.unseal_chunks(ENC_PATH, sess)
+        return
+    with open(ENC_PATH, "rb") as src:
+        for chunk, final in read_chunks(src):
+            yield sess.decrypt_buffer(chunk, final)
+
+
+def parallel_sizes():
+    """
+    ``(length, body)`` постраничного db.sqlite3.enc, если его тело стоит
+    расшифровать пулом процессов (secureboot.parallel); иначе None.
+    """
+    pages.recover(ENC_PATH)
+    if not pages.is_paged(ENC_PATH):
+        return None
+    length, body = pages.sealed_size(ENC_PATH)
+    return (length, body) if parallel.worker_count(body) > 1 else None
+
+
+def in_memory_enabled() -> bool:
+    """
+    Включён ли режим «база только в памяти». Нужны Python 3.11+
+    (sqlite3.deserialize) и SQLite 3.36+ (memdb); иначе работаем с файлом.
+    """
+    if os.getenv("LAB_DB_IN_MEMORY") != "1":
+        return False
+    if not hasattr(sqlite3.Connection, "deserialize") or (
+        sqlite3.sqlite_version_info < (3, 36)
+    ):
+        print("LAB_DB_IN_MEMORY не поддерживается этим Python/SQLite -> db.sqlite3")
+        return False
+    return True
+
+
+def memory_db_loaded() -> bool:
+    return _memory_db is not None
+
+
+def load_memory_db(plaintext) -> sqlite3.Connection:
+    """Загружает расшифрованную базу в memdb и возвращает якорное соединение."""
+    private = sqlite3.connect(":memory:")
+    try:
+        private.deserialize(plaintext)
+        anchor = sqlite3.connect(MEMORY_URI, uri=True, check_same_thread=False)
+        private.backup(anchor)
+    finally:
+        private.close()
+    return anchor
+
+
+def bind_django():
+    """Переключает соединение Django на базу в памяти."""
+    from django.conf import settings
+    from django.db import connections
+
+    settings.DATABASES["default"]["NAME"] = MEMORY_URI
+    connections["default"].close()
+
+
+def data_version():
+    # data_version меняют только чужие фиксации, свои — total_changes.
+    version = _memory_db.execute("PRAGMA data_version").fetchone()[0]
+    return version, _memory_db.total_changes
+
+
 def decrypt_db(passphrase: str):
     """
     1. CryptoSession(passphrase) → MD4 -> DeriveKey -> 3DES -> ECB
-    2. Читаем db.sqlite3.enc целиком.
-    3. CryptDecrypt(...) -> plaintext -> db.sqlite3.
+    2. Читаем db.sqlite3.enc кусками по CHUNK_SIZE (после доигрывания журнала).
+    3. CryptDecrypt(...) каждого куска -> db.sqlite3
+       (или сразу в память, если включён LAB_DB_IN_MEMORY). Большой
+       постраничный файл расшифровывает пул процессов (secureboot.parallel).
     4. Проверяем наличие администратора (is_superuser=1).
     5. Если админа нет → немедленный sys.exit(1). Это пункт 4+5. :contentReference[oaicite:15]{index=15}
     """
@@ -23,16 +155,33 @@ def decrypt_db(passphrase: str):
 
     sess = CryptoSession(passphrase)
 
-    with open(ENC_PATH, "rb") as f:
-        ciphertext = f.read()
-
-    plaintext = sess.decrypt_buffer(ciphertext, final=True)
+    if in_memory_enabled():
+        decrypt_to_memory(sess, passphrase)
+        sess.close()
+        return
 
-    with open(DB_PATH, "wb") as out:
-        out.write(plaintext)
+    try:
+        sizes = parallel_sizes()
+        if sizes:
+            length, body = sizes
+            with open(DB_PATH, "wb") as dst:
+                dst.truncate(body)
+            region = parallel.Region("file", DB_PATH, 0)
+            pages.unseal_parallel(ENC_PATH, region, passphrase)
+            with open(DB_PATH, "r+b") as dst:
+                dst.truncate(length)
+                os.fsync(dst.fileno())
+        else:
+            with open(DB_PATH, "wb") as dst:
+                for chunk in decrypt_chunks(sess):
+                    dst.write(chunk)
+        decrypted = True
+    except RuntimeError:
+        # Неверный пароль обычно ломает дополнение в последнем блоке.
+        decrypted = False
 
     # Проверяем администратора
-    if not has_admin(DB_PATH):
+    if not decrypted or not has_admin(DB_PATH):
         secure_delete(DB_PATH)
         sess.close()
         print("Неверная парольная фраза или нет администратора -> отказ запуска")
@@ -41,52 +190,128 @@ def decrypt_db(passphrase: str):
     sess.close()
 
 
+def decrypt_to_memory(sess, passphrase: str):
+    """
+    Расшифровывает db.sqlite3.enc в память, проверяет администратора
+    на том же соединении и переключает на него Django. Перед выходом
+    изменённую базу запечатывает seal_memory_db (manage.py вызывает её
+    явно, atexit — запасной путь для остальных точек входа).
+    """
+    global _memory_db, _memory_passphrase, _sealed_version
+
+    anchor = None
+    try:
+        sizes = parallel_sizes()
+        if sizes:
+            length, body = sizes
+            with parallel.shared_buffer(body) as (region, view):
+                pages.unseal_parallel(ENC_PATH, region, passphrase)
+                with view[:length] as plaintext:
+                    anchor = load_memory_db(plaintext)
+        else:
+            plaintext = bytearray()
+            for chunk in decrypt_chunks(sess):
+                plaintext += chunk
+            anchor = load_memory_db(plaintext)
+            del plaintext
+    except (RuntimeError, sqlite3.DatabaseError):
+        # Неверный пароль: битое дополнение или не база SQLite.
+        pass
+
+    if anchor is None or not has_admin(anchor):
+        if anchor is not None:
+            anchor.close()
+        sess.close()
+        print("Неверная парольная фраза или нет администратора -> отказ запуска")
+        sys.exit(1)
+
+    _memory_db = anchor
+    _memory_passphrase = passphrase
+    _sealed_version = data_version()
+    bind_django()
+    atexit.register(seal_memory_db)
+
+
+def seal_memory_db():
+    """
+    Запечатывает базу в памяти, если она загружена. Вызывается перед
+    выходом из процесса, пока пул процессов (secureboot.parallel) ещё
+    доступен; повторный вызов без изменений ничего не шифрует.
+    """
+    if memory_db_loaded():
+        return encrypt_db(_memory_passphrase)
+
+
 def encrypt_db(passphrase: str):
     """
-    1. Читаем db.sqlite3.
-    2. Шифруем через CryptoSession(passphrase).
-    3. Пишем результат в db.sqlite3.enc.
+    1. Читаем db.sqlite3 постранично и сравниваем хеши страниц с манифестом.
+    2. Шифруем через CryptoSession(passphrase) только изменённые страницы.
+    3. Переписываем их в db.sqlite3.enc на месте через журнал (или весь файл
+       через временный, если изменилось больше половины), см. secureboot.pages.
     4. Стираем и удаляем db.sqlite3.
+    Если база расшифрована в память, шифруется её serialize(): открытого
+    файла нет, пункт 4 не нужен, а неизменённая база не перешифровывается.
+    Возвращает число зашифрованных страниц.
     Это пункт 3 и пункт 6 методички. :contentReference[oaicite:16]{index=16}
     """
-    if not os.path.exists(DB_PATH):
-        print("Нет открытой базы db.sqlite3, пропускаю.")
-        return
+    global _sealed_version
 
-    sess = CryptoSession(passphrase)
+    with seal_lock:
+        if memory_db_loaded():
+            version = data_version()
+            if version == _sealed_version:
+                return 0
+            data = _memory_db.serialize()
+            written = seal_snapshot(io.BytesIO(data), len(data), passphrase)
+            _sealed_version = version
+            return written
 
-    with open(DB_PATH, "rb") as f:
-        plaintext = f.read()
+        if not os.path.exists(DB_PATH):
+            print("Нет открытой базы db.sqlite3, пропускаю.")
+            return
 
-    ciphertext = sess.encrypt_buffer(plaintext, final=True)
+        with open(DB_PATH, "rb") as src:
+            written = seal_snapshot(src, os.path.getsize(DB_PATH), passphrase)
 
-    with open(ENC_PATH, "wb") as out:
-        out.write(ciphertext)
+        secure_delete(DB_PATH)
+        return written
 
-    sess.close()
 
-    secure_delete(DB_PATH)
+def seal_snapshot(src, length, passphrase: str):
+    """
+    Запечатывает открытую базу ``src`` длиной ``length`` в db.sqlite3.enc.
+    Вызывается под ``seal_lock``.
+    """
+    sess = CryptoSession(passphrase)
+    try:
+        return pages.seal(src, length, sess, passphrase, ENC_PATH)
+    finally:
+        sess.close()
 
 
 def secure_delete(path: str):
     if not os.path.exists(path):
         return
     size = os.path.getsize(path)
+    zeros = bytes(CHUNK_SIZE)
     with open(path, "r+b") as f:
-        f.write(b"\x00" * size)
+        for offset in range(0, size, CHUNK_SIZE):
+            f.write(zeros[: min(CHUNK_SIZE, size - offset)])
         f.flush()
         os.fsync(f.fileno())
     os.remove(path)
 
 
-def has_admin(db_path: str) -> bool:
+def has_admin(db) -> bool:
     """
     Возвращает True, если найден хотя бы один пользователь с правами администратора.
+    ``db`` — путь к файлу базы или уже открытое соединение (база в памяти).
     Мы пробуем сначала кастомную таблицу users_user (для кастомной модели),
     а если её нет, fallback на стандартную auth_user.
     """
 
-    conn = sqlite3.connect(db_path)
+    own = not isinstance(db, sqlite3.Connection)
+    conn = sqlite3.connect(db) if own else db
     cur = conn.cursor()
 
     count_admin = 0
@@ -110,5 +335,7 @@ def has_admin(db_path: str) -> bool:
         except Exception:
             pass
 
-    conn.close()
+    cur.close()
+    if own:
+        conn.close()
     return count_admin > 0
@@ -0,0 +1,126 @@
+# secureboot/crypto_portable.py
+"""
+Переносимая реализация CryptoSession (Linux, macOS, Windows без CryptoAPI).
+
+Повторяет то, что делает crypto_win через advapi32, байт в байт:
+- MD4 от пароля в UTF-8 (OpenSSL 3 MD4 по умолчанию не даёт,
+  поэтому он написан здесь на чистом Python — хешируется только пароль);
+- ключ 3DES как в CryptDeriveKey без соли: хеш дополняется до 64 байт
+  константами 0x36 и 0x5C, оба буфера хешируются, берутся первые 24 байта;
+- 3DES в режиме ECB (шифр из OpenSSL через cryptography), дополнение
+  PKCS#5 при ``final=True``, как у CryptEncrypt.
+
+Поэтому db.sqlite3.enc, запечатанный на Windows, открывается на Linux
+и наоборот. В отличие от CryptoAPI, куски можно подавать любой длины:
+неполный блок дожидается следующего вызова.
+"""
+
+import struct
+
+from cryptography.hazmat.decrepit.ciphers.algorithms import TripleDES
+from cryptography.hazmat.primitives import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, modes
+
+BLOCK_SIZE = 8  # размер блока 3DES в байтах
+KEY_SIZE = 24  # 3DES: три ключа DES по 8 байт
+
+
+def _rotl(value, shift):
+    value &= 0xFFFFFFFF
+    return ((value << shift) | (value >> (32 - shift))) & 0xFFFFFFFF
+
+
+def md4(data: bytes) -> bytes:
+    """MD4 (RFC 1320)."""
+    length = len(data)
+    data = data + b"\x80" + b"\x00" * ((55 - length) % 64)
+    data += struct.pack("<Q", (length * 8) & 0xFFFFFFFFFFFFFFFF)
+    state = [0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476]
+
+    for offset in range(0, len(data), 64):
+        x = struct.unpack("<16I", data[offset : offset + 64])
+        a, b, c, d = state
+
+        # Раунд 1: F(x, y, z) = xy | ~xz
+        for i in range(16):
+            k, s = i, (3, 7, 11, 19)[i % 4]
+            a = _rotl(a + ((b & c) | (~b & d)) + x[k], s)
+            a, b, c, d = d, a, b, c
+        # Раунд 2: G(x, y, z) = xy | xz | yz
+        for i in range(16):
+            k, s = (i % 4) * 4 + i // 4, (3, 5, 9, 13)[i % 4]
+            a = _rotl(a + ((b & c) | (b & d) | (c & d)) + x[k] + 0x5A827999, s)
+            a, b, c, d = d, a, b, c
+        # Раунд 3: H(x, y, z) = x ^ y ^ z
+        for i in range(16):
+            k = (0, 8, 4, 12, 2, 10, 6, 14, 1, 9, 5, 13, 3, 11, 7, 15)[i]
+            s = (3, 9, 11, 15)[i % 4]
+            a = _rotl(a + (b ^ c ^ d) + x[k] + 0x6ED9EBA1, s)
+            a, b, c, d = d, a, b, c
+
+        state = [(v + n) & 0xFFFFFFFF for v, n in zip(state, (a, b, c, d))]
+
+    return struct.pack("<4I", *state)
+
+
+def derive_key(passphrase: str) -> bytes:
+    """
+    Ключ 3DES так же, как CryptDeriveKey(CALG_3DES, хеш MD4, без соли):
+    хеш короче нужного ключа, поэтому он растягивается через два буфера.
+    """
+    digest = md4(passphrase.encode("utf-8"))
+    inner = bytes(b ^ 0x36 for b in digest) + b"\x36" * (64 - len(digest))
+    outer = bytes(b ^ 0x5C for b in digest) + b"\x5c" * (64 - len(digest))
+    return (md4(inner) + md4(outer))[:KEY_SIZE]
+
+
+class CryptoSession:
+    """
+    Тот же интерфейс, что у crypto_win.CryptoSession:
+    encrypt_buffer/decrypt_buffer(data, final) и close().
+
+    Шифрование и расшифровка — потоковые: сессия помнит незаконченный
+    блок между вызовами, а при ``final=True`` добавляет или снимает
+    дополнение и готова к следующему потоку. Без ``final`` выровненные
+    по блоку данные шифруются и расшифровываются как есть.
+    """
+
+    def __init__(self, passphrase: str):
+        self._cipher = Cipher(TripleDES(derive_key(passphrase)), modes.ECB())
+        self._encryptor = None
+        self._decryptor = None
+
+    def encrypt_buffer(self, data: bytes, final: bool) -> bytes:
+        if self._encryptor is None:
+            self._encryptor = (
+                self._cipher.encryptor(),
+                padding.PKCS7(BLOCK_SIZE * 8).padder(),
+            )
+        encryptor, padder = self._encryptor
+        out = encryptor.update(padder.update(data))
+        if final:
+            out += encryptor.update(padder.finalize()) + encryptor.finalize()
+            self._encryptor = None
+        return out
+
+    def decrypt_buffer(self, data: bytes, final: bool) -> bytes:
+        # Как CryptDecrypt: без ``final`` блоки отдаются как есть (так
+        # расшифровываются отдельные страницы), дополнение снимается только
+        # в последнем куске, и последний блок должен прийти в нём.
+        if self._decryptor is None:
+            self._decryptor = self._cipher.decryptor()
+        out = self._decryptor.update(data)
+        if final:
+            out += self._decryptor.finalize()
+            self._decryptor = None
+            pad = out[-1] if out else 0
+            if not 1 <= pad <= BLOCK_SIZE or out[-pad:] != bytes([pad]) * pad:
+                # Неверный пароль почти всегда даёт битое дополнение —
+                # как и CryptDecrypt, сообщаем об этом ошибкой.
+                raise RuntimeError("CryptDecrypt failed")
+            out = out[:-pad]
+        return out
+
+    def close(self):
+        self._encryptor = None
+        self._decryptor = None
@@ -189,6 +189,8 @@ class CryptoSession:
         advapi32.CryptDestroyHash(self.hHash)
 
     def encrypt_buffer(self, data: bytes, final: bool) -> bytes:
+        # memoryview/mmap (secureboot.parallel) ctypes.memmove не принимает
+        data = bytes(data)
         # Делаем буфер с запасом для паддинга (для блочных шифров CryptoAPI может дописать)
         buf_len = len(data) + 1024
         buf = (BYTE * buf_len)()
@@ -210,6 +212,7 @@ class CryptoSession:
         return bytes(buf[:dwDataLen.value])
 
     def decrypt_buffer(self, data: bytes, final: bool) -> bytes:
+        data = bytes(data)
         buf_len = len(data)
         buf = (BYTE * buf_len)()
         ctypes.memmove(buf, data, buf_len)
@@ -0,0 +1,147 @@
+# secureboot/management/commands/bench_crypto.py
+import hashlib
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from secureboot import pages, parallel
+from secureboot.crypto_db_manager import CHUNK_SIZE, CryptoSession, stream
+
+PASSPHRASE = "bench-passphrase"
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def worker_steps(limit):
+    """1, 2, 4, ... и сам ``limit``."""
+    workers = 1
+    while workers < limit:
+        yield workers
+        workers *= 2
+    yield limit
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет скорость потокового шифрования и расшифровки базы "
+        "(secureboot.crypto_db_manager) на синтетическом файле и сравнивает "
+        "её с простым копированием файла, а также полное и постраничное "
+        "(secureboot.pages) запечатывание и масштабирование пула процессов "
+        "(secureboot.parallel). Настоящая база не трогается."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size-mb", type=int, default=256, help="Размер тестового файла."
+        )
+        parser.add_argument("--dir", default=None, help="Каталог для временных файлов.")
+        parser.add_argument(
+            "--dirty-pages",
+            type=int,
+            default=100,
+            help="Сколько страниц изменить перед повторным запечатыванием.",
+        )
+        parser.add_argument(
+            "--max-workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="До скольких процессов масштабировать шифрование.",
+        )
+
+    def seal(self, path, sess, enc_path):
+        with open(path, "rb") as src:
+            return pages.seal(src, os.path.getsize(path), sess, PASSPHRASE, enc_path)
+
+    def handle(self, *args, **options):
+        size = options["size_mb"] * 1024 * 1024
+        sess = CryptoSession(PASSPHRASE)
+        workdir = tempfile.mkdtemp(prefix="bench_crypto_", dir=options["dir"])
+        plain = os.path.join(workdir, "db.sqlite3")
+        sealed = os.path.join(workdir, "db.sqlite3.enc")
+        restored = os.path.join(workdir, "restored.sqlite3")
+        try:
+            with open(plain, "wb") as f:
+                for offset in range(0, size, CHUNK_SIZE):
+                    f.write(os.urandom(min(CHUNK_SIZE, size - offset)))
+
+            def timed(label, func):
+                started = time.perf_counter()
+                func()
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{label}: {elapsed:.2f} с, {size / elapsed / 2**20:.0f} МБ/с"
+                )
+
+            self.stdout.write(
+                f"{CryptoSession.__module__}, файл {options['size_mb']} МБ, "
+                f"кусок {CHUNK_SIZE // 1024} КБ"
+            )
+            timed(
+                "Копирование (диск)",
+                lambda: stream(plain, restored, lambda chunk, final: chunk),
+            )
+            timed(
+                "Шифрование",
+                lambda: stream(plain, sealed, sess.encrypt_buffer),
+            )
+            timed(
+                "Расшифровка",
+                lambda: stream(sealed, restored, sess.decrypt_buffer),
+            )
+            same = file_digest(plain) == file_digest(restored)
+            self.stdout.write(f"Расшифрованный файл совпадает: {same}")
+
+            paged = os.path.join(workdir, "paged.enc")
+            timed("Постраничное: полное", lambda: self.seal(plain, sess, paged))
+            page_size = pages.DEFAULT_PAGE_SIZE
+            count = pages.page_count(size, page_size)
+            dirty = random.Random(0).sample(
+                range(count), min(options["dirty_pages"], count)
+            )
+            with open(plain, "r+b") as f:
+                for index in dirty:
+                    f.seek(index * page_size)
+                    f.write(os.urandom(page_size))
+            started = time.perf_counter()
+            written = self.seal(plain, sess, paged)
+            self.stdout.write(
+                f"Постраничное: {len(dirty)} изменённых страниц из {count}, "
+                f"перешифровано {written}: "
+                f"{(time.perf_counter() - started) * 1000:.0f} мс"
+            )
+
+            self.stdout.write("Пул процессов, шифрование файла целиком:")
+            scaled = os.path.join(workdir, "scaled.enc")
+            aligned = size - size % pages.DEFAULT_PAGE_SIZE
+            with open(scaled, "wb") as f:
+                f.truncate(aligned)
+            baseline = None
+            for workers in worker_steps(options["max_workers"]):
+                started = time.perf_counter()
+                parallel.transform(
+                    parallel.Region("file", plain, 0),
+                    parallel.Region("file", scaled, 0),
+                    aligned,
+                    PASSPHRASE,
+                    encrypt=True,
+                    workers=workers,
+                )
+                elapsed = time.perf_counter() - started
+                baseline = baseline or elapsed
+                self.stdout.write(
+                    f"  процессов {workers}: {elapsed:.2f} с, "
+                    f"{aligned / elapsed / 2**20:.0f} МБ/с, "
+                    f"ускорение x{baseline / elapsed:.2f}"
+                )
+        finally:
+            sess.close()
+            shutil.rmtree(workdir, ignore_errors=True)
@@ -2,7 +2,14 @@ from django.core.management.base import BaseCommand, CommandError
 from django.core.management import call_command
 import os
 import sys
-from secureboot.crypto_db_manager import encrypt_db, decrypt_db, ENC_PATH
+from secureboot.checkpoint import start_checkpointer, stop_checkpointer
+from secureboot.crypto_db_manager import (
+    DB_PATH,
+    ENC_PATH,
+    decrypt_db,
+    encrypt_db,
+    memory_db_loaded,
+)
 
 class Command(BaseCommand):
     help = (
@@ -40,20 +47,31 @@ class Command(BaseCommand):
 
         # 3. Запускаем стандартный runserver внутри try/except,
         #    чтобы перехватить Ctrl+C.
+        #    База в памяти живёт только в этом процессе, поэтому автоперезагрузка
+        #    (она запускает сервер в дочернем процессе) в этом режиме отключена.
+        runserver_options = {}
+        if memory_db_loaded():
+            runserver_options["use_reloader"] = False
+        # Контрольные точки снимает только процесс, который обслуживает
+        # запросы: при автоперезагрузке это дочерний (RUN_MAIN=true).
+        if memory_db_loaded() or os.environ.get("RUN_MAIN") == "true":
+            start_checkpointer(passphrase)
         try:
             addrport = options.get("addrport")
             if addrport:
-                call_command("runserver", addrport)
+                call_command("runserver", addrport, **runserver_options)
             else:
-                call_command("runserver")
+                call_command("runserver", **runserver_options)
         except KeyboardInterrupt:
             self.stdout.write("Остановка сервера по Ctrl+C ...")
         finally:
             # 4. При завершении работы:
-            #    - если расшифрованная db.sqlite3 существует,
+            #    - если расшифрованная db.sqlite3 существует (или база в памяти),
             #      шифруем её обратно в db.sqlite3.enc (encrypt_db),
-            #      удаляем открытый файл.
-            if os.path.exists(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "db.sqlite3")):
+            #      удаляем открытый файл. Фоновые контрольные точки к этому
+            #      моменту уже запечатали большую часть изменений.
+            stop_checkpointer()
+            if memory_db_loaded() or os.path.exists(DB_PATH):
                 try:
                     encrypt_db(passphrase)
                     self.stdout.write(
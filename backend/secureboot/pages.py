@@ -0,0 +1,395 @@
+# secureboot/pages.py
+"""
+Постраничный формат db.sqlite3.enc: при запечатывании перешифровываются
+и переписываются на месте только изменившиеся страницы базы.
+
+- db.sqlite3.enc — заголовок (HEADER_SIZE байт: метка, токен, размер
+  страницы SQLite, длина базы) и страницы базы по порядку. Режим ECB
+  не сцепляет блоки, поэтому каждая страница шифруется независимо и её
+  можно переписать, не трогая соседние.
+- db.sqlite3.enc.manifest — ключевые хеши открытых страниц (blake2b,
+  ключ из пароля), по ним находятся изменённые страницы. Токен связывает
+  манифест с конкретным db.sqlite3.enc: при несовпадении файл пишется
+  целиком.
+- db.sqlite3.enc.journal — журнал повтора. Изменённые страницы и новый
+  манифест сначала целиком пишутся сюда и fsync; только потом страницы
+  переписываются на месте. Если процесс упал до конца журнала, журнал
+  отбрасывается и остаётся прежнее состояние; если после — журнал
+  доигрывается при следующем запуске (recover). Повторное применение
+  ничего не портит.
+
+Если изменилась большая часть страниц, журнал удвоил бы запись, поэтому
+файл переписывается целиком через временный файл и rename.
+"""
+
+import hashlib
+import io
+import os
+import struct
+from contextlib import contextmanager
+
+from . import parallel
+
+# Кратно любому размеру страницы SQLite (512 Б – 64 КБ) и блоку 3DES.
+CHUNK_SIZE = 4 * 1024 * 1024
+MAGIC = b"SBPAGES1"
+MANIFEST_MAGIC = b"SBMANIF1"
+JOURNAL_MAGIC = b"SBJRNL01"
+# Метка, токен, размер страницы, длина базы в байтах.
+HEADER = struct.Struct("<8s16sIQ")
+HEADER_SIZE = 64
+# Журнал: метка, токен, размер страницы, длина базы, длина манифеста.
+JOURNAL_HEADER = struct.Struct("<8s16sIQQ")
+# Запись журнала: номер первой страницы и число страниц подряд.
+RUN = struct.Struct("<QI")
+DIGEST_SIZE = 16
+DEFAULT_PAGE_SIZE = 4096
+# Доля изменённых страниц, начиная с которой файл пишется целиком.
+FULL_REWRITE_RATIO = 0.5
+SQLITE_MAGIC = b"SQLite format 3\x00"
+
+
+def manifest_path(enc_path):
+    return enc_path + ".manifest"
+
+
+def journal_path(enc_path):
+    return enc_path + ".journal"
+
+
+def manifest_key(passphrase: str) -> bytes:
+    """Ключ хешей страниц: по манифесту нельзя проверить догадку о странице."""
+    return hashlib.blake2b(
+        passphrase.encode("utf-8"), digest_size=32, person=b"secureboot-pages"
+    ).digest()
+
+
+def page_size_of(first_bytes: bytes) -> int:
+    """Размер страницы из заголовка SQLite (байты 16–17, 1 значит 65536)."""
+    if not first_bytes.startswith(SQLITE_MAGIC) or len(first_bytes) < 18:
+        return DEFAULT_PAGE_SIZE
+    size = int.from_bytes(first_bytes[16:18], "big")
+    return 65536 if size == 1 else size
+
+
+def page_count(length, page_size):
+    return -(-length // page_size)
+
+
+def page_digests(src, length, page_size, key) -> bytes:
+    """Хеши всех страниц подряд, по DIGEST_SIZE байт."""
+    digests = bytearray()
+    src.seek(0)
+    for offset in range(0, length, CHUNK_SIZE):
+        chunk = src.read(min(CHUNK_SIZE, length - offset))
+        for start in range(0, len(chunk), page_size):
+            digests += hashlib.blake2b(
+                chunk[start : start + page_size], digest_size=DIGEST_SIZE, key=key
+            ).digest()
+    return bytes(digests)
+
+
+def read_header(f):
+    """``(token, page_size, length)`` или None, если файл не постраничный."""
+    f.seek(0)
+    raw = f.read(HEADER.size)
+    if len(raw) < HEADER.size:
+        return None
+    magic, token, page_size, length = HEADER.unpack(raw)
+    if magic != MAGIC:
+        return None
+    return token, page_size, length
+
+
+def write_header(f, token, page_size, length):
+    header = HEADER.pack(MAGIC, token, page_size, length)
+    f.seek(0)
+    f.write(header + bytes(HEADER_SIZE - len(header)))
+
+
+def fsync_dir(path):
+    # rename и unlink переживают сбой питания только после fsync каталога;
+    # на Windows каталог так не открыть, там это делает сама ФС.
+    if os.name != "posix":
+        return
+    fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def replace_file(path, data_writer):
+    """Пишет файл через временный и rename: читатели видят старый или новый."""
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            data_writer(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        fsync_dir(path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def manifest_bytes(token, page_size, length, digests):
+    return HEADER.pack(MANIFEST_MAGIC, token, page_size, length) + digests
+
+
+def load_manifest(enc_path):
+    """``(token, page_size, length, digests)`` или None."""
+    try:
+        with open(manifest_path(enc_path), "rb") as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return None
+    if len(raw) < HEADER.size:
+        return None
+    magic, token, page_size, length = HEADER.unpack(raw[: HEADER.size])
+    digests = raw[HEADER.size :]
+    if (
+        magic != MANIFEST_MAGIC
+        or len(digests) != page_count(length, page_size) * DIGEST_SIZE
+    ):
+        return None
+    return token, page_size, length, digests
+
+
+def dirty_runs(digests, old_digests, count, max_run):
+    """
+    Номера изменённых страниц, сгруппированные в отрезки ``(start, n)``
+    не длиннее ``max_run`` страниц.
+    """
+    runs = []
+    for index in range(count):
+        start = index * DIGEST_SIZE
+        if (
+            digests[start : start + DIGEST_SIZE]
+            == old_digests[start : start + DIGEST_SIZE]
+        ):
+            continue
+        if runs and runs[-1][0] + runs[-1][1] == index and runs[-1][1] < max_run:
+            runs[-1][1] += 1
+        else:
+            runs.append([index, 1])
+    return runs
+
+
+def encrypt_run(sess, src, start, pages, page_size):
+    """Шифрует страницы подряд; неполная последняя дополняется нулями."""
+    src.seek(start * page_size)
+    data = src.read(pages * page_size)
+    return sess.encrypt_buffer(data + bytes(pages * page_size - len(data)), False)
+
+
+def seal(src, length, sess, passphrase, enc_path):
+    """
+    Запечатывает открытую базу ``src`` (файл, открытый на чтение, длиной
+    ``length``). Если прежний db.sqlite3.enc и манифест согласованы,
+    переписываются только изменённые страницы. Возвращает число
+    зашифрованных страниц.
+    """
+    recover(enc_path)
+    src.seek(0)
+    page_size = page_size_of(src.read(100))
+    count = page_count(length, page_size)
+    key = manifest_key(passphrase)
+    digests = page_digests(src, length, page_size, key)
+
+    previous = None
+    manifest = load_manifest(enc_path)
+    if manifest is not None and os.path.exists(enc_path):
+        with open(enc_path, "rb") as f:
+            header = read_header(f)
+        # Манифест должен относиться к этому же файлу и размеру страниц.
+        if header is not None and header == manifest[:3] and header[1] == page_size:
+            previous = manifest
+
+    if previous is None:
+        return seal_full(src, length, page_size, digests, sess, passphrase, enc_path)
+
+    token, _, old_length, old_digests = previous
+    # Страницы за концом старой базы в old_digests отсутствуют и считаются
+    # изменёнными.
+    runs = dirty_runs(digests, old_digests, count, CHUNK_SIZE // page_size)
+    dirty = sum(pages for _, pages in runs)
+    if not dirty and length == old_length:
+        return 0
+    if dirty > count * FULL_REWRITE_RATIO:
+        return seal_full(src, length, page_size, digests, sess, passphrase, enc_path)
+
+    write_journal(src, runs, token, page_size, length, digests, sess, enc_path)
+    recover(enc_path)
+    return dirty
+
+
+@contextmanager
+def source_region(src, size):
+    """Открытая база как буфер для воркеров secureboot.parallel."""
+    if isinstance(src, io.BytesIO):
+        # База в памяти: копия в разделяемую память, чтобы воркеры
+        # читали её без pickle.
+        with src.getbuffer() as data:
+            with parallel.shared_buffer(size, data[:size]) as (region, _):
+                yield region
+    else:
+        yield parallel.Region("file", src.name, 0)
+
+
+def seal_full(src, length, page_size, digests, sess, passphrase, enc_path):
+    """
+    Пишет db.sqlite3.enc целиком с новым токеном. Большую базу шифрует
+    пул процессов (secureboot.parallel), неполную последнюю страницу —
+    текущий процесс.
+    """
+    token = os.urandom(16)
+
+    def write_pages(f):
+        write_header(f, token, page_size, length)
+        done = 0
+        aligned = length - length % page_size
+        if parallel.worker_count(aligned) > 1:
+            f.truncate(HEADER_SIZE + aligned)
+            f.flush()
+            with source_region(src, aligned) as region:
+                parallel.transform(
+                    region,
+                    parallel.Region("file", f.name, HEADER_SIZE),
+                    aligned,
+                    passphrase,
+                    encrypt=True,
+                )
+            done = aligned
+        src.seek(done)
+        f.seek(HEADER_SIZE + done)
+        for offset in range(done, length, CHUNK_SIZE):
+            chunk = src.read(min(CHUNK_SIZE, length - offset))
+            chunk += bytes(-len(chunk) % page_size)
+            f.write(sess.encrypt_buffer(chunk, final=False))
+
+    replace_file(enc_path, write_pages)
+    # Сбой между двумя rename оставит манифест со старым токеном — тогда
+    # следующее запечатывание тоже будет полным, но ничего не потеряется.
+    replace_file(
+        manifest_path(enc_path),
+        lambda f: f.write(manifest_bytes(token, page_size, length, digests)),
+    )
+    return page_count(length, page_size)
+
+
+def write_journal(src, runs, token, page_size, length, digests, sess, enc_path):
+    manifest = manifest_bytes(token, page_size, length, digests)
+    checksum = hashlib.blake2b(digest_size=32)
+
+    def write(f, data):
+        checksum.update(data)
+        f.write(data)
+
+    path = journal_path(enc_path)
+    with open(path, "wb") as f:
+        write(
+            f,
+            JOURNAL_HEADER.pack(JOURNAL_MAGIC, token, page_size, length, len(manifest)),
+        )
+        for start, pages in runs:
+            write(f, RUN.pack(start, pages))
+            write(f, encrypt_run(sess, src, start, pages, page_size))
+        write(f, manifest)
+        # Контрольная сумма в конце: без неё журнал считается недописанным.
+        f.write(checksum.digest())
+        f.flush()
+        os.fsync(f.fileno())
+    fsync_dir(path)
+
+
+def read_journal(path):
+    """
+    Проверяет журнал и возвращает ``(header, runs_offset, manifest_offset)``
+    или None, если журнал недописан или испорчен.
+    """
+    size = os.path.getsize(path)
+    checksum = hashlib.blake2b(digest_size=32)
+    with open(path, "rb") as f:
+        raw = f.read(JOURNAL_HEADER.size)
+        if len(raw) < JOURNAL_HEADER.size or size < JOURNAL_HEADER.size + 32:
+            return None
+        magic, token, page_size, length, manifest_size = JOURNAL_HEADER.unpack(raw)
+        if magic != JOURNAL_MAGIC:
+            return None
+        checksum.update(raw)
+        remaining = size - JOURNAL_HEADER.size - 32
+        while remaining:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            checksum.update(chunk)
+            remaining -= len(chunk)
+        if f.read(32) != checksum.digest():
+            return None
+    manifest_offset = size - 32 - manifest_size
+    return (token, page_size, length), JOURNAL_HEADER.size, manifest_offset
+
+
+def recover(enc_path):
+    """
+    Доигрывает полный журнал или отбрасывает недописанный. Вызывается перед
+    расшифровкой и перед запечатыванием.
+    """
+    path = journal_path(enc_path)
+    if not os.path.exists(path):
+        return
+    journal = read_journal(path)
+    if journal is not None and os.path.exists(enc_path):
+        (token, page_size, length), offset, manifest_offset = journal
+        with open(path, "rb") as j, open(enc_path, "r+b") as f:
+            j.seek(offset)
+            while offset < manifest_offset:
+                start, pages = RUN.unpack(j.read(RUN.size))
+                f.seek(HEADER_SIZE + start * page_size)
+                f.write(j.read(pages * page_size))
+                offset += RUN.size + pages * page_size
+            write_header(f, token, page_size, length)
+            f.truncate(HEADER_SIZE + page_count(length, page_size) * page_size)
+            f.flush()
+            os.fsync(f.fileno())
+            manifest = j.read()[:-32]
+        replace_file(manifest_path(enc_path), lambda m: m.write(manifest))
+    os.remove(path)
+    fsync_dir(path)
+
+
+def is_paged(enc_path) -> bool:
+    with open(enc_path, "rb") as f:
+        return read_header(f) is not None
+
+
+def sealed_size(enc_path):
+    """``(length, body)`` постраничного файла: длина базы и тела с дополнением."""
+    with open(enc_path, "rb") as f:
+        _, page_size, length = read_header(f)
+    return length, page_count(length, page_size) * page_size
+
+
+def unseal_parallel(enc_path, dst, passphrase):
+    """
+    Расшифровывает тело файла в буфер ``dst`` (secureboot.parallel.Region)
+    размером не меньше ``sealed_size()[1]`` пулом процессов.
+    """
+    _, body = sealed_size(enc_path)
+    parallel.transform(
+        parallel.Region("file", enc_path, HEADER_SIZE),
+        dst,
+        body,
+        passphrase,
+        encrypt=False,
+    )
+
+
+def unseal_chunks(enc_path, sess):
+    """Открытая база кусками по CHUNK_SIZE."""
+    with open(enc_path, "rb") as f:
+        _, page_size, length = read_header(f)
+        f.seek(HEADER_SIZE)
+        for offset in range(0, length, CHUNK_SIZE):
+            chunk = f.read(CHUNK_SIZE)
+            yield sess.decrypt_buffer(chunk, final=False)[: length - offset]
@@ -0,0 +1,147 @@
+# secureboot/parallel.py
+"""
+Параллельное шифрование и расшифровка больших выровненных участков.
+
+В ECB блоки независимы, поэтому тело постраничного db.sqlite3.enc
+(secureboot.pages) режется на сегменты по SEGMENT_SIZE, и каждый сегмент
+обрабатывается в отдельном процессе пула. Данные через pickle не ходят:
+задача — это только имена и смещения, а воркер сам отображает исходный
+и целевой буфер (файл через mmap или multiprocessing.shared_memory для
+базы в памяти), шифрует свой срез и пишет результат на его место.
+Поэтому и собирать результат не нужно: порядок задаётся смещениями.
+
+Процессы запускаются через spawn: форк процесса с потоками сервера
+и контрольных точек небезопасен. Запуск пула стоит десятые доли секунды,
+поэтому участки меньше MIN_PARALLEL_SIZE обрабатываются в текущем
+процессе. Число процессов задаёт LAB_CRYPTO_WORKERS (по умолчанию —
+число ядер; 1 отключает пул). После начала завершения интерпретатора
+(обработчики atexit) concurrent.futures новых задач не принимает,
+поэтому тогда участок тоже обрабатывается в текущем процессе.
+"""
+
+import mmap
+import multiprocessing
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, process
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+# Кратно размеру страницы SQLite и блоку 3DES.
+SEGMENT_SIZE = 16 * 1024 * 1024
+MIN_PARALLEL_SIZE = 64 * 1024 * 1024
+
+# Буфер, который воркер открывает сам: kind — "file" (путь к файлу)
+# или "shm" (имя разделяемой памяти); offset — начало данных в нём.
+Region = namedtuple("Region", "kind name offset")
+
+# Сессии шифрования воркера по паролю: ключ выводится один раз на процесс.
+_sessions = {}
+
+
+def worker_count(size):
+    """Сколько процессов стоит занять под участок из ``size`` байт."""
+    if size < MIN_PARALLEL_SIZE:
+        return 1
+    workers = int(os.getenv("LAB_CRYPTO_WORKERS") or os.cpu_count() or 1)
+    return max(1, min(workers, -(-size // SEGMENT_SIZE)))
+
+
+def pool_available():
+    """Можно ли ещё запускать пул процессов."""
+    # concurrent.futures поднимает этот флаг до вызова обработчиков atexit.
+    return not (sys.is_finalizing() or getattr(process, "_global_shutdown", False))
+
+
+def get_session(passphrase):
+    from .crypto_db_manager import CryptoSession
+
+    if passphrase not in _sessions:
+        _sessions[passphrase] = CryptoSession(passphrase)
+    return _sessions[passphrase]
+
+
+@contextmanager
+def open_region(region, writable):
+    """memoryview буфера ``region`` целиком."""
+    if region.kind == "shm":
+        shm = shared_memory.SharedMemory(name=region.name)
+        view = shm.buf
+        try:
+            yield view
+        finally:
+            view.release()
+            shm.close()
+        return
+    with open(region.name, "r+b" if writable else "rb") as f:
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        mapped = mmap.mmap(f.fileno(), 0, access=access)
+    view = memoryview(mapped)
+    try:
+        yield view
+    finally:
+        view.release()
+        if writable:
+            mapped.flush()
+        mapped.close()
+
+
+def transform_segment(src, dst, start, size, passphrase, encrypt):
+    """Задача воркера: один сегмент из ``src`` в ``dst``."""
+    sess = get_session(passphrase)
+    convert = sess.encrypt_buffer if encrypt else sess.decrypt_buffer
+    with open_region(src, False) as src_view, open_region(dst, True) as dst_view:
+        with src_view[src.offset + start : src.offset + start + size] as data:
+            out = convert(data, False)
+        dst_view[dst.offset + start : dst.offset + start + size] = out
+    return size
+
+
+def transform(src, dst, size, passphrase, encrypt, workers=None):
+    """
+    Шифрует (``encrypt=True``) или расшифровывает ``size`` байт из ``src``
+    в ``dst``. ``size`` кратен блоку шифра, ``dst`` уже нужного размера.
+    """
+    workers = worker_count(size) if workers is None else workers
+    starts = range(0, size, SEGMENT_SIZE)
+    if workers <= 1 or not pool_available():
+        for start in starts:
+            transform_segment(
+                src, dst, start, min(SEGMENT_SIZE, size - start), passphrase, encrypt
+            )
+        return
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = [
+            pool.submit(
+                transform_segment,
+                src,
+                dst,
+                start,
+                min(SEGMENT_SIZE, size - start),
+                passphrase,
+                encrypt,
+            )
+            for start in starts
+        ]
+        for future in futures:
+            future.result()
+
+
+@contextmanager
+def shared_buffer(size, data=None):
+    """
+    Разделяемая память на ``size`` байт (с копией ``data``, если дано):
+    ``(Region, memoryview)``. Освобождается при выходе.
+    """
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    view = shm.buf
+    try:
+        if data is not None:
+            view[: len(data)] = data
+        yield Region("shm", shm.name, 0), view
+    finally:
+        view.release()
+        shm.close()
+        shm.unlink()
@@ -0,0 +1,260 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from . import pages, parallel
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Дочерний процесс: база в памяти, пул из двух процессов для любого
+# размера, полный перепис файла (манифеста нет) и запечатывание только
+# из atexit — как у команд, которые не запечатывают базу сами.
+ATEXIT_SEAL_SCRIPT = """
+import os, sys
+import django
+from django.conf import settings
+
+settings.configure(
+    DATABASES={"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": "x"}}
+)
+django.setup()
+
+from secureboot import crypto_db_manager, pages, parallel
+
+crypto_db_manager.ENC_PATH = sys.argv[1]
+parallel.MIN_PARALLEL_SIZE = parallel.SEGMENT_SIZE = 64 * 1024
+crypto_db_manager.decrypt_db("pw")
+os.remove(pages.manifest_path(sys.argv[1]))
+crypto_db_manager._memory_db.execute(
+    "INSERT INTO users_user (is_superuser, payload) VALUES (0, 'marker')"
+)
+crypto_db_manager._memory_db.commit()
+"""
+
+
+class ParallelTransformTests(unittest.TestCase):
+    def test_falls_back_to_current_process_on_shutdown(self):
+        data = os.urandom(4 * 64 * 1024)
+        size = len(data)
+        with parallel.shared_buffer(size, data) as (src, _):
+            with parallel.shared_buffer(size) as (expected, expected_view):
+                with parallel.shared_buffer(size) as (dst, dst_view):
+                    with mock.patch.object(parallel, "SEGMENT_SIZE", 64 * 1024):
+                        parallel.transform(src, expected, size, "pw", True, workers=1)
+                        with mock.patch.object(
+                            parallel.process, "_global_shutdown", True
+                        ):
+                            parallel.transform(src, dst, size, "pw", True, workers=2)
+                    self.assertEqual(bytes(dst_view), bytes(expected_view))
+
+
+@unittest.skipUnless(
+    hasattr(sqlite3.Connection, "deserialize"), "нужен sqlite3.deserialize"
+)
+class MemoryDbAtexitSealTests(unittest.TestCase):
+    def test_atexit_seal_keeps_changes_with_process_pool(self):
+        from . import crypto_db_manager
+
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "db.sqlite3")
+            enc_path = os.path.join(tmp, "db.sqlite3.enc")
+            conn = sqlite3.connect(db_path)
+            conn.execute(
+                "CREATE TABLE users_user "
+                "(id INTEGER PRIMARY KEY, is_superuser INT, payload)"
+            )
+            conn.executemany(
+                "INSERT INTO users_user (is_superuser, payload) VALUES (?, ?)",
+                [(1, "admin")] + [(0, os.urandom(500)) for _ in range(1000)],
+            )
+            conn.commit()
+            conn.close()
+            with mock.patch.multiple(
+                crypto_db_manager, DB_PATH=db_path, ENC_PATH=enc_path
+            ):
+                crypto_db_manager.encrypt_db("pw")
+
+            env = dict(
+                os.environ,
+                LAB_DB_IN_MEMORY="1",
+                LAB_CRYPTO_WORKERS="2",
+                PYTHONPATH=BACKEND_DIR,
+            )
+            result = subprocess.run(
+                [sys.executable, "-c", ATEXIT_SEAL_SCRIPT, enc_path],
+                env=env,
+                capture_output=True,
+                text=True,
+            )
+            self.assertEqual(result.returncode, 0, result.stderr)
+            self.assertNotIn("Traceback", result.stderr)
+
+            sess = crypto_db_manager.CryptoSession("pw")
+            with mock.patch.object(crypto_db_manager, "ENC_PATH", enc_path):
+                plaintext = b"".join(crypto_db_manager.decrypt_chunks(sess))
+            conn = sqlite3.connect(":memory:")
+            conn.deserialize(plaintext)
+            count = conn.execute(
+                "SELECT COUNT(*) FROM users_user WHERE payload = 'marker'"
+            ).fetchone()[0]
+            conn.close()
+            self.assertEqual(count, 1)
+
+
+class Interrupted(Exception):
+    pass
+
+
+def make_db(path, rows=2000):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE users_user (id INTEGER PRIMARY KEY, is_superuser INT, payload)"
+    )
+    conn.executemany(
+        "INSERT INTO users_user (is_superuser, payload) VALUES (?, ?)",
+        [(1, "admin")] + [(0, f"row{i:05d}" * 40) for i in range(rows)],
+    )
+    conn.commit()
+    conn.close()
+
+
+class PagedSealTests(unittest.TestCase):
+    def setUp(self):
+        from .crypto_db_manager import CryptoSession
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db_path = os.path.join(tmp.name, "db.sqlite3")
+        self.enc_path = os.path.join(tmp.name, "db.sqlite3.enc")
+        self.sess = CryptoSession("pw")
+        self.addCleanup(self.sess.close)
+        make_db(self.db_path)
+        self.assertEqual(self.seal(), self.pages_of(self.read_db()))
+
+    def seal(self):
+        with open(self.db_path, "rb") as src:
+            return pages.seal(
+                src, os.path.getsize(self.db_path), self.sess, "pw", self.enc_path
+            )
+
+    def read_db(self):
+        with open(self.db_path, "rb") as f:
+            return f.read()
+
+    def read_enc(self):
+        with open(self.enc_path, "rb") as f:
+            return f.read()
+
+    def unseal(self):
+        return b"".join(pages.unseal_chunks(self.enc_path, self.sess))
+
+    def pages_of(self, data):
+        return pages.page_count(len(data), pages.page_size_of(data[:100]))
+
+    def test_recover_replays_journal_after_interrupted_seal(self):
+        from .crypto_db_manager import has_admin
+
+        before = self.read_db()
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("UPDATE users_user SET payload = 'changed' WHERE id = 1000")
+        conn.commit()
+        conn.close()
+        after = self.read_db()
+
+        recover = pages.recover
+        calls = []
+
+        def interrupt_after_journal(enc_path):
+            # Первый вызов — в начале seal(), второй — сразу после записи
+            # журнала: здесь процесс «падает».
+            calls.append(enc_path)
+            if len(calls) > 1:
+                raise Interrupted
+            recover(enc_path)
+
+        with mock.patch.object(pages, "recover", interrupt_after_journal):
+            with self.assertRaises(Interrupted):
+                self.seal()
+
+        self.assertTrue(os.path.exists(pages.journal_path(self.enc_path)))
+        self.assertEqual(self.unseal(), before)
+
+        pages.recover(self.enc_path)
+
+        self.assertFalse(os.path.exists(pages.journal_path(self.enc_path)))
+        plaintext = self.unseal()
+        self.assertEqual(plaintext, after)
+        restored = os.path.join(os.path.dirname(self.db_path), "restored.sqlite3")
+        with open(restored, "wb") as f:
+            f.write(plaintext)
+        self.assertTrue(has_admin(restored))
+        conn = sqlite3.connect(restored)
+        payload = conn.execute(
+            "SELECT payload FROM users_user WHERE id = 1000"
+        ).fetchone()[0]
+        conn.close()
+        self.assertEqual(payload, "changed")
+        # Манифест доигран вместе со страницами: повторно шифровать нечего.
+        self.assertEqual(self.seal(), 0)
+
+    def test_torn_journal_is_discarded(self):
+        before = self.read_db()
+        with open(pages.journal_path(self.enc_path), "wb") as f:
+            f.write(pages.JOURNAL_MAGIC + os.urandom(100))
+
+        pages.recover(self.enc_path)
+
+        self.assertFalse(os.path.exists(pages.journal_path(self.enc_path)))
+        self.assertEqual(self.unseal(), before)
+
+    def test_one_changed_page_rewrites_only_that_page_and_manifest(self):
+        data = self.read_db()
+        page_size = pages.page_size_of(data[:100])
+        offset = data.index(b"row01000")
+        index = offset // page_size
+        # Длина строки прежняя, поэтому меняется ровно одна страница базы.
+        data = data.replace(b"row01000", b"ROW01000")
+        with open(self.db_path, "wb") as f:
+            f.write(data)
+
+        old_enc = self.read_enc()
+        old_inode = os.stat(self.enc_path).st_ino
+        with open(pages.manifest_path(self.enc_path), "rb") as f:
+            old_manifest = f.read()
+
+        with mock.patch.object(
+            pages, "write_journal", wraps=pages.write_journal
+        ) as write_journal, mock.patch.object(
+            pages, "seal_full", wraps=pages.seal_full
+        ) as seal_full:
+            self.assertEqual(self.seal(), 1)
+
+        seal_full.assert_not_called()
+        self.assertEqual(write_journal.call_args.args[1], [[index, 1]])
+        # Файл переписан на месте, а не заменён целиком.
+        self.assertEqual(os.stat(self.enc_path).st_ino, old_inode)
+        new_enc = self.read_enc()
+        self.assertEqual(len(new_enc), len(old_enc))
+        start = pages.HEADER_SIZE + index * page_size
+        end = start + page_size
+        self.assertNotEqual(new_enc[start:end], old_enc[start:end])
+        self.assertEqual(new_enc[:start], old_enc[:start])
+        self.assertEqual(new_enc[end:], old_enc[end:])
+
+        with open(pages.manifest_path(self.enc_path), "rb") as f:
+            new_manifest = f.read()
+        digest = pages.HEADER.size + index * pages.DIGEST_SIZE
+        self.assertNotEqual(
+            new_manifest[digest : digest + pages.DIGEST_SIZE],
+            old_manifest[digest : digest + pages.DIGEST_SIZE],
+        )
+        self.assertEqual(new_manifest[:digest], old_manifest[:digest])
+        self.assertEqual(
+            new_manifest[digest + pages.DIGEST_SIZE :],
+            old_manifest[digest + pages.DIGEST_SIZE :],
+        )
+        self.assertEqual(self.unseal(), data)
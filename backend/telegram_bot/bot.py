@@ -51,7 +51,7 @@ async def show_routes(update: Update, context: CallbackContext):
         try:
             response = await client.get(f"{API_BASE_URL}/routers/")
             response.raise_for_status()
-            routers = response.json()
+            routers = response.json()["results"]
 
             if not routers:
                 await update.message.reply_text(
@@ -107,7 +107,7 @@ async def show_collections(update: Update, context: CallbackContext):
         try:
             response = await client.get(f"{API_BASE_URL}/collections/")
             response.raise_for_status()
-            collections = response.json()
+            collections = response.json()["results"]
 
             if not collections:
                 await update.message.reply_text(
@@ -150,7 +150,7 @@ async def show_points(update: Update, context: CallbackContext):
         try:
             response = await client.get(f"{API_BASE_URL}/points/")
             response.raise_for_status()
-            points = response.json()
+            points = response.json()["results"]
 
             if not points:
                 await update.message.reply_text("Нет точек интереса.")
@@ -1,3 +1,4 @@
+from api.forms import PointsOfInterestForm
 from django.contrib import admin
 
 from .models import (
@@ -29,6 +30,8 @@ class RoutersAdmin(admin.ModelAdmin):
 @admin.register(PointsOfInterest)
 class PointsOfInterestAdmin(admin.ModelAdmin):
     list_display = ("name", "category")
+    # Координаты вводятся в градусах, а хранятся целыми E7.
+    form = PointsOfInterestForm
 
 
 @admin.register(Reviews)
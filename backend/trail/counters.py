@@ -0,0 +1,188 @@
+"""
+Счётчики маршрутов с отложенной записью: просмотры, добавления в избранное
+и в коллекции.
+
+UPDATE на каждый просмотр упирался бы в единственную блокировку записи
+SQLite, поэтому приращения копятся в памяти процесса и сбрасываются
+фоновым потоком раз в ``COUNTERS_FLUSH_SECONDS``: по одному
+``UPDATE ... SET поле = поле + CASE id WHEN ... END`` на пачку маршрутов.
+Если сброс не удался, приращения возвращаются в буфер; при остановке
+процесса буфер сбрасывается через atexit. При аварийном завершении
+теряется не больше, чем накопилось за один интервал.
+
+Счётчики избранного и коллекций можно пересчитать точно командой
+recount_counters; просмотры хранятся только здесь.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+from .generations import bump_generation, bump_objects
+from .models import Routers
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+# Изменение этих счётчиков сбрасывает кэш маршрута; просмотры меняются
+# слишком часто, и в закэшированных ответах они могут отставать.
+VERSIONED_FIELDS = ("favorites_count", "collections_count")
+# Поле счётчика и таблица связей, по которой он пересчитывается.
+RECOUNT_SOURCES = {
+    "favorites_count": "Favorite",
+    "collections_count": "CollectionRouters",
+}
+
+_pending = Counter()
+_pending_lock = threading.Lock()
+# Сброс из потока и из atexit не должен идти одновременно.
+_flush_lock = threading.Lock()
+_flusher = None
+
+
+def increment(field, router_id, delta=1):
+    """Добавляет ``delta`` к счётчику ``field`` маршрута; в базу — позже."""
+    if field not in Routers.COUNTER_FIELDS:
+        raise ValueError(f"Неизвестный счётчик: {field}")
+    with _pending_lock:
+        _pending[field, router_id] += delta
+    ensure_flusher()
+
+
+def increment_on_commit(field, router_ids, delta=1):
+    """То же для нескольких маршрутов, после фиксации текущей транзакции."""
+    router_ids = list(router_ids)
+    if router_ids:
+        transaction.on_commit(
+            lambda: [increment(field, router_id, delta) for router_id in router_ids]
+        )
+
+
+def drain():
+    global _pending
+    with _pending_lock:
+        pending, _pending = _pending, Counter()
+    return pending
+
+
+def restore(pending):
+    with _pending_lock:
+        _pending.update(pending)
+
+
+def counter_updates(deltas):
+    """
+    Аргументы ``update()`` для пачки: ``{поле: {router_id: delta}}``.
+    Каждое поле получает свой CASE; значения не опускаются ниже нуля.
+    """
+    updates = {}
+    for field, by_router in deltas.items():
+        case = Case(
+            *(When(pk=pk, then=Value(delta)) for pk, delta in by_router.items()),
+            default=Value(0),
+        )
+        updates[field] = Greatest(F(field) + case, Value(0))
+    return updates
+
+
+def flush():
+    """Записывает накопленные приращения. Возвращает число маршрутов."""
+    with _flush_lock:
+        pending = drain()
+        deltas = {}
+        for (field, router_id), delta in pending.items():
+            if delta:
+                deltas.setdefault(router_id, {})[field] = delta
+        router_ids = sorted(deltas)
+        try:
+            with transaction.atomic():
+                for start in range(0, len(router_ids), BATCH_SIZE):
+                    batch = router_ids[start : start + BATCH_SIZE]
+                    by_field = {}
+                    for router_id in batch:
+                        for field, delta in deltas[router_id].items():
+                            by_field.setdefault(field, {})[router_id] = delta
+                    Routers.objects.filter(pk__in=batch).update(
+                        **counter_updates(by_field)
+                    )
+        except Exception:
+            restore(pending)
+            raise
+        versioned = [
+            router_id
+            for router_id in router_ids
+            if any(field in VERSIONED_FIELDS for field in deltas[router_id])
+        ]
+        if versioned:
+            bump_objects(Routers, versioned)
+            bump_generation(Routers)
+        return len(router_ids)
+
+
+def recount(apps=global_apps):
+    """
+    Точно пересчитывает счётчики избранного и коллекций по таблицам
+    связей (команда recount_counters; миграция 0019 держит свою копию).
+    """
+    routers = apps.get_model("trail", "Routers")
+    for field, model_name in RECOUNT_SOURCES.items():
+        links = (
+            apps.get_model("trail", model_name)
+            .objects.filter(router=OuterRef("pk"))
+            .order_by()
+            .values("router")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        routers.objects.update(**{field: Coalesce(Subquery(links), 0)})
+
+
+def run_flusher(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            flush()
+        except Exception:
+            logger.exception("Не удалось записать счётчики маршрутов")
+        finally:
+            close_old_connections()
+
+
+def flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        logger.exception("Не удалось записать счётчики маршрутов при остановке")
+
+
+def ensure_flusher():
+    """
+    Запускает фоновый сброс при первом приращении в процессе. При
+    ``COUNTERS_FLUSH_SECONDS = 0`` поток не запускается и счётчики
+    пишутся сразу.
+    """
+    global _flusher
+    if _flusher is not None:
+        return
+    interval = getattr(settings, "COUNTERS_FLUSH_SECONDS", 5)
+    if not interval:
+        flush()
+        return
+    with _flush_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(
+                target=run_flusher,
+                args=(interval,),
+                name="counters-flush",
+                daemon=True,
+            )
+            _flusher.start()
+            atexit.register(flush_at_exit)
@@ -0,0 +1,131 @@
+"""
+Поколения моделей и версии объектов для кэшей ответов (api.cache,
+api.materialize, api.conditional).
+
+Поколения моделей и версии объектов лежат в таблицах ModelGeneration
+и ObjectVersion, а не в кэше Django:
+кэш по умолчанию свой у каждого процесса (LocMemCache), и запись,
+обработанная одним воркером gunicorn, иначе не сбрасывала бы ответы,
+закэшированные другими. Счётчики увеличиваются UPDATE с F() + 1,
+поэтому одновременные записи не теряются. Версию объекта не хранят
+в его же строке: полное сохранение устаревшего экземпляра (Model.save)
+откатило бы её назад.
+"""
+
+import time
+
+from django.db.models import F
+
+
+def model_label(model):
+    return model._meta.label_lower
+
+
+def bump_generation(model):
+    """
+    Увеличивает счётчик поколения модели.
+
+    Всё, что закэшировано с ключом от старого поколения, становится
+    недостижимым без перебора ключей и явного удаления. Время последней
+    записи нужно для Last-Modified: в отличие от max(updated_at) оно
+    сдвигается и при удалении строк.
+    """
+    from .models import ModelGeneration
+
+    rows = ModelGeneration.objects.filter(label=model_label(model))
+    changes = {"value": F("value") + 1, "changed_at": time.time()}
+    if not rows.update(**changes):
+        # Строки ещё нет: заводим её (возможно, одновременно с другим
+        # процессом) и увеличиваем уже существующую.
+        get_rows([model])
+        rows.update(**changes)
+
+
+def get_rows(models):
+    """
+    ``{label: (поколение, время записи)}`` одним запросом. Недостающие
+    строки создаются с текущим временем: пока о записях ничего не известно,
+    лишний полный ответ лучше, чем ошибочный 304.
+    """
+    from .models import ModelGeneration
+
+    labels = [model_label(model) for model in models]
+    rows = {
+        label: (value, changed_at)
+        for label, value, changed_at in ModelGeneration.objects.filter(
+            label__in=labels
+        ).values_list("label", "value", "changed_at")
+    }
+    missing = [label for label in labels if label not in rows]
+    if missing:
+        now = time.time()
+        ModelGeneration.objects.bulk_create(
+            [ModelGeneration(label=label, changed_at=now) for label in missing],
+            ignore_conflicts=True,
+        )
+        rows.update(
+            (label, (value, changed_at))
+            for label, value, changed_at in ModelGeneration.objects.filter(
+                label__in=missing
+            ).values_list("label", "value", "changed_at")
+        )
+    return rows
+
+
+def get_generations(models):
+    """Возвращает кортеж текущих поколений для списка моделей."""
+    rows = get_rows(models)
+    return tuple(rows[model_label(model)][0] for model in models)
+
+
+def get_changed(models):
+    """Возвращает время последней записи (unix time) для каждой модели."""
+    rows = get_rows(models)
+    return tuple(rows[model_label(model)][1] for model in models)
+
+
+def create_versions(model, pks):
+    from .models import ObjectVersion
+
+    label = model_label(model)
+    ObjectVersion.objects.bulk_create(
+        [ObjectVersion(label=label, object_id=pk) for pk in pks],
+        ignore_conflicts=True,
+    )
+
+
+def bump_objects(model, pks):
+    """
+    Увеличивает версии отдельных объектов модели. Строки без версии
+    сначала заводятся: иначе читатель, создавший её одновременно с этой
+    записью, закэшировал бы старые данные под первой версией.
+    """
+    from .models import ObjectVersion
+
+    pks = set(pks)
+    if not pks:
+        return
+    create_versions(model, pks)
+    ObjectVersion.objects.filter(label=model_label(model), object_id__in=pks).update(
+        value=F("value") + 1
+    )
+
+
+def get_object_versions(model, pks):
+    """Возвращает словарь ``pk -> версия`` для объектов модели."""
+    from .models import ObjectVersion
+
+    def load(pks):
+        return dict(
+            ObjectVersion.objects.filter(
+                label=model_label(model), object_id__in=pks
+            ).values_list("object_id", "value")
+        )
+
+    pks = set(pks)
+    versions = load(pks)
+    missing = pks - versions.keys()
+    if missing:
+        create_versions(model, missing)
+        versions.update(load(missing))
+    return versions
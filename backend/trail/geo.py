@@ -0,0 +1,232 @@
+"""
+Геометрия без PostGIS: пространственный ключ точек — код Мортона
+(Z-order) — и метрики маршрутов по координатам их точек (trail.metrics).
+
+Долгота и широта квантуются до ``BITS`` бит каждая, и биты чередуются
+в одно целое. Близкие точки получают близкие коды, поэтому
+прямоугольник на карте покрывается несколькими диапазонами кодов,
+а каждый диапазон — это обычный range scan по B-tree индексу, который
+есть и в SQLite, и в Postgres.
+"""
+
+import decimal
+import math
+
+import numpy as np
+
+BITS = 31
+CELLS = 1 << BITS
+# Сколько диапазонов максимум отдаём в один запрос: больше диапазонов —
+# точнее покрытие, но длиннее условие WHERE.
+MAX_RANGES = 16
+
+
+# Координаты в целых: градусы * 10^7, точность около сантиметра.
+E7 = 10**7
+EARTH_RADIUS_KM = 6371.0088
+
+
+def to_e7(value):
+    """Градусы (Decimal, float или строка) в целое E7 или ``None``."""
+    if value is None:
+        return None
+    value = decimal.Decimal(str(value)) * E7
+    return int(value.to_integral_value(rounding=decimal.ROUND_HALF_EVEN))
+
+
+def from_e7(value):
+    return None if value is None else value / E7
+
+
+def decimal_from_e7(value):
+    """Целое E7 в градусы без потерь (Decimal) или ``None``."""
+    return None if value is None else decimal.Decimal(value).scaleb(-7)
+
+
+def e7_bounds(low, high):
+    """Целые границы E7, эквивалентные условию ``low <= x <= high``."""
+    low = decimal.Decimal(str(low)) * E7
+    high = decimal.Decimal(str(high)) * E7
+    return math.ceil(low), math.floor(high)
+
+
+def _spread(value):
+    # Раздвигает 32 бита так, чтобы между ними остались нулевые биты.
+    value &= 0xFFFFFFFF
+    value = (value | (value << 16)) & 0x0000FFFF0000FFFF
+    value = (value | (value << 8)) & 0x00FF00FF00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F0F0F0F0F
+    value = (value | (value << 2)) & 0x3333333333333333
+    value = (value | (value << 1)) & 0x5555555555555555
+    return value
+
+
+def quantize(value, low, high):
+    cell = int((float(value) - low) / (high - low) * CELLS)
+    return min(max(cell, 0), CELLS - 1)
+
+
+def cell_of(longitude, latitude):
+    return quantize(longitude, -180.0, 180.0), quantize(latitude, -90.0, 90.0)
+
+
+def interleave(x, y):
+    return _spread(x) | (_spread(y) << 1)
+
+
+def morton_code(longitude, latitude):
+    """Код Мортона точки или ``None``, если координаты не заданы."""
+    if longitude is None or latitude is None:
+        return None
+    return interleave(*cell_of(longitude, latitude))
+
+
+def _cover(x_min, y_min, x_max, y_max, max_ranges):
+    """
+    Покрывает прямоугольник ячеек ``[x_min, x_max] x [y_min, y_max]``
+    квадрантами дерева и возвращает диапазоны кодов ``(lo, hi)``.
+
+    Квадранты дробятся по уровням, пока их число не превысит
+    ``max_ranges``; оставшиеся частично задетые квадранты берутся
+    целиком, лишние точки отсекает точный фильтр по координатам.
+    """
+    full, partial = [], [(0, 0, BITS)]
+    while partial:
+        children = []
+        for x, y, level in partial:
+            size = 1 << level
+            if x > x_max or y > y_max or x + size - 1 < x_min or y + size - 1 < y_min:
+                continue
+            inside = (
+                x >= x_min
+                and y >= y_min
+                and x + size - 1 <= x_max
+                and y + size - 1 <= y_max
+            )
+            if inside or level == 0:
+                full.append((x, y, level))
+            else:
+                children.append((x, y, level))
+        if not children:
+            break
+        if len(full) + 4 * len(children) > max_ranges:
+            full.extend(children)
+            break
+        partial = []
+        for x, y, level in children:
+            half = 1 << (level - 1)
+            partial.extend(
+                (x + dx, y + dy, level - 1) for dx in (0, half) for dy in (0, half)
+            )
+
+    ranges = sorted(
+        (interleave(x, y), interleave(x, y) + (1 << (2 * level)) - 1)
+        for x, y, level in full
+    )
+    merged = []
+    for low, high in ranges:
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+        else:
+            merged.append((low, high))
+    return merged
+
+
+def bbox_ranges(min_lon, min_lat, max_lon, max_lat, max_ranges=MAX_RANGES):
+    """
+    Диапазоны кодов Мортона, покрывающие прямоугольник на карте.
+
+    Если ``min_lon > max_lon``, прямоугольник пересекает 180-й меридиан
+    и разбивается на два.
+    """
+    if min_lon > max_lon:
+        return bbox_ranges(
+            min_lon, min_lat, 180.0, max_lat, max_ranges // 2
+        ) + bbox_ranges(-180.0, min_lat, max_lon, max_lat, max_ranges // 2)
+    x_min, y_min = cell_of(min_lon, min_lat)
+    x_max, y_max = cell_of(max_lon, max_lat)
+    return _cover(x_min, y_min, x_max, y_max, max_ranges)
+
+
+def longitude_extent(router_ids, lon_e7, starts):
+    """
+    Наименьшая дуга долгот, покрывающая точки каждого маршрута:
+    ``(min_lon_e7, max_lon_e7)``.
+
+    Долготы маршрута сортируются по кругу, и дуга разрезается в самом
+    большом промежутке между соседними точками. Обычно это промежуток
+    через 180-й меридиан, и получаются min и max. Если же маршрут
+    пересекает 180-й меридиан, дуга идёт от ``min_lon_e7`` на восток
+    через 180° до ``max_lon_e7``, и ``min_lon_e7 > max_lon_e7`` — так же,
+    как прямоугольник экрана в ``api.filters.route_bbox_condition``.
+    """
+    order = np.lexsort((lon_e7, router_ids))
+    lon = lon_e7[order]
+    ends = np.r_[starts[1:], len(lon)] - 1
+    group = np.repeat(np.arange(len(starts)), ends - starts + 1)
+    # Промежуток от каждой точки до следующей по кругу; у последней точки
+    # маршрута — до первой через 180-й меридиан.
+    gaps = np.r_[np.diff(lon), 0]
+    gaps[ends] = lon[starts] + 360 * E7 - lon[ends]
+    widest = np.maximum.reduceat(gaps, starts)
+    # При равенстве предпочитаем промежуток через меридиан (последний).
+    index = np.arange(len(lon))
+    cut = np.maximum.reduceat(np.where(gaps == widest[group], index, -1), starts)
+    crosses = cut != ends
+    min_lon = np.where(crosses, lon[np.minimum(cut + 1, ends)], lon[starts])
+    max_lon = np.where(crosses, lon[cut], lon[ends])
+    return min_lon, max_lon
+
+
+def compute_metrics(router_ids, lat_e7, lon_e7):
+    """
+    Считает метрики по точкам нескольких маршрутов сразу.
+
+    Массивы отсортированы по маршруту, а внутри маршрута — в порядке
+    следования точек. Возвращает ``{router_id: {поле: значение}}``.
+    У маршрута через 180-й меридиан ``min_lon_e7 > max_lon_e7``
+    (см. ``longitude_extent``).
+    """
+    router_ids = np.asarray(router_ids, dtype=np.int64)
+    if not len(router_ids):
+        return {}
+    lat = np.radians(np.asarray(lat_e7, dtype=np.float64) / E7)
+    lon = np.radians(np.asarray(lon_e7, dtype=np.float64) / E7)
+    starts = np.flatnonzero(np.r_[True, router_ids[1:] != router_ids[:-1]])
+
+    # Отрезки между соседними точками; на границе маршрутов отрезка нет.
+    a = (
+        np.sin(np.diff(lat) / 2) ** 2
+        + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2
+    )
+    segments = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    segments[router_ids[1:] != router_ids[:-1]] = 0.0
+    lengths = np.add.reduceat(np.r_[segments, 0.0], starts)
+
+    # Центр — нормированное среднее единичных векторов: корректно и у полюсов,
+    # и у 180-го меридиана.
+    cos_lat = np.cos(lat)
+    xyz = np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], -1)
+    center = np.add.reduceat(xyz, starts)
+    center_lat = np.degrees(
+        np.arctan2(center[:, 2], np.hypot(center[:, 0], center[:, 1]))
+    )
+    center_lon = np.degrees(np.arctan2(center[:, 1], center[:, 0]))
+
+    lat_e7 = np.asarray(lat_e7, dtype=np.int64)
+    min_lon_e7, max_lon_e7 = longitude_extent(
+        router_ids, np.asarray(lon_e7, dtype=np.int64), starts
+    )
+    columns = {
+        "length_km": np.round(lengths, 3),
+        "min_lat_e7": np.minimum.reduceat(lat_e7, starts),
+        "max_lat_e7": np.maximum.reduceat(lat_e7, starts),
+        "min_lon_e7": min_lon_e7,
+        "max_lon_e7": max_lon_e7,
+        "center_lat_e7": np.rint(center_lat * E7).astype(np.int64),
+        "center_lon_e7": np.rint(center_lon * E7).astype(np.int64),
+    }
+    return {
+        router_id: {name: values[i].item() for name, values in columns.items()}
+        for i, router_id in enumerate(router_ids[starts].tolist())
+    }
@@ -0,0 +1,63 @@
+from django.db import transaction
+from django.dispatch import Signal
+
+from .generations import bump_generation, bump_objects
+
+# Отправляется после sync_links с аргументами owner, added и removed:
+# bulk_create не отправляет post_save, а подписчикам нужно знать о новых
+# связях (например, trail.metrics пересчитывает длину маршрута).
+links_synced = Signal()
+
+
+def sync_links(model, owner_field, owner, target_field, targets, position_field=None):
+    """
+    Приводит связи ``owner`` в таблице ``model`` к набору ``targets``.
+
+    Сравнивает нужный набор с тем, что уже лежит в базе: недостающие связи
+    добавляются одним ``bulk_create``, лишние удаляются одним DELETE,
+    а совпадающие не трогаются. Всё выполняется в одной транзакции.
+
+    Если задан ``position_field``, связи нумеруются в порядке ``targets``:
+    у сохранённых связей, чей номер изменился, он обновляется одним
+    ``bulk_update`` в той же транзакции.
+
+    ``bulk_create`` и ``bulk_update`` не отправляют post_save, поэтому
+    поколение таблицы связей и версия владельца (trail.generations)
+    поднимаются здесь явно, после фиксации транзакции.
+    """
+    target_column = model._meta.get_field(target_field).attname
+    wanted = list(dict.fromkeys(target.pk for target in targets))
+
+    moved = []
+    with transaction.atomic():
+        links = model._default_manager.filter(**{owner_field: owner})
+        existing = set(links.values_list(target_column, flat=True))
+        removed = existing - set(wanted)
+        added = [pk for pk in wanted if pk not in existing]
+        if removed:
+            links.filter(**{f"{target_column}__in": removed}).delete()
+        if position_field is not None:
+            positions = {pk: position for position, pk in enumerate(wanted)}
+            moved = [
+                link
+                for link in links.filter(**{f"{target_column}__in": positions})
+                if getattr(link, position_field)
+                != positions[getattr(link, target_column)]
+            ]
+            for link in moved:
+                setattr(link, position_field, positions[getattr(link, target_column)])
+            if moved:
+                model._default_manager.bulk_update(moved, [position_field])
+        if added:
+            objs = [model(**{owner_field: owner, target_column: pk}) for pk in added]
+            if position_field is not None:
+                for obj in objs:
+                    setattr(obj, position_field, positions[getattr(obj, target_column)])
+            model._default_manager.bulk_create(objs)
+
+    if added or moved:
+        transaction.on_commit(lambda: bump_generation(model))
+        transaction.on_commit(lambda: bump_objects(type(owner), [owner.pk]))
+    if added or removed or moved:
+        links_synced.send(model, owner=owner, added=added, removed=removed)
+    return added, removed
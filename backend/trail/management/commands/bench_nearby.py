@@ -0,0 +1,102 @@
+import math
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from trail.models import PointsOfInterest
+from trail.geo import EARTH_RADIUS_KM
+from trail.nearby import PointIndex, load_rows
+
+
+def naive_nearby(lat, lon, k):
+    """
+    Эталон: все точки через ORM, расстояние в Python, сортировка.
+    Возвращает расстояния до ``k`` ближайших точек.
+    """
+    lat_r, lon_r = math.radians(lat), math.radians(lon)
+    distances = []
+    for point in PointsOfInterest.objects.exclude(latitude_e7=None).exclude(
+        longitude_e7=None
+    ):
+        p_lat, p_lon = math.radians(point.latitude), math.radians(point.longitude)
+        a = (
+            math.sin((p_lat - lat_r) / 2) ** 2
+            + math.cos(lat_r) * math.cos(p_lat) * math.sin((p_lon - lon_r) / 2) ** 2
+        )
+        distances.append((2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a)), point.pk))
+    distances.sort()
+    return [distance for distance, _ in distances[:k]]
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает поиск ближайших точек по индексу trail.nearby "
+        "с наивным перебором через ORM."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queries", type=int, default=50)
+        parser.add_argument("-k", type=int, default=10)
+        parser.add_argument(
+            "--synthetic",
+            type=int,
+            default=0,
+            help="Дополнительно замерить индекс на N случайных точках в памяти.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        k, count = options["k"], options["queries"]
+        queries = [(rng.uniform(-60, 70), rng.uniform(-180, 180)) for _ in range(count)]
+
+        started = time.perf_counter()
+        index = PointIndex(load_rows())
+        build = time.perf_counter() - started
+        self.stdout.write(f"Точек в базе: {len(index)}, индекс: {build * 1000:.1f} мс")
+        if not len(index):
+            self.stdout.write("В базе нет точек с координатами.")
+        else:
+            lats, lons = zip(*queries)
+            started = time.perf_counter()
+            results = index.query(lats, lons, k)
+            indexed = (time.perf_counter() - started) / count
+
+            started = time.perf_counter()
+            expected = [naive_nearby(lat, lon, k) for lat, lon in queries]
+            naive = (time.perf_counter() - started) / count
+
+            # Сравниваем расстояния, а не pk: у равноудалённых точек
+            # порядок может отличаться.
+            mismatches = sum(
+                not np.allclose(found, distances)
+                for (_, found), distances in zip(results, expected)
+            )
+            self.stdout.write(
+                f"Индекс: {indexed * 1000:.3f} мс/запрос, "
+                f"ORM: {naive * 1000:.3f} мс/запрос, "
+                f"ускорение x{naive / indexed:.1f}, расхождений: {mismatches}"
+            )
+
+        size = options["synthetic"]
+        if size:
+            lats = np.degrees(np.arcsin(np.random.default_rng(0).uniform(-1, 1, size)))
+            lons = np.random.default_rng(1).uniform(-180, 180, size)
+            started = time.perf_counter()
+            synthetic = PointIndex(zip(range(size), lats, lons))
+            build = time.perf_counter() - started
+
+            q_lats, q_lons = zip(*queries)
+            started = time.perf_counter()
+            synthetic.query(q_lats, q_lons, k)
+            batch = (time.perf_counter() - started) / count
+
+            started = time.perf_counter()
+            synthetic.query(q_lats, q_lons, radius_km=50)
+            radius = (time.perf_counter() - started) / count
+            self.stdout.write(
+                f"{size} случайных точек: индекс {build:.2f} с, "
+                f"kNN {batch * 1000:.3f} мс/запрос, "
+                f"радиус 50 км {radius * 1000:.3f} мс/запрос"
+            )
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+from trail.models import SearchDocument
+from trail.search import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Заново строит поисковые документы для маршрутов, точек интереса "
+        "и публичных коллекций (trail.search)."
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rebuild()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Документов: {SearchDocument.objects.count()} за {elapsed:.2f} с"
+            )
+        )
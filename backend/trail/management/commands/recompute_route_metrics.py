@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from trail.metrics import BATCH_SIZE, update_route_metrics
+from trail.models import Routers
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает длину, ограничивающий прямоугольник и центр "
+        "маршрутов по их точкам (trail.metrics)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "ids", nargs="*", type=int, help="id маршрутов; по умолчанию все."
+        )
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        queryset = Routers.objects.order_by("pk")
+        if options["ids"]:
+            queryset = queryset.filter(pk__in=options["ids"])
+        ids = list(queryset.values_list("pk", flat=True))
+        size = options["batch_size"]
+
+        started = time.perf_counter()
+        for start in range(0, len(ids), size):
+            update_route_metrics(ids[start : start + size])
+            self.stdout.write(f"{min(start + size, len(ids))}/{len(ids)}")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Пересчитано маршрутов: {len(ids)} за {elapsed:.2f} с")
+        )
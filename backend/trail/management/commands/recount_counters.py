@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from trail.counters import flush, recount
+from trail.generations import bump_generation
+from trail.models import Routers
+
+
+class Command(BaseCommand):
+    help = (
+        "Точно пересчитывает счётчики избранного и коллекций у маршрутов "
+        "по таблицам связей (trail.counters). Просмотры не меняются."
+    )
+
+    def handle(self, *args, **options):
+        flush()
+        recount()
+        bump_generation(Routers)
+        self.stdout.write(self.style.SUCCESS("Счётчики пересчитаны"))
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+from trail.trending import refresh_trending
+
+
+class Command(BaseCommand):
+    help = (
+        "Учитывает новые добавления в избранное и отзывы в счёте популярных "
+        "маршрутов (trail.trending). Просмотры копятся в памяти серверных "
+        "процессов и учитываются их фоновым потоком."
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        processed = refresh_trending()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Событий: {processed} за {elapsed:.2f} с")
+        )
@@ -0,0 +1,62 @@
+"""
+Метрики маршрута по его точкам: длина по большому кругу, ограничивающий
+прямоугольник и центр. Хранятся в колонках Routers и пересчитываются
+пакетами: точки всех маршрутов пакета читаются одним запросом, а расчёт
+идёт целиком на массивах NumPy (trail.geo.compute_metrics).
+"""
+
+from django.db import transaction
+
+from .generations import bump_generation, bump_objects
+from .geo import compute_metrics
+from .models import RoutePoints, Routers
+
+BATCH_SIZE = 500
+METRIC_FIELDS = (
+    "length_km",
+    "min_lat_e7",
+    "max_lat_e7",
+    "min_lon_e7",
+    "max_lon_e7",
+    "center_lat_e7",
+    "center_lon_e7",
+)
+
+
+def update_route_metrics(router_ids):
+    """
+    Пересчитывает и сохраняет метрики маршрутов ``router_ids``.
+
+    ``bulk_update`` не отправляет сигналы, поэтому поколение Routers и
+    версии маршрутов (trail.generations) поднимаются здесь явно.
+    """
+    router_ids = sorted(set(router_ids))
+    for start in range(0, len(router_ids), BATCH_SIZE):
+        batch = router_ids[start : start + BATCH_SIZE]
+        rows = list(
+            RoutePoints.objects.filter(
+                router_id__in=batch,
+                point__latitude_e7__isnull=False,
+                point__longitude_e7__isnull=False,
+            )
+            .order_by("router_id", "position", "pk")
+            .values_list("router_id", "point__latitude_e7", "point__longitude_e7")
+        )
+        metrics = compute_metrics(*zip(*rows)) if rows else {}
+        empty = dict.fromkeys(METRIC_FIELDS)
+        routers = [
+            Routers(pk=router_id, **metrics.get(router_id, empty))
+            for router_id in batch
+        ]
+        with transaction.atomic():
+            Routers.objects.bulk_update(routers, METRIC_FIELDS)
+        bump_objects(Routers, batch)
+    if router_ids:
+        bump_generation(Routers)
+
+
+def schedule_route_metrics(router_ids):
+    """Пересчитывает метрики после фиксации текущей транзакции."""
+    router_ids = set(router_ids)
+    if router_ids:
+        transaction.on_commit(lambda: update_route_metrics(router_ids))
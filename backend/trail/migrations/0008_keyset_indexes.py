@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-18 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trail", "0007_alter_collections_created_at_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="collections",
+            index=models.Index(
+                fields=["created_at", "id"], name="collections_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pointsofinterest",
+            index=models.Index(
+                fields=["created_at", "id"], name="points_created_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reviews",
+            index=models.Index(
+                fields=["pub_date", "id"], name="reviews_pub_date_id_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="routers",
+            index=models.Index(
+                fields=["created_at", "id"], name="routers_created_id_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2 on 2026-10-18 17:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trail", "0008_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="collections",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Дата изменения"),
+        ),
+        migrations.AddField(
+            model_name="pointsofinterest",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Дата изменения"),
+        ),
+        migrations.AddField(
+            model_name="reviews",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Дата изменения"),
+        ),
+        migrations.AddField(
+            model_name="routers",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, verbose_name="Дата изменения"),
+        ),
+        migrations.AddIndex(
+            model_name="collections",
+            index=models.Index(fields=["updated_at"], name="collections_updated_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="pointsofinterest",
+            index=models.Index(fields=["updated_at"], name="points_updated_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="reviews",
+            index=models.Index(fields=["updated_at"], name="reviews_updated_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="routers",
+            index=models.Index(fields=["updated_at"], name="routers_updated_idx"),
+        ),
+    ]
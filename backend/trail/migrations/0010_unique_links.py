@@ -0,0 +1,42 @@
+# Generated by Django 4.2 on 2026-10-18 17:55
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_links(apps, schema_editor):
+    # Перед добавлением ограничений оставляем по одной связи из каждой пары.
+    for model_name, fields in (
+        ("RoutePoints", ("router", "point")),
+        ("CollectionRouters", ("collection", "router")),
+    ):
+        model = apps.get_model("trail", model_name)
+        keep = (
+            model.objects.values(*fields)
+            .annotate(keep_id=Min("id"))
+            .values_list("keep_id", flat=True)
+        )
+        model.objects.exclude(id__in=list(keep)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trail", "0009_updated_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_links, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="collectionrouters",
+            constraint=models.UniqueConstraint(
+                fields=("collection", "router"), name="unique_collection_router"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="routepoints",
+            constraint=models.UniqueConstraint(
+                fields=("router", "point"), name="unique_route_point"
+            ),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2 on 2026-10-18 17:55
+
+from django.db import migrations, models
+from trail.geo import morton_code
+
+BATCH_SIZE = 1000
+
+
+def backfill_morton(apps, schema_editor):
+    # Историческая модель не вызывает PointsOfInterest.save(), поэтому
+    # заполняем коды здесь, пачками по первичному ключу.
+    model = apps.get_model("trail", "PointsOfInterest")
+    last_id = 0
+    while True:
+        batch = list(
+            model.objects.filter(id__gt=last_id, morton__isnull=True)
+            .exclude(latitude=None)
+            .exclude(longitude=None)
+            .order_by("id")
+            .only("id", "latitude", "longitude")[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for point in batch:
+            point.morton = morton_code(point.longitude, point.latitude)
+        model.objects.bulk_update(batch, ["morton"])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trail", "0010_unique_links"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pointsofinterest",
+            name="morton",
+            field=models.BigIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="Пространственный ключ",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="pointsofinterest",
+            index=models.Index(fields=["morton"], name="points_morton_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="pointsofinterest",
+            index=models.Index(
+                fields=["category", "morton"], name="points_category_morton_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_morton, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-18 17:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trail", "0011_points_morton"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pointsofinterest",
+            name="latitude_e7",
+            field=models.IntegerField(
+                blank=True, editable=False, null=True, verbose_name="Широта, E7"
+            ),
+        ),
+        migrations.AddField(
+            model_name="pointsofinterest",
+            name="longitude_e7",
+            field=models.IntegerField(
+                blank=True, editable=False, null=True, verbose_name="Долгота, E7"
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations, transaction
+from trail.geo import to_e7
+
+BATCH_SIZE = 1000
+
+
+def backfill_e7(apps, schema_editor):
+    # Каждая пачка — своя короткая транзакция, поэтому таблица не
+    # блокируется надолго. Обработанные строки уже не попадают в выборку,
+    # так что прерванную миграцию можно просто запустить снова.
+    model = apps.get_model("trail", "PointsOfInterest")
+    pending = (
+        model.objects.filter(latitude_e7__isnull=True, latitude__isnull=False)
+        | model.objects.filter(longitude_e7__isnull=True, longitude__isnull=False)
+    ).order_by("id")
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                pending.filter(id__gt=last_id).only("id", "latitude", "longitude")[
+                    :BATCH_SIZE
+                ]
+            )
+            if not batch:
+                break
+            for point in batch:
+                point.latitude_e7 = to_e7(point.latitude)
+                point.longitude_e7 = to_e7(point.longitude)
+            model.objects.bulk_update(batch, ["latitude_e7", "longitude_e7"])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("trail", "0012_points_e7"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_e7, migrations.RunPython.noop),
+    ]
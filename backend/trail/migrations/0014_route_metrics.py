@@ -0,0 +1,65 @@
+# Generated by Django 4.2 on 2026-10-18 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trail", "0013_backfill_points_e7"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="collectionrouters",
+            options={"ordering": ["id"]},
+        ),
+        migrations.AlterModelOptions(
+            name="routepoints",
+            options={"ordering": ["id"]},
+        ),
+        migrations.AddField(
+            model_name="routers",
+            name="center_lat_e7",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="routers",
+            name="center_lon_e7",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="routers",
+            name="length_km",
+            field=models.FloatField(
+                blank=True, editable=False, null=True, verbose_name="Длина, км"
+            ),
+        ),
+        migrations.AddField(
+            model_name="routers",
+            name="max_lat_e7",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="routers",
+            name="max_lon_e7",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="routers",
+            name="min_lat_e7",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="routers",
+            name="min_lon_e7",
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="routers",
+            index=models.Index(
+                fields=["min_lat_e7", "max_lat_e7", "min_lon_e7", "max_lon_e7"],
+                name="routers_bbox_idx",
+            ),
+        ),
+    ]
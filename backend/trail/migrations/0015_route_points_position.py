@@ -0,0 +1,51 @@
+# Generated by Django 4.2 on 2026-10-18 18:02
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def number_route_points(apps, schema_editor):
+    # Сохраняем прежний порядок точек (по id), нумеруя их внутри маршрута.
+    model = apps.get_model("trail", "RoutePoints")
+    batch, router_id, position = [], None, 0
+    for link in model.objects.order_by("router_id", "id").only("id", "router_id"):
+        if link.router_id != router_id:
+            router_id, position = link.router_id, 0
+        link.position = position
+        position += 1
+        batch.append(link)
+        if len(batch) >= BATCH_SIZE:
+            model.objects.bulk_update(batch, ["position"])
+            batch = []
+    if batch:
+        model.objects.bulk_update(batch, ["position"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trail", "0014_route_metrics"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="routepoints",
+            options={"ordering": ["position", "id"]},
+        ),
+        migrations.AddField(
+            model_name="routepoints",
+            name="position",
+            field=models.PositiveIntegerField(
+                blank=True, default=0, verbose_name="Порядковый номер"
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(number_route_points, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="routepoints",
+            index=models.Index(
+                fields=["router", "position"], name="route_points_order_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2 on 2026-10-18 18:06
+
+from django.db import migrations, models
+from trail import search
+
+
+def create_index(apps, schema_editor):
+    search.create_index(schema_editor)
+
+
+def drop_index(apps, schema_editor):
+    search.drop_index(schema_editor)
+
+
+def build_documents(apps, schema_editor):
+    search.rebuild(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trail", "0015_route_points_position"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchDocument",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("router", "Маршрут"),
+                            ("point", "Точка интереса"),
+                            ("collection", "Коллекция"),
+                        ],
+                        max_length=16,
+                        verbose_name="Тип объекта",
+                    ),
+                ),
+                ("object_id", models.BigIntegerField(verbose_name="id объекта")),
+                ("title", models.CharField(max_length=256, verbose_name="Заголовок")),
+                ("body", models.TextField(blank=True, verbose_name="Текст")),
+            ],
+            options={
+                "verbose_name": "Поисковый документ",
+                "verbose_name_plural": "Поисковые документы",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="searchdocument",
+            constraint=models.UniqueConstraint(
+                fields=("kind", "object_id"), name="unique_search_document"
+            ),
+        ),
+        migrations.RunPython(create_index, drop_index),
+        migrations.RunPython(build_documents, migrations.RunPython.noop),
+    ]
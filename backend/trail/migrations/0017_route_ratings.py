@@ -0,0 +1,84 @@
+# Generated by Django 4.2 on 2026-10-18 18:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+from trail import ratings
+
+
+def build_ratings(apps, schema_editor):
+    ratings.rebuild(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trail", "0016_search_documents"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RouteRating",
+            fields=[
+                (
+                    "router",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="rating",
+                        serialize=False,
+                        to="trail.routers",
+                        verbose_name="Маршрут",
+                    ),
+                ),
+                (
+                    "count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Число отзывов"
+                    ),
+                ),
+                (
+                    "total",
+                    models.PositiveIntegerField(default=0, verbose_name="Сумма оценок"),
+                ),
+                (
+                    "mean",
+                    models.FloatField(
+                        blank=True, null=True, verbose_name="Средняя оценка"
+                    ),
+                ),
+                (
+                    "bayesian",
+                    models.FloatField(default=5.5, verbose_name="Байесовский рейтинг"),
+                ),
+                ("score_1", models.PositiveIntegerField(default=0)),
+                ("score_2", models.PositiveIntegerField(default=0)),
+                ("score_3", models.PositiveIntegerField(default=0)),
+                ("score_4", models.PositiveIntegerField(default=0)),
+                ("score_5", models.PositiveIntegerField(default=0)),
+                ("score_6", models.PositiveIntegerField(default=0)),
+                ("score_7", models.PositiveIntegerField(default=0)),
+                ("score_8", models.PositiveIntegerField(default=0)),
+                ("score_9", models.PositiveIntegerField(default=0)),
+                ("score_10", models.PositiveIntegerField(default=0)),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата изменения"),
+                ),
+            ],
+            options={
+                "verbose_name": "Рейтинг маршрута",
+                "verbose_name_plural": "Рейтинги маршрутов",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="routerating",
+            index=models.Index(
+                fields=["-bayesian", "router"], name="route_rating_top_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="routerating",
+            index=models.Index(fields=["updated_at"], name="route_rating_updated_idx"),
+        ),
+        migrations.RunPython(build_ratings, migrations.RunPython.noop),
+    ]
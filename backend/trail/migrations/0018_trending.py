@@ -0,0 +1,67 @@
+# Generated by Django 4.2 on 2026-10-18 18:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trail", "0017_route_ratings"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrendingCursor",
+            fields=[
+                (
+                    "source",
+                    models.CharField(
+                        max_length=32,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="Источник",
+                    ),
+                ),
+                (
+                    "position",
+                    models.BigIntegerField(default=0, verbose_name="Последний id"),
+                ),
+            ],
+            options={
+                "verbose_name": "Позиция источника популярности",
+                "verbose_name_plural": "Позиции источников популярности",
+            },
+        ),
+        migrations.CreateModel(
+            name="TrendingScore",
+            fields=[
+                (
+                    "router",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="trending",
+                        serialize=False,
+                        to="trail.routers",
+                        verbose_name="Маршрут",
+                    ),
+                ),
+                ("log_score", models.FloatField(verbose_name="Логарифм счёта")),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата изменения"),
+                ),
+            ],
+            options={
+                "verbose_name": "Популярность маршрута",
+                "verbose_name_plural": "Популярность маршрутов",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="trendingscore",
+            index=models.Index(
+                fields=["-log_score", "router"], name="trending_score_top_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2 on 2026-10-18 18:17
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# Счётчик маршрута -> таблица связей, по которой он считается. Логика
+# записана здесь, а не взята из trail.counters: миграция не должна
+# меняться вместе с живым модулем.
+SOURCES = {
+    "favorites_count": "Favorite",
+    "collections_count": "CollectionRouters",
+}
+
+
+def count_links(apps, schema_editor):
+    routers = apps.get_model("trail", "Routers")
+    for field, model_name in SOURCES.items():
+        links = (
+            apps.get_model("trail", model_name)
+            .objects.filter(router=OuterRef("pk"))
+            .order_by()
+            .values("router")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        routers.objects.update(**{field: Coalesce(Subquery(links), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trail", "0018_trending"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="routers",
+            name="collections_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="В коллекциях"
+            ),
+        ),
+        migrations.AddField(
+            model_name="routers",
+            name="favorites_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="В избранном"
+            ),
+        ),
+        migrations.AddField(
+            model_name="routers",
+            name="views_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Просмотры"
+            ),
+        ),
+        migrations.RunPython(count_links, migrations.RunPython.noop),
+    ]
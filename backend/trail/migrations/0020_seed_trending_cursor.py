@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 19:00
+
+from django.db import migrations
+from django.db.models import Max
+
+
+def seed_favorite_cursor(apps, schema_editor):
+    # У избранного нет даты добавления, и при первом обновлении популярности
+    # всё накопленное избранное считалось бы добавленным сейчас. Позиция
+    # ставится на последнее существующее избранное: в счёт идёт только новое.
+    favorite = apps.get_model("trail", "Favorite")
+    cursor_model = apps.get_model("trail", "TrendingCursor")
+    last = favorite.objects.aggregate(last=Max("pk"))["last"] or 0
+    cursor, _ = cursor_model.objects.get_or_create(source="favorite")
+    if cursor.position < last:
+        cursor.position = last
+        cursor.save(update_fields=["position"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trail", "0019_router_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_favorite_cursor, migrations.RunPython.noop),
+    ]
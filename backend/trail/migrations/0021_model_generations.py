@@ -0,0 +1,36 @@
+# Generated by Django 4.2 on 2026-10-18 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trail", "0020_seed_trending_cursor"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ModelGeneration",
+            fields=[
+                (
+                    "label",
+                    models.CharField(
+                        max_length=100,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="Модель",
+                    ),
+                ),
+                ("value", models.BigIntegerField(default=0, verbose_name="Поколение")),
+                (
+                    "changed_at",
+                    models.FloatField(verbose_name="Время последней записи"),
+                ),
+            ],
+            options={
+                "verbose_name": "Поколение модели",
+                "verbose_name_plural": "Поколения моделей",
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2 on 2026-10-18 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trail", "0021_model_generations"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ObjectVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("label", models.CharField(max_length=100, verbose_name="Модель")),
+                ("object_id", models.BigIntegerField(verbose_name="Объект")),
+                ("value", models.BigIntegerField(default=0, verbose_name="Версия")),
+            ],
+            options={
+                "verbose_name": "Версия объекта",
+                "verbose_name_plural": "Версии объектов",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="objectversion",
+            constraint=models.UniqueConstraint(
+                fields=("label", "object_id"), name="unique_object_version"
+            ),
+        ),
+    ]
@@ -0,0 +1,63 @@
+from django.db import migrations, transaction
+from trail.geo import compute_metrics
+
+BATCH_SIZE = 500
+METRIC_FIELDS = (
+    "length_km",
+    "min_lat_e7",
+    "max_lat_e7",
+    "min_lon_e7",
+    "max_lon_e7",
+    "center_lat_e7",
+    "center_lon_e7",
+)
+
+
+def backfill_metrics(apps, schema_editor):
+    # Метрики (0014) считались только при изменении точек, поэтому у старых
+    # маршрутов они пусты и ?bbox= их не находит; у маршрутов через 180-й
+    # меридиан прямоугольник раньше охватывал почти весь шар. Пересчитываем
+    # все маршруты пачками, каждая — своя короткая транзакция.
+    routers = apps.get_model("trail", "Routers")
+    route_points = apps.get_model("trail", "RoutePoints")
+    last_id = 0
+    while True:
+        batch = list(
+            routers.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        rows = list(
+            route_points.objects.filter(
+                router_id__in=batch,
+                point__latitude_e7__isnull=False,
+                point__longitude_e7__isnull=False,
+            )
+            .order_by("router_id", "position", "id")
+            .values_list("router_id", "point__latitude_e7", "point__longitude_e7")
+        )
+        metrics = compute_metrics(*zip(*rows)) if rows else {}
+        empty = dict.fromkeys(METRIC_FIELDS)
+        with transaction.atomic():
+            routers.objects.bulk_update(
+                [
+                    routers(id=router_id, **metrics.get(router_id, empty))
+                    for router_id in batch
+                ],
+                METRIC_FIELDS,
+            )
+        last_id = batch[-1]
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("trail", "0022_object_versions"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_metrics, migrations.RunPython.noop),
+    ]
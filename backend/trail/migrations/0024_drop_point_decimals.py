@@ -0,0 +1,71 @@
+# Generated by Django 4.2 on 2026-10-18 18:54
+
+from django.db import migrations, transaction
+from trail.geo import decimal_from_e7, to_e7
+
+BATCH_SIZE = 1000
+
+
+def copy_coordinates(apps, source, target, convert):
+    # Как в 0013: короткие транзакции по пачкам, обработанные строки уже
+    # не попадают в выборку.
+    model = apps.get_model("trail", "PointsOfInterest")
+    pending = (
+        model.objects.filter(
+            **{f"{target[0]}__isnull": True, f"{source[0]}__isnull": False}
+        )
+        | model.objects.filter(
+            **{f"{target[1]}__isnull": True, f"{source[1]}__isnull": False}
+        )
+    ).order_by("id")
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                pending.filter(id__gt=last_id).only("id", *source)[:BATCH_SIZE]
+            )
+            if not batch:
+                break
+            for point in batch:
+                for source_name, target_name in zip(source, target):
+                    value = getattr(point, source_name)
+                    setattr(point, target_name, convert(value))
+            model.objects.bulk_update(batch, target)
+        last_id = batch[-1].id
+
+
+def backfill_e7(apps, schema_editor):
+    # Последние строки, у которых E7 ещё не заполнены, перед удалением
+    # колонок с градусами.
+    copy_coordinates(
+        apps, ("latitude", "longitude"), ("latitude_e7", "longitude_e7"), to_e7
+    )
+
+
+def restore_decimals(apps, schema_editor):
+    copy_coordinates(
+        apps,
+        ("latitude_e7", "longitude_e7"),
+        ("latitude", "longitude"),
+        decimal_from_e7,
+    )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("trail", "0023_backfill_route_metrics"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_e7, restore_decimals),
+        migrations.RemoveField(
+            model_name="pointsofinterest",
+            name="latitude",
+        ),
+        migrations.RemoveField(
+            model_name="pointsofinterest",
+            name="longitude",
+        ),
+    ]
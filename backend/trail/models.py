@@ -1,7 +1,11 @@
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models  # type: ignore
+from django.db import models, transaction  # type: ignore
 from users.models import User
 
+from .generations import bump_generation, bump_objects
+from .geo import decimal_from_e7, morton_code, to_e7
+from .ratings import PRIOR_MEAN, rating_update
+
 
 class Routers(models.Model):
     name = models.CharField(max_length=256, verbose_name="Название маршрута")
@@ -13,6 +17,7 @@ class Routers(models.Model):
     created_at = models.DateField(
         auto_now_add=True, verbose_name="Дата создания маршрута"
     )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
     photo = models.ImageField(
         blank=True,
         upload_to="media/routers/",
@@ -20,14 +25,56 @@ class Routers(models.Model):
     author = models.ForeignKey(
         User, related_name="routers", verbose_name="Автор", on_delete=models.CASCADE
     )
+    # Метрики по точкам маршрута, пересчитываются в trail.metrics.
+    # Координаты хранятся в целых E7, как у PointsOfInterest.
+    length_km = models.FloatField(
+        null=True, blank=True, editable=False, verbose_name="Длина, км"
+    )
+    min_lat_e7 = models.IntegerField(null=True, blank=True, editable=False)
+    max_lat_e7 = models.IntegerField(null=True, blank=True, editable=False)
+    min_lon_e7 = models.IntegerField(null=True, blank=True, editable=False)
+    max_lon_e7 = models.IntegerField(null=True, blank=True, editable=False)
+    center_lat_e7 = models.IntegerField(null=True, blank=True, editable=False)
+    center_lon_e7 = models.IntegerField(null=True, blank=True, editable=False)
+    # Счётчики копятся в памяти и сбрасываются пачками (trail.counters).
+    views_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Просмотры"
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="В избранном"
+    )
+    collections_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="В коллекциях"
+    )
+
+    COUNTER_FIELDS = ("views_count", "favorites_count", "collections_count")
 
     class Meta:
         verbose_name = "Маршрут"
         verbose_name_plural = "Маршруты"
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="routers_created_id_idx"),
+            models.Index(fields=["updated_at"], name="routers_updated_idx"),
+            models.Index(
+                fields=["min_lat_e7", "max_lat_e7", "min_lon_e7", "max_lon_e7"],
+                name="routers_bbox_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Счётчики меняет только trail.counters отдельными UPDATE: обычное
+        # сохранение их не трогает, иначе затрёт накопленное после чтения.
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class PointsOfInterest(models.Model):
     name = models.CharField(max_length=256, verbose_name="Название точки интереса")
@@ -35,14 +82,22 @@ class PointsOfInterest(models.Model):
     description = models.CharField(
         max_length=256, verbose_name="Описание точки интереса"
     )
-    latitude = models.DecimalField(
-        max_digits=22, decimal_places=16, blank=True, null=True
+    # Координаты хранятся только целыми E7 (trail.geo, точность около
+    # сантиметра): по ним работают пространственные запросы, а градусы
+    # для форм, шаблонов и API дают свойства latitude и longitude.
+    # Код Мортона ведётся в save().
+    latitude_e7 = models.IntegerField(
+        null=True, blank=True, editable=False, verbose_name="Широта, E7"
+    )
+    longitude_e7 = models.IntegerField(
+        null=True, blank=True, editable=False, verbose_name="Долгота, E7"
     )
-    longitude = models.DecimalField(
-        max_digits=22, decimal_places=16, blank=True, null=True
+    morton = models.BigIntegerField(
+        null=True, blank=True, editable=False, verbose_name="Пространственный ключ"
     )
     category = models.CharField(max_length=256, verbose_name="Категория места")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
     photo = models.ImageField(
         blank=True,
         upload_to="media/routers/",
@@ -51,10 +106,45 @@ class PointsOfInterest(models.Model):
     class Meta:
         verbose_name = "Точка интереса"
         verbose_name_plural = "Точки интереса"
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="points_created_id_idx"),
+            models.Index(fields=["updated_at"], name="points_updated_idx"),
+            models.Index(fields=["morton"], name="points_morton_idx"),
+            models.Index(
+                fields=["category", "morton"], name="points_category_morton_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def latitude(self):
+        return decimal_from_e7(self.latitude_e7)
+
+    @latitude.setter
+    def latitude(self, value):
+        self.latitude_e7 = to_e7(value)
+
+    @property
+    def longitude(self):
+        return decimal_from_e7(self.longitude_e7)
+
+    @longitude.setter
+    def longitude(self, value):
+        self.longitude_e7 = to_e7(value)
+
+    def save(self, *args, **kwargs):
+        self.morton = morton_code(self.longitude, self.latitude)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            renamed = {"latitude": "latitude_e7", "longitude": "longitude_e7"}
+            kwargs["update_fields"] = {
+                *(renamed.get(name, name) for name in update_fields),
+                "morton",
+            }
+        super().save(*args, **kwargs)
+
 
 class Reviews(models.Model):
     router = models.ForeignKey(
@@ -74,14 +164,90 @@ class Reviews(models.Model):
         validators=[MinValueValidator(1), MaxValueValidator(10)],
     )
     pub_date = models.DateField(auto_now_add=True, verbose_name="Дата добавления")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
 
     class Meta:
         verbose_name = "Отзыв"
         verbose_name_plural = "Отзывы"
+        indexes = [
+            models.Index(fields=["pub_date", "id"], name="reviews_pub_date_id_idx"),
+            models.Index(fields=["updated_at"], name="reviews_updated_idx"),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        # Агрегаты оценок маршрута (RouteRating) меняются в той же
+        # транзакции, что и отзыв; удаление учитывает trail.signals.
+        with transaction.atomic():
+            previous = None
+            if self.pk is not None:
+                previous = (
+                    Reviews.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values_list("router_id", "score")
+                    .first()
+                )
+            super().save(*args, **kwargs)
+            if previous != (self.router_id, self.score):
+                if previous is not None:
+                    RouteRating.objects.apply(*previous, sign=-1)
+                RouteRating.objects.apply(self.router_id, self.score, sign=1)
+
+
+class RouteRatingManager(models.Manager):
+    def apply(self, router_id, score, sign):
+        """
+        Добавляет (``sign=1``) или убирает (``sign=-1``) оценку маршрута
+        одним UPDATE с F-выражениями (trail.ratings).
+
+        Строка заводится при первом отзыве; при удалении не создаётся:
+        вместе с маршрутом удаляется и она.
+        """
+        if sign > 0:
+            self.get_or_create(router_id=router_id)
+        self.filter(router_id=router_id).update(**rating_update(score, sign))
+        # update() не отправляет сигналы: сбрасываем кэши явно.
+        transaction.on_commit(lambda: bump_generation(RouteRating))
+        transaction.on_commit(lambda: bump_objects(Routers, [router_id]))
+
+
+class RouteRating(models.Model):
+    router = models.OneToOneField(
+        Routers,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="rating",
+        verbose_name="Маршрут",
+    )
+    count = models.PositiveIntegerField(default=0, verbose_name="Число отзывов")
+    total = models.PositiveIntegerField(default=0, verbose_name="Сумма оценок")
+    mean = models.FloatField(null=True, blank=True, verbose_name="Средняя оценка")
+    bayesian = models.FloatField(default=PRIOR_MEAN, verbose_name="Байесовский рейтинг")
+    # Гистограмма оценок: по столбцу на значение, чтобы менять её F-выражениями
+    score_1 = models.PositiveIntegerField(default=0)
+    score_2 = models.PositiveIntegerField(default=0)
+    score_3 = models.PositiveIntegerField(default=0)
+    score_4 = models.PositiveIntegerField(default=0)
+    score_5 = models.PositiveIntegerField(default=0)
+    score_6 = models.PositiveIntegerField(default=0)
+    score_7 = models.PositiveIntegerField(default=0)
+    score_8 = models.PositiveIntegerField(default=0)
+    score_9 = models.PositiveIntegerField(default=0)
+    score_10 = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
+
+    objects = RouteRatingManager()
+
+    class Meta:
+        verbose_name = "Рейтинг маршрута"
+        verbose_name_plural = "Рейтинги маршрутов"
+        indexes = [
+            models.Index(fields=["-bayesian", "router"], name="route_rating_top_idx"),
+            models.Index(fields=["updated_at"], name="route_rating_updated_idx"),
+        ]
+
 
 class Collections(models.Model):
     user = models.ForeignKey(
@@ -96,10 +262,17 @@ class Collections(models.Model):
     created_at = models.DateField(
         auto_now_add=True, verbose_name="Дата создания коллекции"
     )
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
 
     class Meta:
         verbose_name = "Коллекция"
         verbose_name_plural = "Коллекции"
+        indexes = [
+            models.Index(
+                fields=["created_at", "id"], name="collections_created_id_idx"
+            ),
+            models.Index(fields=["updated_at"], name="collections_updated_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -112,6 +285,29 @@ class RoutePoints(models.Model):
     point = models.ForeignKey(
         PointsOfInterest, on_delete=models.CASCADE, related_name="router_points"
     )
+    position = models.PositiveIntegerField(blank=True, verbose_name="Порядковый номер")
+
+    class Meta:
+        # Порядок точек — порядок маршрута: от него зависят вывод API
+        # и длина маршрута (trail.metrics).
+        ordering = ["position", "id"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["router", "point"], name="unique_route_point"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["router", "position"], name="route_points_order_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Новая точка без явного номера встаёт в конец маршрута.
+        if self.position is None:
+            last = RoutePoints.objects.filter(router_id=self.router_id).aggregate(
+                last=models.Max("position")
+            )["last"]
+            self.position = 0 if last is None else last + 1
+        super().save(*args, **kwargs)
 
 
 class CollectionRouters(models.Model):
@@ -122,6 +318,14 @@ class CollectionRouters(models.Model):
         Routers, on_delete=models.CASCADE, related_name="collection_routers"
     )
 
+    class Meta:
+        ordering = ["id"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["collection", "router"], name="unique_collection_router"
+            ),
+        ]
+
 
 class Favorite(models.Model):
     user = models.ForeignKey(
@@ -137,3 +341,93 @@ class Favorite(models.Model):
     class Meta:
         verbose_name = "Избранный маршрут"
         verbose_name_plural = "Избранные маршруты"
+
+
+class SearchDocument(models.Model):
+    # Текст объекта для полнотекстового поиска (trail.search). Сам
+    # инвертированный индекс над таблицей строит СУБД: FTS5 в SQLite
+    # и GIN по tsvector в PostgreSQL.
+    KIND_CHOICES = [
+        ("router", "Маршрут"),
+        ("point", "Точка интереса"),
+        ("collection", "Коллекция"),
+    ]
+
+    kind = models.CharField(
+        max_length=16, choices=KIND_CHOICES, verbose_name="Тип объекта"
+    )
+    object_id = models.BigIntegerField(verbose_name="id объекта")
+    title = models.CharField(max_length=256, verbose_name="Заголовок")
+    body = models.TextField(blank=True, verbose_name="Текст")
+
+    class Meta:
+        verbose_name = "Поисковый документ"
+        verbose_name_plural = "Поисковые документы"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "object_id"], name="unique_search_document"
+            ),
+        ]
+
+
+class TrendingScore(models.Model):
+    # Счёт популярности маршрута с экспоненциальным затуханием (trail.trending).
+    # Хранится логарифм счёта, приведённого к началу эпохи Unix: порядок по
+    # нему не меняется со временем, поэтому старые строки не переписываются.
+    router = models.OneToOneField(
+        Routers,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="trending",
+        verbose_name="Маршрут",
+    )
+    log_score = models.FloatField(verbose_name="Логарифм счёта")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата изменения")
+
+    class Meta:
+        verbose_name = "Популярность маршрута"
+        verbose_name_plural = "Популярность маршрутов"
+        indexes = [
+            models.Index(
+                fields=["-log_score", "router"], name="trending_score_top_idx"
+            ),
+        ]
+
+
+class TrendingCursor(models.Model):
+    # Докуда источник событий уже учтён в TrendingScore (последний id).
+    source = models.CharField(max_length=32, primary_key=True, verbose_name="Источник")
+    position = models.BigIntegerField(default=0, verbose_name="Последний id")
+
+    class Meta:
+        verbose_name = "Позиция источника популярности"
+        verbose_name_plural = "Позиции источников популярности"
+
+
+class ModelGeneration(models.Model):
+    # Поколение модели для кэшей ответов (trail.generations): общее для
+    # всех процессов, в отличие от кэша Django по умолчанию.
+    label = models.CharField(max_length=100, primary_key=True, verbose_name="Модель")
+    value = models.BigIntegerField(default=0, verbose_name="Поколение")
+    changed_at = models.FloatField(verbose_name="Время последней записи")
+
+    class Meta:
+        verbose_name = "Поколение модели"
+        verbose_name_plural = "Поколения моделей"
+
+
+class ObjectVersion(models.Model):
+    # Версия объекта для кэша готовых представлений (api.materialize,
+    # trail.generations): общая для всех процессов.
+    label = models.CharField(max_length=100, verbose_name="Модель")
+    object_id = models.BigIntegerField(verbose_name="Объект")
+    value = models.BigIntegerField(default=0, verbose_name="Версия")
+
+    class Meta:
+        verbose_name = "Версия объекта"
+        verbose_name_plural = "Версии объектов"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["label", "object_id"], name="unique_object_version"
+            ),
+        ]
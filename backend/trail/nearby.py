@@ -0,0 +1,316 @@
+"""
+Поиск ближайших точек интереса: k ближайших и все в радиусе.
+
+Координаты лежат в непрерывных массивах NumPy в виде единичных векторов
+на сфере. Хорда между векторами монотонна по расстоянию по дуге, поэтому
+листья KD-дерева в трёхмерном пространстве можно отсекать обычным
+евклидовым расстоянием до их ограничивающих коробок, а итоговое
+расстояние считается по формуле гаверсинусов.
+
+Дерево хранится плоско: точки упорядочены по листьям, у каждого листа
+есть коробка. Расстояния от пачки запросов до всех коробок считаются
+одной векторной операцией, затем для каждого запроса просматриваются
+только листья, которые могут содержать ответ.
+"""
+
+import math
+import threading
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from .generations import get_generations
+from .geo import EARTH_RADIUS_KM, from_e7
+from .models import PointsOfInterest
+
+LEAF_SIZE = 128
+# Сколько запросов пачки обрабатывается за одну векторную операцию.
+QUERY_BLOCK = 256
+# Доля вставок и удалений после построения, после которой дерево
+# перестраивается заново: до этого новые точки лежат в отдельном буфере.
+REBUILD_RATIO = 0.2
+# Запас при дочитывании изменений: часы процессов могут немного расходиться.
+SYNC_SLACK = timedelta(seconds=5)
+
+
+def to_xyz(lats, lons):
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], -1)
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Расстояние от одной точки до массива точек (градусы) в километрах."""
+    lat, lon = math.radians(lat), math.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = (
+        np.sin((lats - lat) / 2) ** 2
+        + math.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def chord_for_km(radius_km):
+    # Длина хорды единичной сферы для дуги заданной длины.
+    return 2 * math.sin(min(radius_km / EARTH_RADIUS_KM, math.pi) / 2)
+
+
+class PointIndex:
+    """
+    Индекс координат ``{pk: (lat, lon)}`` с поиском kNN и по радиусу.
+
+    Изменения после построения применяются на месте: сдвиг точки
+    расширяет коробку её листа, новая точка попадает в буфер, удалённая
+    помечается. Все методы потокобезопасны.
+    """
+
+    def __init__(self, rows=(), leaf_size=LEAF_SIZE):
+        self.leaf_size = leaf_size
+        self.lock = threading.RLock()
+        self.generation = None
+        self.synced_at = None
+        self.build(rows)
+
+    def build(self, rows):
+        rows = list(rows)
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        coords = np.array([row[1:] for row in rows], dtype=np.float64).reshape(-1, 2)
+        xyz = to_xyz(coords[:, 0], coords[:, 1]).reshape(-1, 3)
+
+        order, bounds = self._partition(xyz)
+        with self.lock:
+            self.ids = ids[order]
+            self.coords = coords[order]
+            self.xyz = xyz[order]
+            self.alive = np.ones(len(ids), dtype=bool)
+            self.leaf_start = np.array(
+                [start for start, _ in bounds] + [len(ids)], dtype=np.int64
+            )
+            self.leaf_of = np.repeat(
+                np.arange(len(bounds)), np.diff(self.leaf_start)
+            ).astype(np.int64)
+            starts = self.leaf_start[:-1]
+            self.lo = np.minimum.reduceat(self.xyz, starts) if bounds else self.xyz
+            self.hi = np.maximum.reduceat(self.xyz, starts) if bounds else self.xyz
+            self.position = {pk: pos for pos, pk in enumerate(self.ids.tolist())}
+            self.extra = {}
+            self.dead = 0
+
+    def _partition(self, xyz):
+        """
+        Рекурсивно делит точки по медиане вдоль самой широкой оси.
+        Возвращает перестановку точек и границы листьев в ней.
+        """
+        order = np.arange(len(xyz))
+        bounds = []
+        stack = [(0, len(xyz))]
+        while stack:
+            start, end = stack.pop()
+            if end - start <= self.leaf_size:
+                if end > start:
+                    bounds.append((start, end))
+                continue
+            part = order[start:end]
+            points = xyz[part]
+            axis = int(np.argmax(points.max(0) - points.min(0)))
+            middle = (end - start) // 2
+            split = np.argpartition(points[:, axis], middle)
+            order[start:end] = part[split]
+            stack.append((start + middle, end))
+            stack.append((start, start + middle))
+        bounds.sort()
+        return order, bounds
+
+    def __len__(self):
+        return len(self.position) - self.dead + len(self.extra)
+
+    @property
+    def needs_rebuild(self):
+        return len(self.extra) + self.dead > REBUILD_RATIO * max(len(self.ids), 1)
+
+    def rows(self):
+        with self.lock:
+            rows = [
+                (pk, *self.coords[pos])
+                for pk, pos in self.position.items()
+                if self.alive[pos]
+            ]
+            rows.extend((pk, lat, lon) for pk, (lat, lon) in self.extra.items())
+            return rows
+
+    def upsert(self, pk, lat, lon):
+        with self.lock:
+            self._drop(pk)
+            if lat is None or lon is None:
+                return
+            pos = self.position.get(pk)
+            if pos is None:
+                self.extra[pk] = (float(lat), float(lon))
+            else:
+                point = to_xyz(float(lat), float(lon))
+                self.coords[pos] = (float(lat), float(lon))
+                self.xyz[pos] = point
+                self.alive[pos] = True
+                self.dead -= 1
+                leaf = self.leaf_of[pos]
+                self.lo[leaf] = np.minimum(self.lo[leaf], point)
+                self.hi[leaf] = np.maximum(self.hi[leaf], point)
+            if self.needs_rebuild:
+                self.build(self.rows())
+
+    def remove(self, pk):
+        with self.lock:
+            self._drop(pk)
+            if self.needs_rebuild:
+                self.build(self.rows())
+
+    def _drop(self, pk):
+        self.extra.pop(pk, None)
+        pos = self.position.get(pk)
+        if pos is not None and self.alive[pos]:
+            self.alive[pos] = False
+            self.dead += 1
+
+    def query(self, lats, lons, k=None, radius_km=None):
+        """
+        Пакетный поиск: для каждой пары ``(lat, lon)`` возвращает
+        ``(ids, distances_km)``, отсортированные по расстоянию.
+
+        ``k`` ограничивает число соседей, ``radius_km`` — расстояние;
+        нужно задать хотя бы одно из двух.
+        """
+        if k is None and radius_km is None:
+            raise ValueError("Нужно задать k или radius_km.")
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        with self.lock:
+            extra_ids = np.fromiter(self.extra, dtype=np.int64, count=len(self.extra))
+            extra_coords = np.array(list(self.extra.values()), dtype=np.float64)
+            results = []
+            for start in range(0, len(lats), QUERY_BLOCK):
+                block = slice(start, start + QUERY_BLOCK)
+                results.extend(
+                    self._query_block(
+                        lats[block],
+                        lons[block],
+                        k,
+                        radius_km,
+                        extra_ids,
+                        extra_coords.reshape(-1, 2),
+                    )
+                )
+            return results
+
+    def _query_block(self, lats, lons, k, radius_km, extra_ids, extra_coords):
+        points = to_xyz(lats, lons)
+        # Расстояние от каждого запроса до коробки каждого листа, (Q, L).
+        gap = np.maximum(
+            np.maximum(self.lo[None] - points[:, None], 0.0),
+            points[:, None] - self.hi[None],
+        )
+        box = np.sqrt((gap**2).sum(-1))
+        sizes = np.diff(self.leaf_start)
+        limit = chord_for_km(radius_km) if radius_km is not None else np.inf
+
+        results = []
+        for i, point in enumerate(points):
+            leaves = np.argsort(box[i], kind="stable")
+            bound = limit
+            if k is not None and len(self.ids):
+                # Ближайшие по коробкам листья, в которых хватит k точек,
+                # дают верхнюю оценку k-го расстояния.
+                enough = int(np.searchsorted(np.cumsum(sizes[leaves]), k)) + 1
+                first = self._leaf_points(leaves[:enough])
+                chords = np.linalg.norm(self.xyz[first] - point, axis=1)
+                if len(chords) >= k:
+                    bound = min(bound, np.partition(chords, k - 1)[k - 1])
+            candidates = self._leaf_points(leaves[box[i][leaves] <= bound])
+
+            ids = np.concatenate([self.ids[candidates], extra_ids])
+            coords = np.concatenate([self.coords[candidates], extra_coords])
+            distances = haversine_km(lats[i], lons[i], coords[:, 0], coords[:, 1])
+            if radius_km is not None:
+                keep = distances <= radius_km
+                ids, distances = ids[keep], distances[keep]
+            if k is not None and len(distances) > k:
+                nearest = np.argpartition(distances, k - 1)[:k]
+                ids, distances = ids[nearest], distances[nearest]
+            order = np.argsort(distances, kind="stable")
+            results.append((ids[order], distances[order]))
+        return results
+
+    def _leaf_points(self, leaves):
+        if not len(leaves):
+            return np.empty(0, dtype=np.int64)
+        positions = np.concatenate(
+            [
+                np.arange(self.leaf_start[leaf], self.leaf_start[leaf + 1])
+                for leaf in leaves
+            ]
+        )
+        return positions[self.alive[positions]]
+
+
+def located(queryset=None):
+    queryset = PointsOfInterest.objects.all() if queryset is None else queryset
+    return queryset.exclude(latitude_e7=None).exclude(longitude_e7=None)
+
+
+def load_rows(queryset=None):
+    """Строки ``(pk, lat, lon)`` из целых колонок E7, без Decimal."""
+    rows = (
+        located(queryset)
+        .values_list("id", "latitude_e7", "longitude_e7")
+        .iterator(chunk_size=10000)
+    )
+    return ((pk, from_e7(lat), from_e7(lon)) for pk, lat, lon in rows)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """
+    Возвращает индекс процесса, при необходимости догоняя базу.
+
+    Изменения в этом процессе приходят через сигналы (trail.signals).
+    Изменения из других процессов видны по поколению модели
+    (trail.generations): тогда дочитываются строки с новым ``updated_at``,
+    а если число точек не сходится (были удаления), индекс строится заново.
+    """
+    global _index
+    generation = get_generations((PointsOfInterest,))[0]
+    with _index_lock:
+        index = _index
+        if index is None:
+            started = timezone.now()
+            index = PointIndex(load_rows())
+            index.synced_at = started
+        elif index.generation != generation:
+            started = timezone.now()
+            changed = PointsOfInterest.objects.filter(
+                updated_at__gte=index.synced_at - SYNC_SLACK
+            ).values_list("id", "latitude_e7", "longitude_e7")
+            for pk, lat, lon in changed:
+                index.upsert(pk, from_e7(lat), from_e7(lon))
+            if located().count() != len(index):
+                index = PointIndex(load_rows())
+            index.synced_at = started
+        index.generation = generation
+        _index = index
+        return index
+
+
+def refresh_point(pk, lat, lon):
+    """Применяет сохранение точки к уже построенному индексу процесса."""
+    if _index is not None:
+        _index.upsert(pk, lat, lon)
+
+
+def forget_point(pk):
+    """Применяет удаление точки к уже построенному индексу процесса."""
+    if _index is not None:
+        _index.remove(pk)
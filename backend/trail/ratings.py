@@ -0,0 +1,70 @@
+"""
+Агрегаты оценок маршрутов: число отзывов, сумма, среднее, гистограмма
+оценок 1–10 и байесовский рейтинг. Хранятся в RouteRating и меняются
+UPDATE с F-выражениями в той же транзакции, что и сам отзыв, поэтому
+для них не нужно читать все отзывы маршрута.
+
+Байесовский рейтинг — среднее с ``PRIOR_WEIGHT`` воображаемыми оценками
+``PRIOR_MEAN``: у маршрута с парой отличных отзывов он ниже, чем у
+маршрута с сотней почти таких же. Априорное среднее постоянно, поэтому
+сохранённое значение не устаревает и по нему можно строить индекс.
+"""
+
+from django.db.models import Count, ExpressionWrapper, F, FloatField, Value
+from django.db.models.functions import Cast, NullIf
+from django.utils import timezone
+
+SCORES = range(1, 11)
+PRIOR_MEAN = 5.5
+PRIOR_WEIGHT = 10
+HISTOGRAM_FIELDS = tuple(f"score_{score}" for score in SCORES)
+
+
+def bayesian(count, total):
+    return (PRIOR_WEIGHT * PRIOR_MEAN + total) / (PRIOR_WEIGHT + count)
+
+
+def rating_update(score, sign):
+    """
+    Аргументы ``update()``, которые добавляют (``sign=1``) или убирают
+    (``sign=-1``) одну оценку. Новые значения выражены через старые,
+    так что UPDATE атомарен без блокировок на чтение.
+    """
+    count = F("count") + sign
+    total = F("total") + sign * score
+    bucket = f"score_{score}"
+    return {
+        "count": count,
+        "total": total,
+        bucket: F(bucket) + sign,
+        "mean": Cast(total, FloatField()) / NullIf(count, 0),
+        "bayesian": ExpressionWrapper(
+            (Value(PRIOR_WEIGHT * PRIOR_MEAN) + total)
+            / (Value(float(PRIOR_WEIGHT)) + count),
+            output_field=FloatField(),
+        ),
+        "updated_at": timezone.now(),
+    }
+
+
+def rebuild(apps):
+    """Пересчитывает все агрегаты по таблице отзывов (для миграций)."""
+    reviews = apps.get_model("trail", "Reviews")
+    model = apps.get_model("trail", "RouteRating")
+    ratings = {}
+    for router_id, score, count in (
+        reviews.objects.values_list("router_id", "score")
+        .annotate(count=Count("id"))
+        .order_by()
+    ):
+        rating = ratings.setdefault(router_id, model(router_id=router_id))
+        setattr(rating, f"score_{score}", count)
+    for rating in ratings.values():
+        histogram = [getattr(rating, name) for name in HISTOGRAM_FIELDS]
+        rating.count = sum(histogram)
+        rating.total = sum(score * count for score, count in zip(SCORES, histogram))
+        rating.mean = rating.total / rating.count
+        rating.bayesian = bayesian(rating.count, rating.total)
+        rating.updated_at = timezone.now()
+    model.objects.all().delete()
+    model.objects.bulk_create(ratings.values(), batch_size=1000)
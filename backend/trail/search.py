@@ -0,0 +1,232 @@
+"""
+Полнотекстовый поиск по маршрутам, точкам интереса и публичным коллекциям.
+
+На каждый объект приходится одна строка SearchDocument (заголовок и текст),
+а инвертированный индекс над этой таблицей строит сама СУБД:
+
+* SQLite — FTS5-таблица с внешним содержимым, которую триггеры держат
+  в согласии с SearchDocument; ранжирование встроенной ``bm25()``,
+  заголовок весит больше текста;
+* PostgreSQL — GIN-индекс по взвешенному ``tsvector``, ранжирование
+  ``ts_rank_cd``;
+* прочие СУБД — запасной путь через ``icontains`` без ранжирования.
+
+Каждое слово запроса ищется как префикс, все слова обязательны. Буква «ё»
+в индексе и в запросе заменяется на «е»: токенизаторы её не сворачивают.
+Документы обновляются сигналами после фиксации транзакции (trail.signals).
+
+Функции принимают реестр моделей ``apps``, чтобы их можно было вызывать
+и из миграций.
+"""
+
+import re
+from collections import namedtuple
+
+from django.apps import apps as global_apps
+from django.db import connection, transaction
+from django.db.models import Q
+
+Source = namedtuple("Source", "model filters body_fields")
+
+SOURCES = {
+    "router": Source("Routers", {}, ("description",)),
+    "point": Source("PointsOfInterest", {}, ("description", "category")),
+    "collection": Source("Collections", {"is_public": True}, ("description",)),
+}
+BATCH_SIZE = 2000
+MAX_TERMS = 8
+FTS_TABLE = "trail_search_fts"
+# Вес заголовка относительно текста в bm25().
+TITLE_WEIGHT = 10.0
+# Выражение должно совпадать с выражением GIN-индекса, иначе индекс
+# не будет использован.
+PG_VECTOR = (
+    "(setweight(to_tsvector('simple', translate(title, 'Ёё', 'Ее')), 'A') || "
+    "setweight(to_tsvector('simple', translate(body, 'Ёё', 'Ее')), 'B'))"
+)
+# Значения для FTS5 в триггерах; при удалении из индекса нужно передать
+# ровно то, что было проиндексировано.
+SQLITE_VALUES = (
+    "replace(replace({row}.title, 'Ё', 'Е'), 'ё', 'е'), "
+    "replace(replace({row}.body, 'Ё', 'Е'), 'ё', 'е')"
+)
+NEW_VALUES = SQLITE_VALUES.format(row="new")
+OLD_VALUES = SQLITE_VALUES.format(row="old")
+
+SQLITE_SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title, body,
+        content='trail_searchdocument', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON trail_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, body)
+        VALUES (new.id, {NEW_VALUES});
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON trail_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body)
+        VALUES ('delete', old.id, {OLD_VALUES});
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE ON trail_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body)
+        VALUES ('delete', old.id, {OLD_VALUES});
+        INSERT INTO {FTS_TABLE}(rowid, title, body)
+        VALUES (new.id, {NEW_VALUES});
+    END
+    """,
+]
+SQLITE_DROP = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+POSTGRES_SCHEMA = [
+    f"CREATE INDEX trail_search_gin ON trail_searchdocument USING GIN ({PG_VECTOR})",
+]
+POSTGRES_DROP = ["DROP INDEX IF EXISTS trail_search_gin"]
+
+
+def create_index(schema_editor):
+    """Создаёт полнотекстовый индекс для текущей СУБД (для миграций)."""
+    vendor = schema_editor.connection.vendor
+    statements = {"sqlite": SQLITE_SCHEMA, "postgresql": POSTGRES_SCHEMA}
+    for sql in statements.get(vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_index(schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {"sqlite": SQLITE_DROP, "postgresql": POSTGRES_DROP}
+    for sql in statements.get(vendor, []):
+        schema_editor.execute(sql)
+
+
+def parse_terms(query):
+    """Слова запроса в нижнем регистре, не больше ``MAX_TERMS``."""
+    return re.findall(r"[^\W_]+", query.lower().replace("ё", "е"))[:MAX_TERMS]
+
+
+def get_documents(kind, ids=None, apps=global_apps):
+    """
+    Строки ``(object_id, title, body)`` для объектов типа ``kind``.
+    Объекты, которые не должны попадать в поиск, пропускаются.
+    """
+    source = SOURCES[kind]
+    queryset = apps.get_model("trail", source.model)._default_manager.filter(
+        **source.filters
+    )
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    for pk, title, *body in queryset.values_list(
+        "pk", "name", *source.body_fields
+    ).iterator(chunk_size=BATCH_SIZE):
+        yield pk, title or "", " ".join(part for part in body if part)
+
+
+def index_objects(kind, ids, apps=global_apps):
+    """
+    Перестраивает документы объектов ``ids``: старые строки удаляются,
+    актуальные вставляются одним ``bulk_create``. Удалённые и скрытые
+    объекты просто исчезают из поиска.
+    """
+    ids = list(ids)
+    if not ids:
+        return
+    model = apps.get_model("trail", "SearchDocument")
+    documents = [
+        model(kind=kind, object_id=pk, title=title, body=body)
+        for pk, title, body in get_documents(kind, ids, apps)
+    ]
+    with transaction.atomic():
+        model._default_manager.filter(kind=kind, object_id__in=ids).delete()
+        model._default_manager.bulk_create(documents, batch_size=BATCH_SIZE)
+
+
+def rebuild(apps=global_apps):
+    """Заново строит все документы пачками по ``BATCH_SIZE``."""
+    model = apps.get_model("trail", "SearchDocument")
+    with transaction.atomic():
+        model._default_manager.all().delete()
+        for kind in SOURCES:
+            batch = []
+            for pk, title, body in get_documents(kind, apps=apps):
+                batch.append(model(kind=kind, object_id=pk, title=title, body=body))
+                if len(batch) >= BATCH_SIZE:
+                    model._default_manager.bulk_create(batch)
+                    batch = []
+            model._default_manager.bulk_create(batch)
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+def search(query, kind=None, limit=20):
+    """
+    Ищет документы по словам ``query``. Возвращает список
+    ``(kind, object_id, title, score)``, лучшие совпадения первыми.
+    """
+    terms = parse_terms(query)
+    if not terms:
+        return []
+    if connection.vendor == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        sql = f"""
+            SELECT d.kind, d.object_id, d.title,
+                   -bm25({FTS_TABLE}, {TITLE_WEIGHT}, 1.0) AS score
+            FROM {FTS_TABLE}
+            JOIN trail_searchdocument d ON d.id = {FTS_TABLE}.rowid
+            WHERE {FTS_TABLE} MATCH %s {{kind}}
+            ORDER BY score DESC
+            LIMIT %s
+        """
+        params = [match]
+    elif connection.vendor == "postgresql":
+        match = " & ".join(f"{term}:*" for term in terms)
+        sql = f"""
+            SELECT kind, object_id, title, ts_rank_cd({PG_VECTOR}, q, 32) AS score
+            FROM trail_searchdocument, to_tsquery('simple', %s) q
+            WHERE {PG_VECTOR} @@ q {{kind}}
+            ORDER BY score DESC
+            LIMIT %s
+        """
+        params = [match]
+    else:
+        return _search_fallback(terms, kind, limit)
+
+    if kind is not None:
+        sql = sql.format(kind="AND kind = %s")
+        params.append(kind)
+    else:
+        sql = sql.format(kind="")
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [
+            (kind, object_id, title, float(score))
+            for kind, object_id, title, score in cursor.fetchall()
+        ]
+
+
+def _search_fallback(terms, kind, limit):
+    condition = Q()
+    for term in terms:
+        condition &= Q(title__icontains=term) | Q(body__icontains=term)
+    queryset = global_apps.get_model("trail", "SearchDocument").objects.filter(
+        condition
+    )
+    if kind is not None:
+        queryset = queryset.filter(kind=kind)
+    return [
+        (kind, object_id, title, 0.0)
+        for kind, object_id, title in queryset.order_by(
+            "kind", "object_id"
+        ).values_list("kind", "object_id", "title")[:limit]
+    ]
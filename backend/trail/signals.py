@@ -0,0 +1,240 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .counters import increment_on_commit
+from .generations import bump_generation, bump_objects
+from .links import links_synced
+from .metrics import schedule_route_metrics
+from .nearby import forget_point, refresh_point
+from .search import index_objects
+from .models import (
+    CollectionRouters,
+    Collections,
+    Favorite,
+    PointsOfInterest,
+    Reviews,
+    RoutePoints,
+    RouteRating,
+    Routers,
+)
+
+User = get_user_model()
+
+# Модели, изменение которых должно сбрасывать закэшированные ответы API.
+VERSIONED_MODELS = (
+    Routers,
+    RoutePoints,
+    PointsOfInterest,
+    Reviews,
+    Collections,
+    CollectionRouters,
+    User,
+)
+
+
+# Поколения и версии сдвигаются только после фиксации транзакции: иначе
+# параллельный анонимный GET успеет прочитать старые строки и закэшировать
+# их под уже новым ключом, и они будут отдаваться до следующей записи.
+def bump_model_generation(sender, **kwargs):
+    transaction.on_commit(lambda: bump_generation(sender))
+
+
+for model in VERSIONED_MODELS:
+    post_save.connect(
+        bump_model_generation,
+        sender=model,
+        dispatch_uid=f"generation-save-{model._meta.label_lower}",
+    )
+    post_delete.connect(
+        bump_model_generation,
+        sender=model,
+        dispatch_uid=f"generation-delete-{model._meta.label_lower}",
+    )
+
+
+# Версии отдельных маршрутов для кэша готовых представлений (api.materialize):
+# маршрут устаревает, если изменился он сам, его точки или его автор.
+# Связанные маршруты ищутся сразу, пока строки ещё видны в транзакции.
+def bump_routers_on_commit(router_ids):
+    router_ids = set(router_ids)
+    if router_ids:
+        transaction.on_commit(lambda: bump_objects(Routers, router_ids))
+
+
+def bump_router(sender, instance, **kwargs):
+    bump_routers_on_commit([instance.pk])
+
+
+def bump_route_point_router(sender, instance, **kwargs):
+    bump_routers_on_commit([instance.router_id])
+
+
+def bump_point_routers(sender, instance, **kwargs):
+    bump_routers_on_commit(
+        RoutePoints.objects.filter(point_id=instance.pk).values_list(
+            "router_id", flat=True
+        )
+    )
+
+
+def bump_author_routers(sender, instance, **kwargs):
+    bump_routers_on_commit(
+        Routers.objects.filter(author_id=instance.pk).values_list("id", flat=True)
+    )
+
+
+for model, handler in (
+    (Routers, bump_router),
+    (RoutePoints, bump_route_point_router),
+    (PointsOfInterest, bump_point_routers),
+    (User, bump_author_routers),
+):
+    post_save.connect(
+        handler, sender=model, dispatch_uid=f"version-save-{model._meta.label_lower}"
+    )
+    post_delete.connect(
+        handler,
+        sender=model,
+        dispatch_uid=f"version-delete-{model._meta.label_lower}",
+    )
+
+
+# Индекс ближайших точек (trail.nearby) обновляется на месте, без
+# перестроения; изменения применяются только после фиксации транзакции.
+def refresh_nearby_point(sender, instance, **kwargs):
+    pk, lat, lon = instance.pk, instance.latitude, instance.longitude
+    transaction.on_commit(lambda: refresh_point(pk, lat, lon))
+
+
+def forget_nearby_point(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: forget_point(pk))
+
+
+post_save.connect(
+    refresh_nearby_point, sender=PointsOfInterest, dispatch_uid="nearby-save"
+)
+post_delete.connect(
+    forget_nearby_point, sender=PointsOfInterest, dispatch_uid="nearby-delete"
+)
+
+
+# Метрики маршрутов (trail.metrics): длина, прямоугольник и центр зависят
+# от состава точек маршрута и от координат этих точек.
+def route_point_metrics(sender, instance, **kwargs):
+    schedule_route_metrics([instance.router_id])
+
+
+def point_metrics(sender, instance, **kwargs):
+    schedule_route_metrics(
+        RoutePoints.objects.filter(point_id=instance.pk).values_list(
+            "router_id", flat=True
+        )
+    )
+
+
+def synced_route_metrics(sender, owner, **kwargs):
+    schedule_route_metrics([owner.pk])
+
+
+post_save.connect(
+    route_point_metrics, sender=RoutePoints, dispatch_uid="metrics-save-routepoints"
+)
+post_delete.connect(
+    route_point_metrics,
+    sender=RoutePoints,
+    dispatch_uid="metrics-delete-routepoints",
+)
+post_save.connect(
+    point_metrics, sender=PointsOfInterest, dispatch_uid="metrics-save-point"
+)
+links_synced.connect(
+    synced_route_metrics, sender=RoutePoints, dispatch_uid="metrics-synced-routepoints"
+)
+
+
+# Поисковые документы (trail.search): после сохранения или удаления объекта
+# его документ пересобирается; удалённые и скрытые объекты уходят из поиска.
+SEARCH_KINDS = {
+    Routers: "router",
+    PointsOfInterest: "point",
+    Collections: "collection",
+}
+
+
+def reindex_search(sender, instance, **kwargs):
+    kind, pk = SEARCH_KINDS[sender], instance.pk
+    transaction.on_commit(lambda: index_objects(kind, [pk]))
+
+
+for model in SEARCH_KINDS:
+    post_save.connect(
+        reindex_search,
+        sender=model,
+        dispatch_uid=f"search-save-{model._meta.label_lower}",
+    )
+    post_delete.connect(
+        reindex_search,
+        sender=model,
+        dispatch_uid=f"search-delete-{model._meta.label_lower}",
+    )
+
+
+# Агрегаты оценок (trail.ratings): создание и правку отзыва учитывает
+# Reviews.save(), а удаление — этот обработчик. post_delete приходит и при
+# каскадном удалении, внутри транзакции самого удаления.
+def forget_review_score(sender, instance, **kwargs):
+    RouteRating.objects.apply(instance.router_id, instance.score, sign=-1)
+
+
+post_delete.connect(
+    forget_review_score, sender=Reviews, dispatch_uid="rating-delete-review"
+)
+
+
+# Счётчики маршрутов (trail.counters): избранное и коллекции. Приращения
+# уходят в буфер только после фиксации транзакции.
+def favorite_added(sender, instance, created, **kwargs):
+    if created:
+        increment_on_commit("favorites_count", [instance.router_id])
+
+
+def favorite_removed(sender, instance, **kwargs):
+    increment_on_commit("favorites_count", [instance.router_id], -1)
+
+
+def collection_link_added(sender, instance, created, **kwargs):
+    if created:
+        increment_on_commit("collections_count", [instance.router_id])
+
+
+def collection_link_removed(sender, instance, **kwargs):
+    increment_on_commit("collections_count", [instance.router_id], -1)
+
+
+def collection_links_synced(sender, added, **kwargs):
+    # Удалённые связи приходят через post_delete, а добавленные bulk_create
+    # сигналов не отправляет.
+    increment_on_commit("collections_count", added)
+
+
+post_save.connect(favorite_added, sender=Favorite, dispatch_uid="counter-favorite")
+post_delete.connect(
+    favorite_removed, sender=Favorite, dispatch_uid="counter-favorite-delete"
+)
+post_save.connect(
+    collection_link_added,
+    sender=CollectionRouters,
+    dispatch_uid="counter-collection",
+)
+post_delete.connect(
+    collection_link_removed,
+    sender=CollectionRouters,
+    dispatch_uid="counter-collection-delete",
+)
+links_synced.connect(
+    collection_links_synced,
+    sender=CollectionRouters,
+    dispatch_uid="counter-collection-synced",
+)
@@ -0,0 +1,236 @@
+"""
+Порядок обхода точек маршрута: короткий незамкнутый путь.
+
+Матрица расстояний считается векторно по формуле гаверсинусов, начальный
+порядок строится жадно (ближайший сосед), затем улучшается 2-opt
+(разворот отрезка) и Or-opt (перенос цепочки из 1–3 точек). Для каждого
+хода проверяются сразу все варианты одной векторной операцией, а весь
+поиск ограничен по времени.
+
+Матрицы кэшируются по хэшу набора точек с координатами. При правке
+маршрута пересчитываются только строки новых или сдвинутых точек,
+остальное берётся из предыдущей матрицы этого же маршрута.
+"""
+
+import hashlib
+import time
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+
+from .generations import bump_generation, bump_objects
+from .geo import E7, EARTH_RADIUS_KM
+from .metrics import schedule_route_metrics
+from .models import RoutePoints, Routers
+
+TIME_BUDGET = 0.3
+MATRIX_KEY = "tour-matrix:{digest}"
+ROUTE_MATRIX_KEY = "tour-matrix-route:{router_id}"
+MATRIX_TIMEOUT = 60 * 60
+OR_OPT_SEGMENTS = (1, 2, 3)
+
+
+def haversine_matrix(lat_a, lon_a, lat_b, lon_b):
+    """Попарные расстояния (км) между точками A и B, координаты в радианах."""
+    a = (
+        np.sin((lat_b[None, :] - lat_a[:, None]) / 2) ** 2
+        + np.cos(lat_a)[:, None]
+        * np.cos(lat_b)[None, :]
+        * np.sin((lon_b[None, :] - lon_a[:, None]) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def point_set_digest(stops):
+    parts = sorted(f"{pk}:{lat}:{lon}" for pk, lat, lon in stops)
+    return hashlib.md5("\n".join(parts).encode()).hexdigest()
+
+
+def distance_matrix(stops, router_id=None):
+    """
+    Матрица расстояний для ``stops = [(pk, lat_e7, lon_e7), ...]``.
+
+    Если такой же набор уже считался, матрица берётся из кэша. Иначе
+    переиспользуются строки из последней матрицы маршрута ``router_id``
+    для точек с теми же координатами, а считаются только остальные.
+    """
+    stops = [tuple(stop) for stop in stops]
+    digest = point_set_digest(stops)
+    cached = cache.get(MATRIX_KEY.format(digest=digest))
+    if cached is None and router_id is not None:
+        previous = cache.get(ROUTE_MATRIX_KEY.format(router_id=router_id))
+        if previous is not None:
+            cached = cache.get(MATRIX_KEY.format(digest=previous))
+
+    coords = np.array([stop[1:] for stop in stops], dtype=np.float64).reshape(-1, 2)
+    lat, lon = np.radians(coords[:, 0] / E7), np.radians(coords[:, 1] / E7)
+    matrix = np.empty((len(stops), len(stops)), dtype=np.float64)
+    known = np.zeros(len(stops), dtype=bool)
+    if cached is not None:
+        old_stops, old_matrix = cached
+        where = {stop: i for i, stop in enumerate(old_stops)}
+        old = np.array([where.get(stop, -1) for stop in stops], dtype=np.int64)
+        known = old >= 0
+        matrix[np.ix_(known, known)] = old_matrix[np.ix_(old[known], old[known])]
+
+    fresh = np.flatnonzero(~known)
+    if len(fresh):
+        rows = haversine_matrix(lat[fresh], lon[fresh], lat, lon)
+        matrix[fresh, :] = rows
+        matrix[:, fresh] = rows.T
+
+    if not known.all():
+        cache.set(
+            MATRIX_KEY.format(digest=digest),
+            (stops, matrix.astype(np.float32)),
+            MATRIX_TIMEOUT,
+        )
+    if router_id is not None:
+        cache.set(ROUTE_MATRIX_KEY.format(router_id=router_id), digest, MATRIX_TIMEOUT)
+    return matrix
+
+
+def path_length(matrix, order):
+    order = np.asarray(order)
+    return float(matrix[order[:-1], order[1:]].sum()) if len(order) > 1 else 0.0
+
+
+def nearest_neighbour(matrix, start=0):
+    size = len(matrix)
+    visited = np.zeros(size, dtype=bool)
+    order = [start]
+    visited[start] = True
+    for _ in range(size - 1):
+        distances = np.where(visited, np.inf, matrix[order[-1]])
+        nearest = int(np.argmin(distances))
+        order.append(nearest)
+        visited[nearest] = True
+    return np.array(order, dtype=np.int64)
+
+
+def two_opt_pass(matrix, order, deadline):
+    """
+    Один проход 2-opt для незамкнутого пути с фиксированным началом.
+    Разворот ``order[i:j+1]`` меняет рёбра (i-1, i) и (j, j+1).
+    """
+    improved = False
+    size = len(order)
+    for i in range(1, size - 1):
+        if time.perf_counter() > deadline:
+            break
+        a, b = order[i - 1], order[i]
+        j = np.arange(i + 1, size)
+        c = order[j]
+        # У последней точки пути нет следующего ребра.
+        d = order[np.minimum(j + 1, size - 1)]
+        tail = j + 1 < size
+        delta = matrix[a, c] - matrix[a, b]
+        delta = delta + np.where(tail, matrix[b, d] - matrix[c, d], 0.0)
+        best = int(np.argmin(delta))
+        if delta[best] < -1e-9:
+            k = j[best]
+            order[i : k + 1] = order[i : k + 1][::-1].copy()
+            improved = True
+    return improved
+
+
+def or_opt_pass(matrix, order, deadline):
+    """
+    Один проход Or-opt: цепочка из 1–3 точек переносится (в том же
+    направлении) в место, где путь становится короче.
+    """
+    improved = False
+    for length in OR_OPT_SEGMENTS:
+        i = 1
+        while i + length <= len(order):
+            if time.perf_counter() > deadline:
+                return improved
+            segment = order[i : i + length]
+            rest = np.concatenate([order[:i], order[i + length :]])
+            prev, first, last = order[i - 1], segment[0], segment[-1]
+            has_next = i + length < len(order)
+            following = order[i + length] if has_next else None
+            removed = matrix[prev, first] + (
+                matrix[last, following] - matrix[prev, following] if has_next else 0.0
+            )
+            # Вставка между rest[p] и rest[p + 1] (или в конец пути).
+            after = np.r_[rest[1:], rest[-1]]
+            tail = np.arange(len(rest)) < len(rest) - 1
+            added = matrix[rest, first] + np.where(
+                tail, matrix[last, after] - matrix[rest, after], 0.0
+            )
+            gain = removed - added
+            gain[rest == prev] = -np.inf
+            best = int(np.argmax(gain))
+            if gain[best] > 1e-9:
+                order[:] = np.concatenate([rest[: best + 1], segment, rest[best + 1 :]])
+                improved = True
+            else:
+                i += 1
+    return improved
+
+
+def optimize_order(matrix, time_budget=TIME_BUDGET):
+    """
+    Возвращает порядок обхода (индексы строк матрицы), начинающийся
+    с первой точки. Исходный порядок ``0..n-1`` тоже участвует:
+    результат никогда не длиннее него.
+    """
+    size = len(matrix)
+    if size < 3:
+        return np.arange(size)
+    deadline = time.perf_counter() + time_budget
+    order = nearest_neighbour(matrix)
+    while time.perf_counter() < deadline:
+        changed = two_opt_pass(matrix, order, deadline)
+        changed = or_opt_pass(matrix, order, deadline) or changed
+        if not changed:
+            break
+    identity = np.arange(size)
+    if path_length(matrix, identity) <= path_length(matrix, order):
+        return identity
+    return order
+
+
+def optimize_route(router_id, time_budget=TIME_BUDGET):
+    """
+    Переупорядочивает точки маршрута и сохраняет новые номера.
+
+    Первая точка остаётся на месте: это старт маршрута. Точки без
+    координат сохраняют взаимный порядок и уходят в конец.
+    """
+    started = time.perf_counter()
+    links = list(
+        RoutePoints.objects.filter(router_id=router_id).select_related("point")
+    )
+    located = [link for link in links if link.point.latitude_e7 is not None]
+    unlocated = [link for link in links if link.point.latitude_e7 is None]
+    stops = [
+        (link.point_id, link.point.latitude_e7, link.point.longitude_e7)
+        for link in located
+    ]
+    matrix = distance_matrix(stops, router_id)
+    order = optimize_order(matrix, time_budget)
+    before = path_length(matrix, np.arange(len(located)))
+    after = path_length(matrix, order)
+
+    ordered = [located[i] for i in order] + unlocated
+    changed = [
+        link for position, link in enumerate(ordered) if link.position != position
+    ]
+    for position, link in enumerate(ordered):
+        link.position = position
+    if changed:
+        with transaction.atomic():
+            RoutePoints.objects.bulk_update(changed, ["position"])
+            # bulk_update не отправляет сигналы: сбрасываем кэши явно.
+            transaction.on_commit(lambda: bump_generation(RoutePoints))
+            transaction.on_commit(lambda: bump_objects(Routers, [router_id]))
+            schedule_route_metrics([router_id])
+    return {
+        "order": [link.point_id for link in ordered],
+        "length_km_before": round(before, 3),
+        "length_km": round(after, 3),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
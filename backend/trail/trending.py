@@ -0,0 +1,227 @@
+"""
+Популярные сейчас маршруты: добавления в избранное, отзывы и просмотры
+с экспоненциальным затуханием по времени.
+
+Вклад события весом ``w`` в момент ``t`` к моменту ``now`` равен
+``w * exp(-λ (now - t))``. Общий множитель ``exp(-λ now)`` одинаков для всех
+маршрутов, поэтому в TrendingScore хранится ``log Σ w * exp(λ t)`` — счёт,
+приведённый к началу эпохи Unix. Порядок по нему от времени не зависит:
+при обновлении меняются только строки маршрутов с новыми событиями,
+а затухание всех остальных получается само собой. Логарифм нужен, чтобы
+``exp(λ t)`` не переполнялся.
+
+События дочитываются с последней учтённой позиции (TrendingCursor):
+избранное и отзывы — по id, просмотры копятся в памяти процесса
+(``record_view``) и забираются при обновлении; если обновление не удалось,
+они возвращаются в буфер. У избранного нет даты добавления, поэтому
+позиция избранного выставляется миграцией 0020 на момент развёртывания:
+старое избранное не считается добавленным «сейчас». Обновление запускают
+команда refresh_trending и фоновый поток (``ensure_scheduler``).
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .generations import bump_generation
+from .models import Favorite, Reviews, Routers, TrendingCursor, TrendingScore
+
+logger = logging.getLogger(__name__)
+
+HALF_LIFE = 3 * 24 * 60 * 60
+DECAY = math.log(2) / HALF_LIFE
+FAVORITE_WEIGHT = 5.0
+REVIEW_WEIGHT = 3.0
+VIEW_WEIGHT = 0.2
+BATCH_SIZE = 5000
+
+_views = Counter()
+_views_lock = threading.Lock()
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def record_view(router_id):
+    """Учитывает просмотр маршрута; в базу попадёт при обновлении."""
+    with _views_lock:
+        _views[router_id] += 1
+
+
+def drain_views():
+    global _views
+    with _views_lock:
+        views, _views = _views, Counter()
+    return views
+
+
+def restore_views(views):
+    with _views_lock:
+        _views.update(views)
+
+
+def read_source(source, queryset, columns):
+    """
+    Новые строки источника после сохранённой позиции, не больше
+    ``BATCH_SIZE``. Позиция сдвигается в текущей транзакции.
+    """
+    cursor, _ = TrendingCursor.objects.select_for_update().get_or_create(source=source)
+    rows = list(
+        queryset.filter(pk__gt=cursor.position)
+        .order_by("pk")
+        .values_list("pk", *columns)[:BATCH_SIZE]
+    )
+    if rows:
+        cursor.position = rows[-1][0]
+        cursor.save(update_fields=["position"])
+    return rows
+
+
+def collect_events(now, views):
+    """
+    Возвращает события (вместе с забранными просмотрами ``views``) пачкой
+    массивов (маршрут, время, вес) и признак, что в источниках остались
+    непрочитанные строки.
+    """
+    favorites = read_source("favorite", Favorite.objects, ["router_id"])
+    reviews = read_source("review", Reviews.objects, ["router_id", "updated_at"])
+    router_ids, times, weights = [], [], []
+    for _, router_id in favorites:
+        router_ids.append(router_id)
+        # У избранного нет даты добавления: считаем, что оно добавлено сейчас.
+        times.append(now)
+        weights.append(FAVORITE_WEIGHT)
+    for _, router_id, updated_at in reviews:
+        router_ids.append(router_id)
+        times.append(min(updated_at.timestamp(), now))
+        weights.append(REVIEW_WEIGHT)
+    for router_id, count in views.items():
+        router_ids.append(router_id)
+        times.append(now)
+        weights.append(VIEW_WEIGHT * count)
+    more = BATCH_SIZE in (len(favorites), len(reviews))
+    events = (
+        np.asarray(router_ids, dtype=np.int64),
+        np.asarray(times, dtype=np.float64),
+        np.asarray(weights, dtype=np.float64),
+    )
+    return events, more
+
+
+def combine(router_ids, times, weights):
+    """
+    Складывает вклады событий по маршрутам в логарифмической шкале.
+    Возвращает ``{router_id: log Σ w * exp(λ t)}``.
+    """
+    if not len(router_ids):
+        return {}
+    order = np.argsort(router_ids, kind="stable")
+    router_ids = router_ids[order]
+    terms = np.log(weights[order]) + DECAY * times[order]
+    starts = np.flatnonzero(np.r_[True, router_ids[1:] != router_ids[:-1]])
+    sums = np.logaddexp.reduceat(terms, starts)
+    return dict(zip(router_ids[starts].tolist(), sums.tolist()))
+
+
+def refresh_trending():
+    """
+    Учитывает новые события и обновляет счета затронутых маршрутов.
+    Возвращает число обработанных событий.
+    """
+    processed = 0
+    while True:
+        now = time.time()
+        views = drain_views()
+        try:
+            with transaction.atomic():
+                (router_ids, times, weights), more = collect_events(now, views)
+                updates = combine(router_ids, times, weights)
+                existing = set(
+                    Routers.objects.filter(pk__in=list(updates)).values_list(
+                        "pk", flat=True
+                    )
+                )
+                current = dict(
+                    TrendingScore.objects.filter(router_id__in=existing).values_list(
+                        "router_id", "log_score"
+                    )
+                )
+                scores = [
+                    TrendingScore(
+                        router_id=router_id,
+                        log_score=(
+                            float(np.logaddexp(current[router_id], log_score))
+                            if router_id in current
+                            else log_score
+                        ),
+                    )
+                    for router_id, log_score in updates.items()
+                    if router_id in existing
+                ]
+                TrendingScore.objects.bulk_create(
+                    scores,
+                    update_conflicts=True,
+                    unique_fields=["router"],
+                    update_fields=["log_score", "updated_at"],
+                )
+        except Exception:
+            restore_views(views)
+            raise
+        if scores:
+            bump_generation(TrendingScore)
+        processed += len(router_ids)
+        if not more:
+            return processed
+
+
+def decayed(log_score, now=None):
+    """Текущее значение счёта из сохранённого логарифма."""
+    now = time.time() if now is None else now
+    return math.exp(log_score - DECAY * now)
+
+
+def top_trending(limit):
+    """``[(router_id, score), ...]`` — маршруты с наибольшим счётом."""
+    now = time.time()
+    return [
+        (router_id, decayed(log_score, now))
+        for router_id, log_score in TrendingScore.objects.order_by(
+            "-log_score", "router_id"
+        ).values_list("router_id", "log_score")[:limit]
+    ]
+
+
+def run_scheduler(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            refresh_trending()
+        except Exception:
+            logger.exception("Не удалось обновить популярные маршруты")
+        finally:
+            close_old_connections()
+
+
+def ensure_scheduler():
+    """
+    Запускает в процессе фоновый поток обновления, если он ещё не запущен.
+    Интервал задаёт ``TRENDING_REFRESH_SECONDS``; 0 отключает поток.
+    """
+    global _scheduler
+    interval = getattr(settings, "TRENDING_REFRESH_SECONDS", 60)
+    if _scheduler is not None or not interval:
+        return
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = threading.Thread(
+                target=run_scheduler,
+                args=(interval,),
+                name="trending-refresh",
+                daemon=True,
+            )
+            _scheduler.start()
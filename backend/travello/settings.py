@@ -90,6 +90,10 @@ DATABASES = {
     }
 }
 
+# Кэш ответов API (api.cache) и готовых представлений (api.materialize).
+# Ключи строятся из поколений и версий в базе (trail.generations), поэтому
+# и локальный кэш каждого воркера сбрасывается записью из любого процесса;
+# общий backend (Redis/Memcached) нужен только, чтобы не греть кэш в каждом.
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
@@ -97,6 +101,18 @@ CACHES = {
     }
 }
 
+# Как часто фоновый поток пересчитывает популярные маршруты (trail.trending),
+# в секундах; 0 отключает поток, тогда нужна команда refresh_trending.
+TRENDING_REFRESH_SECONDS = 60
+
+# Как часто накопленные в памяти счётчики маршрутов (trail.counters)
+# записываются в базу, в секундах; 0 — писать сразу.
+COUNTERS_FLUSH_SECONDS = 5
+
+# Как часто runserver_secure снимает открытую базу и запечатывает её
+# в db.sqlite3.enc (secureboot.checkpoint), в секундах; 0 отключает поток.
+SECUREBOOT_CHECKPOINT_SECONDS = 300
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -150,6 +166,20 @@ MEDIA_ROOT = BASE_DIR / 'backend_media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'api.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.ORJSONParser',
+        'api.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
 DJOSER = {
     'SERIALIZERS': {
         'user_create': 'api.serializers.CustomUserCreateSerializer',